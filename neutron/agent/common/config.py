@@ -64,6 +64,16 @@ IPTABLES_OPTS = [
                        "generated iptables rules that describe each rule's "
                        "purpose. System must support the iptables comments "
                        "module for addition of comments.")),
+    cfg.IntOpt('iptables_state_verify_interval', default=0,
+               help=_("Interval, in seconds, between verifications of the "
+                      "in-memory model of the applied iptables rules. When "
+                      "greater than 0, each apply only rebuilds the tables "
+                      "modified since the previous apply and computes the "
+                      "changes against the rules applied last time; "
+                      "iptables-save is only run when the changes touch "
+                      "chains shared with other components or when the "
+                      "interval has elapsed. When 0, the current rules are "
+                      "read with iptables-save on every apply.")),
 ]
 
 PROCESS_MONITOR_OPTS = [
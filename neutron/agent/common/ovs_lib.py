@@ -45,6 +45,19 @@ UNASSIGNED_OFPORT = []
 FAILMODE_SECURE = 'secure'
 FAILMODE_STANDALONE = 'standalone'
 
+# Keywords of the flow mod commands in an ovs-ofctl flow file
+BUNDLE_FLOW_COMMANDS = {'add': 'add', 'mod': 'modify', 'del': 'delete'}
+
+# Priority of the flows which are dumped without one
+DEFAULT_FLOW_PRIORITY = 32768
+
+# Flow fields which are not part of the match of a flow
+_FLOW_STATS_FIELDS = ('duration', 'n_packets', 'n_bytes', 'idle_age',
+                      'hard_age', 'importance', 'send_flow_rem',
+                      'check_overlap', 'reset_counts', 'no_packet_counts',
+                      'no_byte_counts')
+_FLOW_TIMEOUT_FIELDS = ('idle_timeout', 'hard_timeout')
+
 ovs_conf.register_ovs_agent_opts()
 
 LOG = logging.getLogger(__name__)
@@ -169,6 +182,7 @@ class OVSBridge(BaseOVS):
         self.br_name = br_name
         self.datapath_type = datapath_type
         self._default_cookie = generate_random_cookie()
+        self._flow_reconciler = None
 
     @property
     def default_cookie(self):
@@ -238,7 +252,12 @@ class OVSBridge(BaseOVS):
     def delete_port(self, port_name):
         self.ovsdb.del_port(port_name, self.br_name).execute()
 
-    def run_ofctl(self, cmd, args, process_input=None):
+    def run_ofctl(self, cmd, args, process_input=None, check_error=False):
+        """Run an ovs-ofctl command on the bridge.
+
+        Errors are logged and None is returned, unless check_error is set in
+        which case a RuntimeError is raised.
+        """
         full_args = ["ovs-ofctl", cmd, self.br_name] + args
         # TODO(kevinbenton): This error handling is really brittle and only
         # detects one specific type of failure. The callers of this need to
@@ -257,7 +276,14 @@ class OVSBridge(BaseOVS):
                 LOG.error(_LE("Unable to execute %(cmd)s. Exception: "
                               "%(exception)s"),
                           {'cmd': full_args, 'exception': e})
+                if check_error:
+                    raise
                 break
+        else:
+            msg = _("Unable to connect to OVS to execute %s") % full_args
+            LOG.error(msg)
+            if check_error:
+                raise RuntimeError(msg)
 
     def count_flows(self):
         flow_list = self.run_ofctl("dump-flows", []).split("\n")[1:]
@@ -284,13 +310,54 @@ class OVSBridge(BaseOVS):
         return self.db_get_val('Bridge',
                                self.br_name, 'datapath_id')
 
-    def do_action_flows(self, action, kwargs_list):
-        if action != 'del':
-            for kw in kwargs_list:
-                if 'cookie' not in kw:
-                    kw['cookie'] = self._default_cookie
-        flow_strs = [_build_flow_expr_str(kw, action) for kw in kwargs_list]
-        self.run_ofctl('%s-flows' % action, ['-'], '\n'.join(flow_strs))
+    def do_action_flows(self, action, kwargs_list, check_error=False):
+        # A batch can't mix strict and non strict flow mods
+        strict = kwargs_list[0].get('strict', False)
+        for kw in kwargs_list:
+            if kw.pop('strict', False) != strict:
+                msg = _("Cannot mix strict and non strict flow mods in a "
+                        "batch")
+                raise exceptions.InvalidInput(error_message=msg)
+            if action != 'del' and 'cookie' not in kw:
+                kw['cookie'] = self._default_cookie
+        flow_strs = [_build_flow_expr_str(kw, action, strict)
+                     for kw in kwargs_list]
+        if self._flow_reconciler is not None:
+            flow_strs = [flow_str for flow_str in flow_strs
+                         if self._flow_reconciler.needs_flow_mod(action,
+                                                                 flow_str)]
+            if not flow_strs:
+                return
+        args = ['--strict', '-'] if strict else ['-']
+        self.run_ofctl('%s-flows' % action, args, '\n'.join(flow_strs),
+                       check_error=check_error)
+
+    def do_action_flows_bundle(self, action_flow_tuples):
+        """Apply (action, flow kwargs) tuples in a single OpenFlow bundle.
+
+        The flow mods are sent in order by a single ovs-ofctl call and
+        committed atomically by the switch: either all or none of them are
+        applied. The bridge must allow OpenFlow 1.4 or later. A RuntimeError
+        is raised if the bundle could not be applied.
+        """
+        flow_strs = []
+        for action, kw in action_flow_tuples:
+            strict = kw.pop('strict', False)
+            if action != 'del' and 'cookie' not in kw:
+                kw['cookie'] = self._default_cookie
+            flow_str = _build_flow_expr_str(kw, action, strict)
+            if (self._flow_reconciler is not None and
+                    not self._flow_reconciler.needs_flow_mod(action,
+                                                             flow_str)):
+                continue
+            command = BUNDLE_FLOW_COMMANDS[action]
+            if strict and action != 'add':
+                command += '_strict'
+            flow_strs.append('%s %s' % (command, flow_str))
+        if not flow_strs:
+            return
+        self.run_ofctl('add-flows', ['--bundle', '-'], '\n'.join(flow_strs),
+                       check_error=True)
 
     def add_flow(self, **kwargs):
         self.do_action_flows('add', [kwargs])
@@ -321,6 +388,65 @@ class OVSBridge(BaseOVS):
         return [f for f in self.run_ofctl("dump-flows", []).splitlines()
                 if 'NXST' not in f]
 
+    def start_flows_reconciliation(self):
+        """Reconcile the flows added from now on with the installed ones.
+
+        The flow table of the bridge is dumped once. Until
+        finish_flows_reconciliation is called, the added flows which are
+        already installed with the same match, priority and actions are not
+        sent to the switch again, so that the datapath keeps using them.
+        """
+        try:
+            flows = self.run_ofctl("dump-flows", [], check_error=True)
+        except Exception:
+            LOG.warning(_LW("Unable to dump the flows of bridge %s, its "
+                            "flows will be reinstalled"), self.br_name)
+            self._flow_reconciler = None
+            return
+        self._flow_reconciler = FlowTableReconciler(flows.splitlines())
+
+    def finish_flows_reconciliation(self):
+        """Stop reconciling the added flows with the installed ones.
+
+        The flows left untouched since start_flows_reconciliation are
+        stamped with the cookie they were last requested with, so that the
+        flows which were not requested again are the only ones left with a
+        stale cookie. If they can't be stamped, they are added again with
+        their new cookie instead.
+
+        Return False if the flows of the bridge could not be brought up to
+        date, in which case the flows with a stale cookie must not be
+        cleaned up.
+        """
+        reconciler = self._flow_reconciler
+        if reconciler is None:
+            return True
+        self._flow_reconciler = None
+        try:
+            flows = self.run_ofctl("dump-flows", [], check_error=True)
+            flow_strs = reconciler.get_cookie_updates(flows.splitlines())
+            if flow_strs:
+                self.run_ofctl('mod-flows', ['--strict', '-'],
+                               '\n'.join(flow_strs), check_error=True)
+        except Exception:
+            LOG.warning(_LW("Unable to update the cookies of the unchanged "
+                            "flows of bridge %s, reinstalling them"),
+                        self.br_name)
+            try:
+                flow_strs = reconciler.get_kept_flows()
+                if flow_strs:
+                    self.run_ofctl('add-flows', ['-'], '\n'.join(flow_strs),
+                                   check_error=True)
+            except Exception:
+                LOG.exception(_LE("Unable to reinstall the unchanged flows "
+                                  "of bridge %s"), self.br_name)
+                return False
+        LOG.info(_LI("Reconciled the flows of bridge %(br)s: %(unchanged)d "
+                     "unchanged, %(installed)d installed or modified"),
+                 {'br': self.br_name, 'unchanged': reconciler.unchanged,
+                  'installed': reconciler.installed})
+        return True
+
     def deferred(self, **kwargs):
         return DeferredOVSBridge(self, **kwargs)
 
@@ -603,17 +729,22 @@ class DeferredOVSBridge(object):
     ALLOWED_PASSTHROUGHS = 'add_port', 'add_tunnel_port', 'delete_port'
 
     def __init__(self, br, full_ordered=False,
-                 order=('add', 'mod', 'del')):
+                 order=('add', 'mod', 'del'), use_bundle=False):
         '''Constructor.
 
         :param br: wrapped bridge
         :param full_ordered: Optional, disable flow reordering (slower)
         :param order: Optional, define in which order flow are applied
+        :param use_bundle: Optional, apply all the flows atomically in a
+                           single OpenFlow bundle instead of one ovs-ofctl
+                           call per group of actions. The bridge must allow
+                           OpenFlow 1.4 or later.
         '''
 
         self.br = br
         self.full_ordered = full_ordered
         self.order = order
+        self.use_bundle = use_bundle
         if not self.full_ordered:
             self.weights = dict((y, x) for x, y in enumerate(self.order))
         self.action_flow_tuples = []
@@ -632,7 +763,13 @@ class DeferredOVSBridge(object):
     def delete_flows(self, **kwargs):
         self.action_flow_tuples.append(('del', kwargs))
 
-    def apply_flows(self):
+    def apply_flows(self, check_error=False):
+        '''Apply the deferred flow mods.
+
+        :param check_error: Optional, raise a RuntimeError if a flow mod
+                            could not be applied instead of only logging
+                            it. Errors are always raised with bundles.
+        '''
         action_flow_tuples = self.action_flow_tuples
         self.action_flow_tuples = []
         if not action_flow_tuples:
@@ -641,12 +778,20 @@ class DeferredOVSBridge(object):
         if not self.full_ordered:
             action_flow_tuples.sort(key=lambda af: self.weights[af[0]])
 
-        grouped = itertools.groupby(action_flow_tuples,
-                                    key=operator.itemgetter(0))
+        if self.use_bundle:
+            self.br.do_action_flows_bundle(action_flow_tuples)
+            return
+
+        grouped = itertools.groupby(
+            action_flow_tuples,
+            key=lambda af: (af[0], af[1].get('strict', False)))
         itemgetter_1 = operator.itemgetter(1)
-        for action, action_flow_list in grouped:
+        for (action, _strict), action_flow_list in grouped:
             flows = list(map(itemgetter_1, action_flow_list))
-            self.br.do_action_flows(action, flows)
+            if check_error:
+                self.br.do_action_flows(action, flows, check_error=True)
+            else:
+                self.br.do_action_flows(action, flows)
 
     def __enter__(self):
         return self
@@ -659,7 +804,159 @@ class DeferredOVSBridge(object):
                           self.br.br_name)
 
 
-def _build_flow_expr_str(flow_dict, cmd):
+class FlowTableReconciler(object):
+    '''Reconcile the flow mods sent to a bridge with its flow table.
+
+    The flow table dumped when the reconciliation starts is the installed
+    state, the added flows are the desired state. An added flow with the
+    same table, match, priority and actions as an installed one doesn't
+    need to be sent to the switch: it is only recorded with its cookie,
+    to be stamped on the installed flow at the end of the reconciliation.
+    Flows with timeouts are always sent.
+    The installed flows possibly matched by a deletion or a modification
+    are forgotten, so that they are added again if they are still wanted.
+    The cookie of a recorded flow is only stamped if the flow is still
+    installed with the same actions at the end of the reconciliation.
+    '''
+
+    def __init__(self, installed_flows):
+        # table -> {match: (cookie, actions)}
+        self._installed = collections.defaultdict(dict)
+        # (table, match) -> (cookie, actions, flow_str) of the flows left
+        # untouched
+        self._kept = {}
+        self.unchanged = 0
+        self.installed = 0
+        for flow in _parse_dumped_flows(installed_flows):
+            if not flow['timeouts']:
+                self._installed[flow['table']][flow['match']] = (
+                    flow['cookie'], flow['actions'])
+
+    def needs_flow_mod(self, action, flow_str):
+        flow = _parse_flow_str(flow_str)
+        if action != 'add':
+            self._forget_matching_flows(flow)
+            return True
+        table, match = flow['table'] or 0, flow['match']
+        installed = self._installed[table]
+        if flow['timeouts']:
+            installed.pop(match, None)
+            self._kept.pop((table, match), None)
+            self.installed += 1
+            return True
+        if (match in installed and
+                installed[match][1] == flow['actions']):
+            self._kept[(table, match)] = (flow['cookie'], flow['actions'],
+                                          flow_str)
+            self.unchanged += 1
+            return False
+        installed[match] = (flow['cookie'], flow['actions'])
+        self._kept.pop((table, match), None)
+        self.installed += 1
+        return True
+
+    def _forget_matching_flows(self, flow):
+        if flow['table'] is None:
+            tables = list(self._installed)
+        else:
+            tables = [flow['table']]
+        fields = dict(token.partition('=')[::2] for token in flow['match']
+                      if '=' in token and '/' not in token)
+        for table in tables:
+            installed = self._installed[table]
+            for match, (cookie, _actions) in list(installed.items()):
+                if (flow['cookie'] is not None and flow['cookie_masked'] and
+                        cookie != flow['cookie']):
+                    continue
+                if _is_match_distinct(fields, match):
+                    continue
+                del installed[match]
+
+    def get_cookie_updates(self, installed_flows):
+        '''Return the flow mods stamping the kept flows with their cookie.'''
+        flow_strs = []
+        for flow in _parse_dumped_flows(installed_flows):
+            cookie, actions, _flow_str = self._kept.get(
+                (flow['table'], flow['match']), (None, None, None))
+            if (cookie is None or cookie == flow['cookie'] or
+                    actions != flow['actions']):
+                continue
+            flow_strs.append(','.join(
+                ['table=%s' % flow['table'], 'cookie=%s' % cookie] +
+                flow['raw_match'] + ['actions=%s' % flow['raw_actions']]))
+        return flow_strs
+
+    def get_kept_flows(self):
+        '''Return the flow mods adding again the kept flows.'''
+        return [flow_str for _cookie, _actions, flow_str
+                in self._kept.values()]
+
+
+def _is_match_distinct(fields, match):
+    """Check if the fields can't match the flow match tokens."""
+    for token in match:
+        key, sep, value = token.partition('=')
+        if sep and '/' not in value and fields.get(key, value) != value:
+            return True
+    return False
+
+
+def _normalize_flow_value(value):
+    parts = []
+    for part in value.lower().split('/'):
+        try:
+            part = str(int(part, 0))
+        except ValueError:
+            pass
+        parts.append(part)
+    return '/'.join(parts)
+
+
+def _parse_flow_str(flow_str):
+    """Parse a flow mod string or a flow of a dump-flows output."""
+    head, _sep, actions = flow_str.partition('actions=')
+    flow = {'table': None, 'cookie': None, 'cookie_masked': False,
+            'timeouts': False, 'raw_match': [],
+            'raw_actions': actions.strip(),
+            'actions': actions.strip().lower()}
+    match = set()
+    for token in head.replace(' ', ',').split(','):
+        if not token:
+            continue
+        key, sep, value = token.partition('=')
+        if key == 'table':
+            flow['table'] = int(value)
+        elif key == 'cookie':
+            cookie, _sep, mask = value.partition('/')
+            flow['cookie'] = int(cookie, 0)
+            flow['cookie_masked'] = bool(mask) and (
+                int(mask, 0) & UINT64_BITMASK == UINT64_BITMASK)
+        elif key in _FLOW_TIMEOUT_FIELDS:
+            flow['timeouts'] = flow['timeouts'] or int(value) != 0
+        elif key not in _FLOW_STATS_FIELDS:
+            flow['raw_match'].append(token)
+            if sep:
+                match.add('%s=%s' % (key, _normalize_flow_value(value)))
+            else:
+                match.add(key.lower())
+    flow['match'] = frozenset(match)
+    return flow
+
+
+def _parse_dumped_flows(flow_strs):
+    for flow_str in flow_strs:
+        if 'actions=' not in flow_str:
+            continue
+        flow = _parse_flow_str(flow_str)
+        if flow['table'] is None:
+            flow['table'] = 0
+        if not any(token.startswith('priority=') for token in flow['match']):
+            flow['match'] = flow['match'] | frozenset(
+                ['priority=%s' % DEFAULT_FLOW_PRIORITY])
+        yield flow
+
+
+def _build_flow_expr_str(flow_dict, cmd, strict=False):
     flow_expr_arr = []
     actions = None
 
@@ -670,8 +967,9 @@ def _build_flow_expr_str(flow_dict, cmd):
                              flow_dict.pop('idle_timeout', '0'))
         flow_expr_arr.append("priority=%s" %
                              flow_dict.pop('priority', '1'))
-    elif 'priority' in flow_dict:
-        msg = _("Cannot match priority on flow deletion or modification")
+    elif 'priority' in flow_dict and not strict:
+        msg = _("Cannot match priority on flow deletion or modification "
+                "without strict matching")
         raise exceptions.InvalidInput(error_message=msg)
 
     if cmd != 'del':
@@ -22,6 +22,7 @@ from neutron_lib import exceptions
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging
+from oslo_serialization import jsonutils
 from oslo_service import loopingcall
 from oslo_utils import importutils
 
@@ -39,6 +40,8 @@ from neutron import manager
 
 LOG = logging.getLogger(__name__)
 
+NETWORK_CACHE_FILE = 'network_cache.json'
+
 
 class DhcpAgent(manager.Manager):
     """DHCP agent service manager.
@@ -55,6 +58,9 @@ class DhcpAgent(manager.Manager):
         super(DhcpAgent, self).__init__(host=host)
         self.needs_resync_reasons = collections.defaultdict(list)
         self.dhcp_ready_ports = set()
+        # network_id -> ids of the ports waiting for the deferred reload
+        self._pending_reloads = {}
+        self._reload_stats = collections.Counter()
         self.conf = conf or cfg.CONF
         self.cache = NetworkCache()
         self.dhcp_driver_cls = importutils.import_class(self.conf.dhcp_driver)
@@ -63,6 +69,10 @@ class DhcpAgent(manager.Manager):
         # create dhcp dir to store dhcp info
         dhcp_dir = os.path.dirname("/%s/dhcp/" % self.conf.state_path)
         utils.ensure_dir(dhcp_dir)
+        self._network_cache_file = os.path.join(dhcp_dir, NETWORK_CACHE_FILE)
+        # ids of the networks restored from the network cache snapshot and
+        # not configured since
+        self._restored_network_ids = set()
         self.dhcp_version = self.dhcp_driver_cls.check_version()
         self._populate_networks_cache()
         # keep track of mappings between networks and routers for
@@ -81,8 +91,14 @@ class DhcpAgent(manager.Manager):
             existing_networks = self.dhcp_driver_cls.existing_dhcp_networks(
                 self.conf
             )
+            restored_networks = self._load_network_cache_snapshot()
             for net_id in existing_networks:
-                net = dhcp.NetModel({"id": net_id, "subnets": [], "ports": []})
+                net = restored_networks.get(net_id)
+                if net:
+                    self._restored_network_ids.add(net_id)
+                else:
+                    net = dhcp.NetModel(
+                        {"id": net_id, "subnets": [], "ports": []})
                 self.cache.put(net)
         except NotImplementedError:
             # just go ahead with an empty networks cache
@@ -90,6 +106,31 @@ class DhcpAgent(manager.Manager):
                       "list of existing networks",
                       self.conf.dhcp_driver)
 
+    def _load_network_cache_snapshot(self):
+        """Return the networks of the cache snapshot, by id."""
+        if (not self.conf.persist_network_cache or
+                not os.path.exists(self._network_cache_file)):
+            return {}
+        try:
+            networks = NetworkCache.load_snapshot(self._network_cache_file)
+        except Exception:
+            LOG.warning(_LW("Unable to load the network cache snapshot %s, "
+                            "all the networks will be configured again."),
+                        self._network_cache_file, exc_info=True)
+            return {}
+        LOG.info(_LI("Restored %d networks from the network cache "
+                     "snapshot."), len(networks))
+        return {net.id: net for net in networks}
+
+    def _save_network_cache_snapshot(self):
+        if not self.conf.persist_network_cache or not self.cache.dirty:
+            return
+        try:
+            self.cache.save_snapshot(self._network_cache_file)
+        except Exception:
+            LOG.exception(_LE("Unable to save the network cache snapshot "
+                              "%s."), self._network_cache_file)
+
     def after_start(self):
         self.run()
         LOG.info(_LI("DHCP agent started"))
@@ -154,9 +195,22 @@ class DhcpAgent(manager.Manager):
         known_network_ids = set(self.cache.get_network_ids())
 
         try:
-            active_networks = self.plugin_rpc.get_active_networks_info()
-            LOG.info(_LI('All active networks have been fetched through RPC.'))
-            active_network_ids = set(network.id for network in active_networks)
+            active_network_ids = None
+            if self.conf.sync_networks_batch_size:
+                active_network_ids = self._get_active_network_ids()
+            if active_network_ids is None:
+                active_networks = self.plugin_rpc.get_active_networks_info()
+                LOG.info(_LI('All active networks have been fetched through '
+                             'RPC.'))
+                active_network_ids = set(
+                    network.id for network in active_networks)
+                network_batches = [active_networks]
+            else:
+                network_batches = self._iter_active_networks_info(
+                    [net_id for net_id in sorted(active_network_ids)
+                     if (not only_nets or
+                         net_id not in known_network_ids or
+                         net_id in only_nets)])
             for deleted_id in known_network_ids - active_network_ids:
                 try:
                     self.disable_dhcp_helper(deleted_id)
@@ -165,15 +219,22 @@ class DhcpAgent(manager.Manager):
                     LOG.exception(_LE('Unable to sync network state on '
                                       'deleted network %s'), deleted_id)
 
-            for network in active_networks:
-                if (not only_nets or  # specifically resync all
-                        network.id not in known_network_ids or  # missing net
-                        network.id in only_nets):  # specific network to sync
-                    pool.spawn(self.safe_configure_dhcp_for_network, network)
-            pool.waitall()
+            # NOTE: with batches, the next batch is fetched while the
+            # networks of the previous ones are configured by the pool.
+            try:
+                for active_networks in network_batches:
+                    for network in active_networks:
+                        if (not only_nets or  # specifically resync all
+                                network.id not in known_network_ids or
+                                network.id in only_nets):
+                            pool.spawn(self.safe_configure_dhcp_for_network,
+                                       network)
+            finally:
+                pool.waitall()
             # we notify all ports in case some were created while the agent
             # was down
             self.dhcp_ready_ports |= set(self.cache.get_port_ids())
+            self._save_network_cache_snapshot()
             LOG.info(_LI('Synchronizing state complete'))
 
         except Exception as e:
@@ -184,6 +245,36 @@ class DhcpAgent(manager.Manager):
                 self.schedule_resync(e)
             LOG.exception(_LE('Unable to sync network state.'))
 
+    def _get_active_network_ids(self):
+        """Return the ids of the active networks, None if not supported."""
+        try:
+            network_ids = set(self.plugin_rpc.get_active_network_ids())
+        except oslo_messaging.UnsupportedVersion:
+            network_ids = None
+        except oslo_messaging.RemoteError as e:
+            if e.exc_type not in ('NoSuchMethod', 'UnsupportedVersion'):
+                raise
+            network_ids = None
+        if network_ids is None:
+            LOG.info(_LI("Server does not support retrieving the network "
+                         "ids, fetching all the networks at once."))
+        else:
+            LOG.info(_LI('%d active network ids have been fetched through '
+                         'RPC.'), len(network_ids))
+        return network_ids
+
+    def _iter_active_networks_info(self, network_ids):
+        """Fetch the info of the given networks in batches."""
+        batch_size = self.conf.sync_networks_batch_size
+        for i in range(0, len(network_ids), batch_size):
+            networks = self.plugin_rpc.get_active_networks_info(
+                network_ids=network_ids[i:i + batch_size])
+            LOG.debug('Fetched the info of %(count)d networks, %(left)d '
+                      'left', {'count': len(networks),
+                               'left': max(len(network_ids) - i - batch_size,
+                                           0)})
+            yield networks
+
     def _dhcp_ready_ports_loop(self):
         """Notifies the server of any ports that had reservations setup."""
         while True:
@@ -220,6 +311,7 @@ class DhcpAgent(manager.Manager):
         """Resync the dhcp state at the configured interval."""
         while True:
             eventlet.sleep(self.conf.resync_interval)
+            self._save_network_cache_snapshot()
             if self.needs_resync_reasons:
                 # be careful to avoid a race with additions to list
                 # from other threads
@@ -274,7 +366,8 @@ class DhcpAgent(manager.Manager):
 
         for subnet in network.subnets:
             if subnet.enable_dhcp:
-                if self.call_driver('enable', network):
+                if self.call_driver(self._get_configure_action(network),
+                                    network):
                     dhcp_network_enabled = True
                     self.cache.put(network)
                     # After enabling dhcp for network, mark all existing
@@ -295,6 +388,32 @@ class DhcpAgent(manager.Manager):
             # delete any metadata_proxy.
             self.disable_isolated_metadata_proxy(network)
 
+    def _get_configure_action(self, network):
+        """Return the driver action configuring DHCP for a network.
+
+        A network restored from the cache snapshot which did not change on
+        the server only needs its still running DHCP server to be reloaded.
+        """
+        if network.id not in self._restored_network_ids:
+            return 'enable'
+        self._restored_network_ids.discard(network.id)
+        cached = self.cache.get_network_by_id(network.id)
+        # NOTE: the ports updated by notifications are appended to the
+        # cached network, the order of the ports does not matter.
+        if (not cached or
+                dict(network, ports=None) != dict(cached, ports=None) or
+                {p.id: p for p in network.ports} !=
+                {p.id: p for p in cached.ports}):
+            return 'enable'
+        driver = self.dhcp_driver_cls(self.conf, network,
+                                      self._process_monitor,
+                                      self.dhcp_version, self.plugin_rpc)
+        if not driver.active:
+            return 'enable'
+        LOG.debug('Network %s did not change since the cache snapshot, '
+                  'reloading its DHCP server', network.id)
+        return 'reload_allocations'
+
     def disable_dhcp_helper(self, network_id):
         """Disable DHCP for a network known to the agent."""
         network = self.cache.get_network_by_id(network_id)
@@ -329,8 +448,8 @@ class DhcpAgent(manager.Manager):
         old_cidrs = [s.cidr for s in old_network.subnets]
         new_cidrs = [s.cidr for s in network.subnets]
         if old_cidrs == new_cidrs:
-            self.call_driver('reload_allocations', network)
             self.cache.put(network)
+            self.reload_allocations(network)
         elif self.call_driver('restart', network):
             self.cache.put(network)
 
@@ -388,8 +507,11 @@ class DhcpAgent(manager.Manager):
                 if old_ips != new_ips:
                     driver_action = 'restart'
             self.cache.put_port(updated_port)
-            self.call_driver(driver_action, network)
-            self.dhcp_ready_ports.add(updated_port.id)
+            if driver_action == 'restart':
+                self.call_driver(driver_action, network)
+                self.dhcp_ready_ports.add(updated_port.id)
+            else:
+                self.reload_allocations(network, [updated_port.id])
 
     def _is_port_on_this_agent(self, port):
         thishost = utils.get_dhcp_agent_device_id(
@@ -406,7 +528,52 @@ class DhcpAgent(manager.Manager):
         if port:
             network = self.cache.get_network_by_id(port.network_id)
             self.cache.remove_port(port)
+            self.reload_allocations(network)
+
+    def reload_allocations(self, network, port_ids=()):
+        """Reload the DHCP allocations of a network.
+
+        When reload_allocations_delay is set, the reload is deferred and all
+        the events received for the network in the meantime are applied with
+        a single driver call. The given ports are reported ready once their
+        network has been reloaded.
+        """
+        self._reload_stats['events'] += 1
+        delay = self.conf.reload_allocations_delay
+        if not delay:
+            self._reload_stats['reloads'] += 1
+            self.call_driver('reload_allocations', network)
+            self.dhcp_ready_ports |= set(port_ids)
+            return
+        if network.id not in self._pending_reloads:
+            self._pending_reloads[network.id] = set()
+            eventlet.spawn_after(delay, self._process_pending_reload,
+                                 network.id)
+        self._pending_reloads[network.id] |= set(port_ids)
+
+    @utils.synchronized('dhcp-agent')
+    def _process_pending_reload(self, network_id):
+        port_ids = self._pending_reloads.pop(network_id, None)
+        if port_ids is None:
+            return
+        # The cache holds the network with all the changes received since
+        # the reload was requested.
+        network = self.cache.get_network_by_id(network_id)
+        if network:
+            self._reload_stats['reloads'] += 1
             self.call_driver('reload_allocations', network)
+        self.dhcp_ready_ports |= port_ids
+
+    def _report_reload_stats(self):
+        stats = {'events': self._reload_stats['events'],
+                 'reloads': self._reload_stats['reloads'],
+                 'pending': len(self._pending_reloads)}
+        self._reload_stats.clear()
+        if stats['events']:
+            LOG.info(_LI("DHCP allocation events received: %(events)d, "
+                         "reloads performed: %(reloads)d, networks waiting "
+                         "for a reload: %(pending)d"), stats)
+        return stats
 
     def enable_isolated_metadata_proxy(self, network):
 
@@ -464,6 +631,8 @@ class DhcpPluginApi(object):
         1.1 - Added get_active_networks_info, create_dhcp_port,
               and update_dhcp_port methods.
         1.5 - Added dhcp_ready_on_ports
+        1.7 - Added get_active_network_ids and the network_ids argument of
+              get_active_networks_info
 
     """
 
@@ -476,11 +645,26 @@ class DhcpPluginApi(object):
                 version='1.0')
         self.client = n_rpc.get_client(target)
 
-    def get_active_networks_info(self):
-        """Make a remote process call to retrieve all network info."""
-        cctxt = self.client.prepare(version='1.1')
-        networks = cctxt.call(self.context, 'get_active_networks_info',
-                              host=self.host)
+    def get_active_network_ids(self):
+        """Make a remote process call to retrieve the active network ids."""
+        cctxt = self.client.prepare(version='1.7')
+        return cctxt.call(self.context, 'get_active_network_ids',
+                          host=self.host)
+
+    def get_active_networks_info(self, network_ids=None):
+        """Make a remote process call to retrieve all network info.
+
+        Only the info of the networks in network_ids is retrieved when it
+        is given.
+        """
+        if network_ids is None:
+            cctxt = self.client.prepare(version='1.1')
+            networks = cctxt.call(self.context, 'get_active_networks_info',
+                                  host=self.host)
+        else:
+            cctxt = self.client.prepare(version='1.7')
+            networks = cctxt.call(self.context, 'get_active_networks_info',
+                                  host=self.host, network_ids=network_ids)
         return [dhcp.NetModel(n) for n in networks]
 
     def get_network_info(self, network_id):
@@ -523,10 +707,34 @@ class DhcpPluginApi(object):
 
 class NetworkCache(object):
     """Agent cache of the current network state."""
+
+    # Version of the snapshot file format written by save_snapshot
+    SNAPSHOT_VERSION = 1
+
     def __init__(self):
         self.cache = {}
         self.subnet_lookup = {}
         self.port_lookup = {}
+        # True when the cache changed since the last snapshot
+        self.dirty = False
+
+    def save_snapshot(self, filename):
+        """Atomically write the cached networks to filename."""
+        data = jsonutils.dumps({'version': self.SNAPSHOT_VERSION,
+                                'networks': list(self.cache.values())},
+                               separators=(',', ':'))
+        utils.replace_file(filename, data)
+        self.dirty = False
+
+    @classmethod
+    def load_snapshot(cls, filename):
+        """Return the networks of a snapshot written by save_snapshot."""
+        with open(filename) as f:
+            data = jsonutils.loads(f.read())
+        if data.get('version') != cls.SNAPSHOT_VERSION:
+            raise ValueError(_('Unsupported network cache snapshot version '
+                               '%s') % data.get('version'))
+        return [dhcp.NetModel(network) for network in data['networks']]
 
     def get_port_ids(self):
         return self.port_lookup.keys()
@@ -548,6 +756,7 @@ class NetworkCache(object):
             self.remove(self.cache[network.id])
 
         self.cache[network.id] = network
+        self.dirty = True
 
         for subnet in network.subnets:
             self.subnet_lookup[subnet.id] = network.id
@@ -557,6 +766,7 @@ class NetworkCache(object):
 
     def remove(self, network):
         del self.cache[network.id]
+        self.dirty = True
 
         for subnet in network.subnets:
             del self.subnet_lookup[subnet.id]
@@ -574,6 +784,7 @@ class NetworkCache(object):
             network.ports.append(port)
 
         self.port_lookup[port.id] = network.id
+        self.dirty = True
 
     def remove_port(self, port):
         network = self.get_network_by_port_id(port.id)
@@ -582,6 +793,7 @@ class NetworkCache(object):
             if network.ports[index] == port:
                 del network.ports[index]
                 del self.port_lookup[port.id]
+                self.dirty = True
                 break
 
     def get_port_by_id(self, port_id):
@@ -631,6 +843,7 @@ class DhcpAgentWithStateReport(DhcpAgent):
         try:
             self.agent_state.get('configurations').update(
                 self.cache.get_state())
+            self._report_reload_stats()
             ctx = context.get_admin_context_without_session()
             agent_status = self.state_rpc.report_state(
                 ctx, self.agent_state, True)
@@ -83,6 +83,7 @@ class L3PluginApi(object):
               - delete_agent_gateway_port
         1.8 - Added address scope information
         1.9 - Added get_router_ids
+        1.10 - Added router_revisions to sync_routers
     """
 
     def __init__(self, topic, host):
@@ -90,8 +91,18 @@ class L3PluginApi(object):
         target = oslo_messaging.Target(topic=topic, version='1.0')
         self.client = n_rpc.get_client(target)
 
-    def get_routers(self, context, router_ids=None):
-        """Make a remote process call to retrieve the sync data for routers."""
+    def get_routers(self, context, router_ids=None, router_revisions=None):
+        """Make a remote process call to retrieve the sync data for routers.
+
+        When router_revisions maps router ids to the sync revisions known by
+        the agent, the routers which did not change since are returned as
+        stubs flagged as 'unchanged'.
+        """
+        if router_revisions:
+            cctxt = self.client.prepare(version='1.10')
+            return cctxt.call(context, 'sync_routers', host=self.host,
+                              router_ids=router_ids,
+                              router_revisions=router_revisions)
         cctxt = self.client.prepare()
         return cctxt.call(context, 'sync_routers', host=self.host,
                           router_ids=router_ids)
@@ -193,6 +204,10 @@ class L3NATAgent(ha.AgentMixin,
         self.plugin_rpc = L3PluginApi(topics.L3PLUGIN, host)
         self.fullsync = True
         self.sync_routers_chunk_size = SYNC_ROUTERS_MAX_CHUNK_SIZE
+        # Sync revisions of the routers processed by the agent, sent to the
+        # server on full syncs so that unchanged routers are not resent.
+        self._router_sync_revisions = {}
+        self._router_sync_revisions_supported = True
 
         # Get the list of service plugins from Neutron Server
         # This is the first place where we contact neutron-server on startup
@@ -230,7 +245,8 @@ class L3NATAgent(ha.AgentMixin,
         self.namespaces_manager = namespace_manager.NamespaceManager(
             self.conf,
             self.driver,
-            self.metadata_driver)
+            self.metadata_driver,
+            clean_stale_in_background=True)
 
         self._queue = queue.RouterProcessingQueue()
         super(L3NATAgent, self).__init__(host=self.conf.host)
@@ -328,6 +344,9 @@ class L3NATAgent(ha.AgentMixin,
         return legacy_router.LegacyRouter(*args, **kwargs)
 
     def _router_added(self, router_id, router):
+        # The stale namespaces of the router may still be deleted in the
+        # background after a full sync
+        self.namespaces_manager.keep_router(router_id)
         ri = self._create_router(router_id, router)
         registry.notify(resources.ROUTER, events.BEFORE_CREATE,
                         self, router=ri)
@@ -360,6 +379,7 @@ class L3NATAgent(ha.AgentMixin,
 
         ri.delete(self)
         del self.router_info[router_id]
+        self._router_sync_revisions.pop(router_id, None)
 
         registry.notify(resources.ROUTER, events.AFTER_DELETE, self, router=ri)
 
@@ -487,18 +507,64 @@ class L3NATAgent(ha.AgentMixin,
                     LOG.error(_LE("Removing incompatible router '%s'"),
                               router['id'])
                     self._safe_router_removed(router['id'])
+                self._router_sync_revisions.pop(router['id'], None)
             except Exception:
                 msg = _LE("Failed to process compatible router '%s'")
                 LOG.exception(msg, update.id)
+                self._router_sync_revisions.pop(update.id, None)
                 self._resync_router(update)
                 continue
+            else:
+                self._set_router_sync_revision(update.id,
+                                               router.get('sync_revision'))
 
             LOG.debug("Finished a router update for %s", update.id)
             rp.fetched_and_processed(update.timestamp)
 
+    def _set_router_sync_revision(self, router_id, revision):
+        if revision and router_id in self.router_info:
+            self._router_sync_revisions[router_id] = revision
+        else:
+            self._router_sync_revisions.pop(router_id, None)
+
+    def _get_routers_for_sync(self, context, router_ids):
+        """Fetch the routers, leaving out the data of unchanged ones."""
+        revisions = None
+        if self._router_sync_revisions_supported:
+            known_revisions = self._router_sync_revisions
+            revisions = dict((router_id, known_revisions[router_id])
+                             for router_id in router_ids
+                             if router_id in known_revisions)
+        if not revisions:
+            return self.plugin_rpc.get_routers(context, router_ids)
+        try:
+            return self.plugin_rpc.get_routers(context, router_ids,
+                                               router_revisions=revisions)
+        except oslo_messaging.UnsupportedVersion:
+            pass
+        except oslo_messaging.RemoteError as e:
+            if e.exc_type not in ('NoSuchMethod', 'UnsupportedVersion'):
+                raise
+        LOG.info(_LI("Server does not support router sync revisions, "
+                     "fetching the full data of all the routers."))
+        self._router_sync_revisions_supported = False
+        return self.plugin_rpc.get_routers(context, router_ids)
+
+    def _report_processing_stats(self):
+        stats = self._queue.stats.report()
+        stats['queue_depth'] = self._queue.qsize()
+        if stats['count'] or stats['queue_depth']:
+            LOG.info(_LI("Router updates processed: %(count)d, queued: "
+                         "%(queue_depth)d, wait time avg/max: "
+                         "%(avg_wait_time).3f/%(max_wait_time).3f seconds, "
+                         "processing time avg/max: "
+                         "%(avg_process_time).3f/%(max_process_time).3f "
+                         "seconds"), stats)
+        return stats
+
     def _process_routers_loop(self):
         LOG.debug("Starting _process_routers_loop")
-        pool = eventlet.GreenPool(size=8)
+        pool = eventlet.GreenPool(size=self.conf.router_processing_workers)
         while True:
             pool.spawn_n(self._process_router_update)
 
@@ -534,12 +600,26 @@ class L3NATAgent(ha.AgentMixin,
         try:
             router_ids = self.plugin_rpc.get_router_ids(context)
             # fetch routers by chunks to reduce the load on server and to
-            # start router processing earlier
-            for i in range(0, len(router_ids), self.sync_routers_chunk_size):
-                routers = self.plugin_rpc.get_routers(
-                    context, router_ids[i:i + self.sync_routers_chunk_size])
+            # start router processing earlier. The chunks are queued as soon
+            # as they are fetched and start small, doubling up to the chunk
+            # size, so that the first routers are processed within seconds
+            # while the next chunks are being fetched.
+            chunk_size = min(SYNC_ROUTERS_MIN_CHUNK_SIZE,
+                             self.sync_routers_chunk_size)
+            i = 0
+            while i < len(router_ids):
+                routers = self._get_routers_for_sync(
+                    context, router_ids[i:i + chunk_size])
+                i += chunk_size
+                chunk_size = min(chunk_size * 2, self.sync_routers_chunk_size)
                 LOG.debug('Processing :%r', routers)
                 for r in routers:
+                    ri = self.router_info.get(r['id'])
+                    unchanged = r.get('unchanged') and ri is not None
+                    if unchanged:
+                        # The router did not change since it was last
+                        # processed, only its namespaces have to be kept.
+                        r = ri.router
                     curr_router_ids.add(r['id'])
                     ns_manager.keep_router(r['id'])
                     if r.get('distributed'):
@@ -552,10 +632,13 @@ class L3NATAgent(ha.AgentMixin,
                             ns_manager.keep_ext_net(ext_net_id)
                         elif is_snat_agent:
                             ns_manager.ensure_snat_cleanup(r['id'])
+                    if unchanged:
+                        continue
+                    # A stub of a router removed meanwhile is fetched again
                     update = queue.RouterUpdate(
                         r['id'],
                         queue.PRIORITY_SYNC_ROUTERS_TASK,
-                        router=r,
+                        router=None if r.get('unchanged') else r,
                         timestamp=timestamp)
                     self._queue.add(update)
         except oslo_messaging.MessagingTimeout:
@@ -658,6 +741,7 @@ class L3NATAgentWithStateReport(L3NATAgent):
         configurations['ex_gw_ports'] = num_ex_gw_ports
         configurations['interfaces'] = num_interfaces
         configurations['floating_ips'] = num_floating_ips
+        self._report_processing_stats()
         try:
             agent_status = self.state_rpc.report_state(self.context,
                                                        self.agent_state,
@@ -687,4 +771,6 @@ class L3NATAgentWithStateReport(L3NATAgent):
     def agent_updated(self, context, payload):
         """Handle the agent_updated notification event."""
         self.fullsync = True
+        # Process all the routers again with the new agent settings
+        self._router_sync_revisions.clear()
         LOG.info(_LI("agent_updated by server side %s!"), payload)
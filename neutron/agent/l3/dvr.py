@@ -38,6 +38,7 @@ class AgentMixin(object):
         if fip_ns and not fip_ns.destroyed:
             return fip_ns
 
+        self.namespaces_manager.keep_ext_net(ext_net_id)
         fip_ns = dvr_fip_ns.FipNamespace(ext_net_id,
                                          self.conf,
                                          self.driver,
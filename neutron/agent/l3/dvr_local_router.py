@@ -100,10 +100,9 @@ class DvrLocalRouter(dvr_router_base.DvrRouterBase):
         interface_name = (
             self.fip_ns.get_ext_device_name(
                 self.fip_ns.agent_gateway_port['id']))
-        ip_lib.send_ip_addr_adv_notif(fip_ns_name,
-                                      interface_name,
-                                      floating_ip,
-                                      self.agent_conf)
+        self.send_ip_addr_adv_notif(fip_ns_name,
+                                    interface_name,
+                                    floating_ip)
         # update internal structures
         self.dist_fip_count = self.dist_fip_count + 1
 
@@ -15,7 +15,6 @@
 from neutron_lib import constants as l3_constants
 
 from neutron.agent.l3 import router_info as router
-from neutron.agent.linux import ip_lib
 
 
 class LegacyRouter(router.RouterInfo):
@@ -25,8 +24,7 @@ class LegacyRouter(router.RouterInfo):
 
         # As GARP is processed in a distinct thread the call below
         # won't raise an exception to be handled.
-        ip_lib.send_ip_addr_adv_notif(self.ns_name,
-                                      interface_name,
-                                      fip['floating_ip_address'],
-                                      self.agent_conf)
+        self.send_ip_addr_adv_notif(self.ns_name,
+                                    interface_name,
+                                    fip['floating_ip_address'])
         return l3_constants.FLOATINGIP_STATUS_ACTIVE
@@ -10,6 +10,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
+from oslo_concurrency import lockutils
 from oslo_log import log as logging
 
 from neutron._i18n import _LE
@@ -49,16 +51,23 @@ class NamespaceManager(object):
         dvr_fip_ns.FIP_NS_PREFIX: dvr_fip_ns.FipNamespace,
     }
 
-    def __init__(self, agent_conf, driver, metadata_driver=None):
+    def __init__(self, agent_conf, driver, metadata_driver=None,
+                 clean_stale_in_background=False):
         """Initialize the NamespaceManager.
 
         :param agent_conf: configuration from l3 agent
         :param driver: to perform operations on devices
         :param metadata_driver: used to cleanup stale metadata proxy processes
+        :param clean_stale_in_background: delete the stale namespaces in a
+                                          separate green thread instead of
+                                          blocking the end of the sync
         """
         self.agent_conf = agent_conf
         self.driver = driver
         self._clean_stale = True
+        self._clean_stale_in_background = clean_stale_in_background
+        self._cleaning_stale = False
+        self._ids_to_keep = set()
         self.metadata_driver = metadata_driver
         if metadata_driver:
             self.process_monitor = external_process.ProcessMonitor(
@@ -67,7 +76,8 @@ class NamespaceManager(object):
 
     def __enter__(self):
         self._all_namespaces = set()
-        self._ids_to_keep = set()
+        if not self._cleaning_stale:
+            self._ids_to_keep = set()
         if self._clean_stale:
             self._all_namespaces = self.list_all()
         return self
@@ -83,19 +93,47 @@ class NamespaceManager(object):
             return True
         self._clean_stale = False
 
+        stale_namespaces = []
         for ns in self._all_namespaces:
-            _ns_prefix, ns_id = self.get_prefix_and_id(ns)
-            if ns_id in self._ids_to_keep:
-                continue
-            self._cleanup(_ns_prefix, ns_id)
+            ns_prefix, ns_id = self.get_prefix_and_id(ns)
+            if ns_id not in self._ids_to_keep:
+                stale_namespaces.append((ns_prefix, ns_id))
+        if self._clean_stale_in_background:
+            self._cleaning_stale = True
+            eventlet.spawn_n(self._cleanup_stale, stale_namespaces)
+        else:
+            self._cleanup_stale(stale_namespaces)
 
         return True
 
+    @staticmethod
+    def _get_cleanup_lock(ns_id):
+        return lockutils.lock('stale-namespace-cleanup-%s' % ns_id)
+
+    def _cleanup_stale(self, stale_namespaces):
+        try:
+            for ns_prefix, ns_id in stale_namespaces:
+                # When cleaning in the background, routers are processed
+                # meanwhile and one may have been added back since the sync.
+                with self._get_cleanup_lock(ns_id):
+                    if ns_id not in self._ids_to_keep:
+                        self._cleanup(ns_prefix, ns_id)
+        finally:
+            self._cleaning_stale = False
+
+    def _keep(self, ns_id):
+        self._ids_to_keep.add(ns_id)
+        if self._cleaning_stale:
+            # Wait for the cleanup of the namespaces of ns_id to complete
+            # if it is in progress, so that they can be recreated.
+            with self._get_cleanup_lock(ns_id):
+                pass
+
     def keep_router(self, router_id):
-        self._ids_to_keep.add(router_id)
+        self._keep(router_id)
 
     def keep_ext_net(self, ext_net_id):
-        self._ids_to_keep.add(ext_net_id)
+        self._keep(ext_net_id)
 
     def get_prefix_and_id(self, ns_name):
         """Get the prefix and id from the namespace name.
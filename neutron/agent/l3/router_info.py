@@ -16,8 +16,9 @@ import collections
 import netaddr
 from neutron_lib import constants as l3_constants
 from oslo_log import log as logging
+from oslo_utils import timeutils
 
-from neutron._i18n import _, _LE, _LW
+from neutron._i18n import _, _LE, _LI, _LW
 from neutron.agent.l3 import namespaces
 from neutron.agent.linux import ip_lib
 from neutron.agent.linux import iptables_manager
@@ -51,6 +52,8 @@ class RouterInfo(object):
         self.ex_gw_port = None
         self._snat_enabled = None
         self.fip_map = {}
+        self._pending_garps = None
+        self._fip_address_changes = None
         self.internal_ports = []
         self.floating_ips = set()
         # Invoke the setter for establishing initial SNAT action
@@ -265,6 +268,8 @@ class RouterInfo(object):
         try:
             ip_cidr = common_utils.ip_to_cidr(fip['floating_ip_address'])
             device.addr.add(ip_cidr)
+            if self._fip_address_changes is not None:
+                self._fip_address_changes.append(('add', fip))
             return True
         except RuntimeError:
             # any exception occurred here should cause the floating IP
@@ -275,8 +280,50 @@ class RouterInfo(object):
     def add_floating_ip(self, fip, interface_name, device):
         raise NotImplementedError()
 
+    def send_ip_addr_adv_notif(self, ns_name, interface_name, address):
+        """Send the gratuitous ARP of a floating IP address.
+
+        While the floating IP addresses are processed, it is only sent once
+        all the addresses are configured.
+        """
+        if self._pending_garps is None:
+            ip_lib.send_ip_addr_adv_notif(ns_name, interface_name, address,
+                                          self.agent_conf)
+        else:
+            self._pending_garps[(ns_name, interface_name)][address] = None
+
+    def _send_pending_garps(self, pending_garps, failed_addresses):
+        for (ns_name, interface_name), addresses in pending_garps.items():
+            addresses = [address for address in addresses
+                         if address not in failed_addresses]
+            ip_lib.send_ip_addrs_adv_notif(ns_name, interface_name,
+                                           addresses, self.agent_conf)
+
     def remove_floating_ip(self, device, ip_cidr):
         device.delete_addr_and_conntrack_state(ip_cidr)
+        if self._fip_address_changes is not None:
+            self._fip_address_changes.append(('remove', ip_cidr))
+
+    def _retry_fip_address_changes(self, device, changes, fip_statuses):
+        """Apply one by one the address changes of a failed batch.
+
+        The changes queued before the failing one were applied by the batch,
+        they are skipped. The conntrack state cleanup of the addresses
+        removed by the batch was dropped along with it, so it is done for
+        them here.
+        """
+        existing_cidrs = set(addr['cidr'] for addr in device.addr.list())
+        for action, arg in changes:
+            if action == 'add':
+                ip_cidr = common_utils.ip_to_cidr(arg['floating_ip_address'])
+                if (ip_cidr not in existing_cidrs and
+                        not self._add_fip_addr_to_device(arg, device)):
+                    fip_statuses[arg['id']] = (
+                        l3_constants.FLOATINGIP_STATUS_ERROR)
+            elif arg in existing_cidrs:
+                device.delete_addr_and_conntrack_state(arg)
+            else:
+                device.delete_conntrack_state(arg)
 
     def move_floating_ip(self, fip):
         return l3_constants.FLOATINGIP_STATUS_ACTIVE
@@ -301,6 +348,46 @@ class RouterInfo(object):
             return fip_statuses
 
         device = ip_lib.IPDevice(interface_name, namespace=self.ns_name)
+        start = timeutils.now()
+        self._pending_garps = collections.defaultdict(
+            collections.OrderedDict)
+        self._fip_address_changes = []
+        try:
+            try:
+                # The address changes are applied together at the end
+                with device.batch():
+                    fip_statuses, added, removed = (
+                        self._process_floating_ip_addresses(
+                            device, interface_name))
+            except ip_lib.IPBatchError:
+                LOG.warning(_LW("Failed to configure the floating IP "
+                                "addresses of router %s together, "
+                                "configuring them one by one"),
+                            self.router_id)
+                changes, self._fip_address_changes = (
+                    self._fip_address_changes, None)
+                self._retry_fip_address_changes(device, changes,
+                                                fip_statuses)
+        finally:
+            pending_garps, self._pending_garps = self._pending_garps, None
+            self._fip_address_changes = None
+
+        failed_addresses = set(
+            fip['floating_ip_address'] for fip in self.get_floating_ips()
+            if (fip_statuses.get(fip['id']) ==
+                l3_constants.FLOATINGIP_STATUS_ERROR))
+        self._send_pending_garps(pending_garps, failed_addresses)
+        if added or removed:
+            LOG.info(_LI("Added %(added)d and removed %(removed)d floating "
+                         "IP addresses of router %(router)s in %(time).3f "
+                         "seconds"),
+                     {'added': added, 'removed': removed,
+                      'router': self.router_id,
+                      'time': timeutils.now() - start})
+        return fip_statuses
+
+    def _process_floating_ip_addresses(self, device, interface_name):
+        fip_statuses = {}
         existing_cidrs = self.get_router_cidrs(device)
         new_cidrs = set()
 
@@ -328,15 +415,16 @@ class RouterInfo(object):
                 # mark the status as not changed. we can't remove it because
                 # that's how the caller determines that it was removed
                 fip_statuses[fip['id']] = FLOATINGIP_STATUS_NOCHANGE
-        fips_to_remove = (
+        fips_to_remove = [
             ip_cidr for ip_cidr in existing_cidrs - new_cidrs
-            if common_utils.is_cidr_host(ip_cidr))
+            if common_utils.is_cidr_host(ip_cidr)]
         for ip_cidr in fips_to_remove:
             LOG.debug("Removing floating ip %s from interface %s in "
                       "namespace %s", ip_cidr, interface_name, self.ns_name)
             self.remove_floating_ip(device, ip_cidr)
 
-        return fip_statuses
+        return (fip_statuses, len(new_cidrs - existing_cidrs),
+                len(fips_to_remove))
 
     def configure_fip_addresses(self, interface_name):
         try:
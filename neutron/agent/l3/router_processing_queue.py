@@ -137,14 +137,54 @@ class ExclusiveRouterProcessor(object):
                     yield update
 
 
+class RouterProcessingStats(object):
+    """Wait and processing times of the router updates since last report.
+
+    The wait time of an update is the time between its timestamp, usually
+    when it was queued, and the start of its processing. The processing
+    time is the time spent fetching and applying it.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.process_time = 0.0
+        self.max_process_time = 0.0
+
+    def add(self, wait_time, process_time):
+        self.count += 1
+        self.wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        self.process_time += process_time
+        self.max_process_time = max(self.max_process_time, process_time)
+
+    def report(self):
+        """Return the statistics since the last report and reset them."""
+        count = self.count or 1
+        stats = {'count': self.count,
+                 'avg_wait_time': self.wait_time / count,
+                 'max_wait_time': self.max_wait_time,
+                 'avg_process_time': self.process_time / count,
+                 'max_process_time': self.max_process_time}
+        self.reset()
+        return stats
+
+
 class RouterProcessingQueue(object):
     """Manager of the queue of routers to process."""
     def __init__(self):
         self._queue = Queue.PriorityQueue()
+        self.stats = RouterProcessingStats()
 
     def add(self, update):
         self._queue.put(update)
 
+    def qsize(self):
+        return self._queue.qsize()
+
     def each_update_to_next_router(self):
         """Grabs the next router from the queue and processes
 
@@ -161,4 +201,10 @@ class RouterProcessingQueue(object):
             # rp.updates() will not yield and so this will essentially be a
             # noop.
             for update in rp.updates():
+                started_at = timeutils.utcnow()
+                wait_time = timeutils.delta_seconds(update.timestamp,
+                                                    started_at)
                 yield (rp, update)
+                self.stats.add(
+                    wait_time,
+                    timeutils.delta_seconds(started_at, timeutils.utcnow()))
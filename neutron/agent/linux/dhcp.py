@@ -15,6 +15,7 @@
 
 import abc
 import collections
+import hashlib
 import os
 import re
 import shutil
@@ -26,6 +27,7 @@ from neutron_lib import exceptions
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging
+from oslo_utils import encodeutils
 from oslo_utils import excutils
 from oslo_utils import uuidutils
 import six
@@ -117,6 +119,10 @@ class NetModel(DictModel):
         return self._ns_name
 
 
+PortConfigEntries = collections.namedtuple(
+    'PortConfigEntries', ['hosts', 'addn_hosts', 'opts'])
+
+
 @six.add_metaclass(abc.ABCMeta)
 class DhcpBase(object):
 
@@ -292,6 +298,22 @@ class Dnsmasq(DhcpLocalProcess):
 
     _ID = 'id:'
 
+    # Config generation and reload counters per network, shared by all the
+    # driver instances, which are created per call.
+    _config_stats = collections.defaultdict(collections.Counter)
+
+    # Digest of the config last loaded by dnsmasq per network, either when
+    # it was spawned or when it was sent a HUP by this agent process.
+    _loaded_config_digests = {}
+
+    def __init__(self, conf, network, process_monitor, version=None,
+                 plugin=None):
+        super(Dnsmasq, self).__init__(conf, network, process_monitor,
+                                      version, plugin)
+        self._changed_config_files = set()
+        self._config_file_digests = {}
+        self._port_config_entries = None
+
     @classmethod
     def check_version(cls):
         pass
@@ -428,20 +450,57 @@ class Dnsmasq(DhcpLocalProcess):
         """Spawns or reloads a Dnsmasq process for the network.
 
         When reload_with_HUP is True, dnsmasq receives a HUP signal,
-        or it's reloaded if the process is not running.
+        or it's reloaded if the process is not running. The HUP is not sent
+        when the config is the one dnsmasq was last spawned or reloaded with
+        by this agent process, so bursts of port events which do not affect
+        the dnsmasq config don't make it reload. The files on disk are not
+        trusted for this, as the agent may have written them and failed to
+        signal dnsmasq.
         """
 
+        self._changed_config_files.clear()
+        self._config_file_digests.clear()
+        start = time.time()
         self._output_config_files()
+        duration = time.time() - start
+        digest = self._get_config_digest()
 
         pm = self._get_process_manager(
             cmd_callback=self._build_cmdline_callback)
 
-        pm.enable(reload_cfg=reload_with_HUP)
+        active = pm.active
+        if (reload_with_HUP and active and
+                self._loaded_config_digests.get(self.network.id) == digest):
+            self._config_stats[self.network.id]['reloads_skipped'] += 1
+            LOG.debug('Config of dnsmasq for network %s is unchanged, '
+                      'not reloading it', self.network.id)
+        else:
+            self._loaded_config_digests.pop(self.network.id, None)
+            pm.enable(reload_cfg=reload_with_HUP)
+            if reload_with_HUP or not active:
+                self._loaded_config_digests[self.network.id] = digest
+            self._config_stats[self.network.id]['reloads'] += 1
+
+        stats = self._config_stats[self.network.id]
+        stats['config_generations'] += 1
+        stats['config_files_written'] += len(self._changed_config_files)
+        stats['config_generation_time'] += duration
+        LOG.debug('Generated dnsmasq config for network %(net)s in '
+                  '%(time).3f seconds, %(files)d files changed, '
+                  'stats: %(stats)s',
+                  {'net': self.network.id, 'time': duration,
+                   'files': len(self._changed_config_files),
+                   'stats': dict(stats)})
 
         self.process_monitor.register(uuid=self.network.id,
                                       service_name=DNSMASQ_SERVICE_NAME,
                                       monitored_process=pm)
 
+    def disable(self, retain_port=False):
+        super(Dnsmasq, self).disable(retain_port)
+        self._config_stats.pop(self.network.id, None)
+        self._loaded_config_digests.pop(self.network.id, None)
+
     def _release_lease(self, mac_address, ip, client_id):
         """Release a DHCP lease."""
         if netaddr.IPAddress(ip).version == constants.IP_VERSION_6:
@@ -456,9 +515,15 @@ class Dnsmasq(DhcpLocalProcess):
         ip_wrapper.netns.execute(cmd, run_as_root=True)
 
     def _output_config_files(self):
-        self._output_hosts_file()
-        self._output_addn_hosts_file()
-        self._output_opts_file()
+        # The port entries of the three files are generated in a single pass
+        # over the network ports.
+        self._port_config_entries = self._get_port_config_entries()
+        try:
+            self._output_hosts_file()
+            self._output_addn_hosts_file()
+            self._output_opts_file()
+        finally:
+            self._port_config_entries = None
 
     def reload_allocations(self):
         """Rebuild the dnsmasq config and signal the dnsmasq to reload."""
@@ -529,41 +594,68 @@ class Dnsmasq(DhcpLocalProcess):
             no_opts,  # A flag indication that options shouldn't be written
         )
         """
-        v6_nets = dict((subnet.id, subnet) for subnet in
-                       self.network.subnets if subnet.ip_version == 6)
+        v6_nets = self._get_v6_nets()
 
         for port in self.network.ports:
-            fixed_ips = self._sort_fixed_ips_for_dnsmasq(port.fixed_ips,
-                                                         v6_nets)
-            # Confirm whether Neutron server supports dns_name attribute in the
-            # ports API
-            dns_assignment = getattr(port, 'dns_assignment', None)
+            for host_tuple in self._iter_port_hosts(port, v6_nets):
+                yield host_tuple
+
+    def _get_v6_nets(self):
+        return dict((subnet.id, subnet) for subnet in
+                    self.network.subnets if subnet.ip_version == 6)
+
+    def _iter_port_hosts(self, port, v6_nets):
+        """Iterate over the hosts of a port, see `_iter_hosts`."""
+        fixed_ips = self._sort_fixed_ips_for_dnsmasq(port.fixed_ips, v6_nets)
+        # Confirm whether Neutron server supports dns_name attribute in the
+        # ports API
+        dns_assignment = getattr(port, 'dns_assignment', None)
+        if dns_assignment:
+            dns_ip_map = {d.ip_address: d for d in dns_assignment}
+        for alloc in fixed_ips:
+            no_dhcp = False
+            no_opts = False
+            if alloc.subnet_id in v6_nets:
+                addr_mode = v6_nets[alloc.subnet_id].ipv6_address_mode
+                no_dhcp = addr_mode in (n_const.IPV6_SLAAC,
+                                        n_const.DHCPV6_STATELESS)
+                # we don't setup anything for SLAAC. It doesn't make sense
+                # to provide options for a client that won't use DHCP
+                no_opts = addr_mode == n_const.IPV6_SLAAC
+
+            # If dns_name attribute is supported by ports API, return the
+            # dns_assignment generated by the Neutron server. Otherwise,
+            # generate hostname and fqdn locally (previous behaviour)
             if dns_assignment:
-                dns_ip_map = {d.ip_address: d for d in dns_assignment}
-            for alloc in fixed_ips:
-                no_dhcp = False
-                no_opts = False
-                if alloc.subnet_id in v6_nets:
-                    addr_mode = v6_nets[alloc.subnet_id].ipv6_address_mode
-                    no_dhcp = addr_mode in (n_const.IPV6_SLAAC,
-                                            n_const.DHCPV6_STATELESS)
-                    # we don't setup anything for SLAAC. It doesn't make sense
-                    # to provide options for a client that won't use DHCP
-                    no_opts = addr_mode == n_const.IPV6_SLAAC
-
-                # If dns_name attribute is supported by ports API, return the
-                # dns_assignment generated by the Neutron server. Otherwise,
-                # generate hostname and fqdn locally (previous behaviour)
-                if dns_assignment:
-                    hostname = dns_ip_map[alloc.ip_address].hostname
-                    fqdn = dns_ip_map[alloc.ip_address].fqdn
-                else:
-                    hostname = 'host-%s' % alloc.ip_address.replace(
-                        '.', '-').replace(':', '-')
-                    fqdn = hostname
-                    if self.conf.dhcp_domain:
-                        fqdn = '%s.%s' % (fqdn, self.conf.dhcp_domain)
-                yield (port, alloc, hostname, fqdn, no_dhcp, no_opts)
+                hostname = dns_ip_map[alloc.ip_address].hostname
+                fqdn = dns_ip_map[alloc.ip_address].fqdn
+            else:
+                hostname = 'host-%s' % alloc.ip_address.replace(
+                    '.', '-').replace(':', '-')
+                fqdn = hostname
+                if self.conf.dhcp_domain:
+                    fqdn = '%s.%s' % (fqdn, self.conf.dhcp_domain)
+            yield (port, alloc, hostname, fqdn, no_dhcp, no_opts)
+
+    def _get_port_config_entries(self):
+        """Return the hosts, addn_hosts and opts entries of each port."""
+        if self._port_config_entries is not None:
+            return self._port_config_entries
+        v6_nets = self._get_v6_nets()
+        dhcp_enabled_subnet_ids = [s.id for s in self.network.subnets
+                                   if s.enable_dhcp]
+        entries = []
+        for port in self.network.ports:
+            hosts = six.StringIO()
+            addn_hosts = six.StringIO()
+            for host_tuple in self._iter_port_hosts(port, v6_nets):
+                self._write_host_entry(hosts, host_tuple,
+                                       dhcp_enabled_subnet_ids)
+                self._write_addn_host_entry(addn_hosts, host_tuple)
+            entries.append(PortConfigEntries(hosts.getvalue(),
+                                             addn_hosts.getvalue(),
+                                             self._generate_port_opts(port)))
+        return entries
 
     def _get_port_extra_dhcp_opts(self, port):
         return getattr(port, edo_ext.EXTRADHCPOPTS, False)
@@ -638,49 +730,70 @@ class Dnsmasq(DhcpLocalProcess):
         should receive a dhcp lease, the hosts resolution in itself is
         defined by the `_output_addn_hosts_file` method.
         """
-        buf = six.StringIO()
         filename = self.get_conf_file_name('host')
 
         LOG.debug('Building host file: %s', filename)
-        dhcp_enabled_subnet_ids = [s.id for s in self.network.subnets
-                                   if s.enable_dhcp]
         # NOTE(ihrachyshka): the loop should not log anything inside it, to
         # avoid potential performance drop when lots of hosts are dumped
-        for host_tuple in self._iter_hosts():
-            port, alloc, hostname, name, no_dhcp, no_opts = host_tuple
-            if no_dhcp:
-                if not no_opts and self._get_port_extra_dhcp_opts(port):
-                    buf.write('%s,%s%s\n' %
-                              (port.mac_address, 'set:', port.id))
-                continue
+        contents = ''.join(entries.hosts
+                           for entries in self._get_port_config_entries())
 
-            # don't write ip address which belongs to a dhcp disabled subnet.
-            if alloc.subnet_id not in dhcp_enabled_subnet_ids:
-                continue
+        self._replace_config_file(filename, contents)
+        LOG.debug('Done building host file %s', filename)
+        return filename
 
-            ip_address = self._format_address_for_dnsmasq(alloc.ip_address)
+    def _write_host_entry(self, buf, host_tuple, dhcp_enabled_subnet_ids):
+        port, alloc, hostname, name, no_dhcp, no_opts = host_tuple
+        if no_dhcp:
+            if not no_opts and self._get_port_extra_dhcp_opts(port):
+                buf.write('%s,%s%s\n' %
+                          (port.mac_address, 'set:', port.id))
+            return
+
+        # don't write ip address which belongs to a dhcp disabled subnet.
+        if alloc.subnet_id not in dhcp_enabled_subnet_ids:
+            return
 
-            if self._get_port_extra_dhcp_opts(port):
-                client_id = self._get_client_id(port)
-                if client_id and len(port.extra_dhcp_opts) > 1:
-                    buf.write('%s,%s%s,%s,%s,%s%s\n' %
-                              (port.mac_address, self._ID, client_id, name,
-                               ip_address, 'set:', port.id))
-                elif client_id and len(port.extra_dhcp_opts) == 1:
-                    buf.write('%s,%s%s,%s,%s\n' %
+        ip_address = self._format_address_for_dnsmasq(alloc.ip_address)
+
+        if self._get_port_extra_dhcp_opts(port):
+            client_id = self._get_client_id(port)
+            if client_id and len(port.extra_dhcp_opts) > 1:
+                buf.write('%s,%s%s,%s,%s,%s%s\n' %
+                          (port.mac_address, self._ID, client_id, name,
+                           ip_address, 'set:', port.id))
+            elif client_id and len(port.extra_dhcp_opts) == 1:
+                buf.write('%s,%s%s,%s,%s\n' %
                           (port.mac_address, self._ID, client_id, name,
                            ip_address))
-                else:
-                    buf.write('%s,%s,%s,%s%s\n' %
-                              (port.mac_address, name, ip_address,
-                               'set:', port.id))
             else:
-                buf.write('%s,%s,%s\n' %
-                          (port.mac_address, name, ip_address))
-
-        common_utils.replace_file(filename, buf.getvalue())
-        LOG.debug('Done building host file %s', filename)
-        return filename
+                buf.write('%s,%s,%s,%s%s\n' %
+                          (port.mac_address, name, ip_address,
+                           'set:', port.id))
+        else:
+            buf.write('%s,%s,%s\n' %
+                      (port.mac_address, name, ip_address))
+
+    def _get_config_digest(self):
+        digest = hashlib.sha1()
+        for filename, file_digest in sorted(
+                self._config_file_digests.items()):
+            digest.update(encodeutils.safe_encode(filename))
+            digest.update(encodeutils.safe_encode(file_digest))
+        return digest.hexdigest()
+
+    def _replace_config_file(self, filename, contents):
+        """Replace a config file unless it already has the given contents."""
+        self._config_file_digests[filename] = hashlib.sha1(
+            encodeutils.safe_encode(contents)).hexdigest()
+        try:
+            with open(filename) as f:
+                if f.read() == contents:
+                    return
+        except (OSError, IOError):
+            pass
+        common_utils.replace_file(filename, contents)
+        self._changed_config_files.add(filename)
 
     def _get_client_id(self, port):
         if self._get_port_extra_dhcp_opts(port):
@@ -740,24 +853,26 @@ class Dnsmasq(DhcpLocalProcess):
         Each line in this file is in the same form as a standard /etc/hosts
         file.
         """
-        buf = six.StringIO()
-        for host_tuple in self._iter_hosts():
-            port, alloc, hostname, fqdn, no_dhcp, no_opts = host_tuple
-            # It is compulsory to write the `fqdn` before the `hostname` in
-            # order to obtain it in PTR responses.
-            if alloc:
-                buf.write('%s\t%s %s\n' % (alloc.ip_address, fqdn, hostname))
+        contents = ''.join(entries.addn_hosts
+                           for entries in self._get_port_config_entries())
         addn_hosts = self.get_conf_file_name('addn_hosts')
-        common_utils.replace_file(addn_hosts, buf.getvalue())
+        self._replace_config_file(addn_hosts, contents)
         return addn_hosts
 
+    def _write_addn_host_entry(self, buf, host_tuple):
+        port, alloc, hostname, fqdn, no_dhcp, no_opts = host_tuple
+        # It is compulsory to write the `fqdn` before the `hostname` in
+        # order to obtain it in PTR responses.
+        if alloc:
+            buf.write('%s\t%s %s\n' % (alloc.ip_address, fqdn, hostname))
+
     def _output_opts_file(self):
         """Write a dnsmasq compatible options file."""
         options, subnet_index_map = self._generate_opts_per_subnet()
         options += self._generate_opts_per_port(subnet_index_map)
 
         name = self.get_conf_file_name('opts')
-        common_utils.replace_file(name, '\n'.join(options))
+        self._replace_config_file(name, '\n'.join(options))
         return name
 
     def _generate_opts_per_subnet(self):
@@ -843,26 +958,10 @@ class Dnsmasq(DhcpLocalProcess):
     def _generate_opts_per_port(self, subnet_index_map):
         options = []
         dhcp_ips = collections.defaultdict(list)
-        for port in self.network.ports:
-            if self._get_port_extra_dhcp_opts(port):
-                port_ip_versions = set(
-                    [netaddr.IPAddress(ip.ip_address).version
-                     for ip in port.fixed_ips])
-                for opt in port.extra_dhcp_opts:
-                    if opt.opt_name == edo_ext.CLIENT_ID:
-                        continue
-                    opt_ip_version = opt.ip_version
-                    if opt_ip_version in port_ip_versions:
-                        options.append(
-                            self._format_option(opt_ip_version, port.id,
-                                                opt.opt_name, opt.opt_value))
-                    else:
-                        LOG.info(_LI("Cannot apply dhcp option %(opt)s "
-                                     "because it's ip_version %(version)d "
-                                     "is not in port's address IP versions"),
-                                 {'opt': opt.opt_name,
-                                  'version': opt_ip_version})
+        for entries in self._get_port_config_entries():
+            options.extend(entries.opts)
 
+        for port in self.network.ports:
             # provides all dnsmasq ip as dns-server if there is more than
             # one dnsmasq for a subnet and there is no dns-server submitted
             # by the server
@@ -886,6 +985,28 @@ class Dnsmasq(DhcpLocalProcess):
                                                                   vx_ips))))
         return options
 
+    def _generate_port_opts(self, port):
+        options = []
+        if self._get_port_extra_dhcp_opts(port):
+            port_ip_versions = set(
+                [netaddr.IPAddress(ip.ip_address).version
+                 for ip in port.fixed_ips])
+            for opt in port.extra_dhcp_opts:
+                if opt.opt_name == edo_ext.CLIENT_ID:
+                    continue
+                opt_ip_version = opt.ip_version
+                if opt_ip_version in port_ip_versions:
+                    options.append(
+                        self._format_option(opt_ip_version, port.id,
+                                            opt.opt_name, opt.opt_value))
+                else:
+                    LOG.info(_LI("Cannot apply dhcp option %(opt)s "
+                                 "because it's ip_version %(version)d "
+                                 "is not in port's address IP versions"),
+                             {'opt': opt.opt_name,
+                              'version': opt_ip_version})
+        return options
+
     def _make_subnet_interface_ip_map(self):
         ip_dev = ip_lib.IPDevice(self.interface_name,
                                  namespace=self.network.namespace)
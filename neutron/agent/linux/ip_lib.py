@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import itertools
 import os
 import re
 
@@ -46,6 +48,16 @@ DEFAULT_GW_PATTERN = re.compile(r"via (\S+)")
 METRIC_PATTERN = re.compile(r"metric (\S+)")
 DEVICE_NAME_PATTERN = re.compile(r"(\d+?): (\S+?):.*")
 
+# ip objects and actions which can be queued in an IPBatch, other commands
+# always run immediately.
+BATCH_COMMANDS = ('addr', 'route', 'neigh', 'rule')
+BATCH_ACTIONS = ('add', 'del', 'delete', 'replace', 'change', 'flush')
+BATCH_INVALID_CHARS = re.compile(r'[\s"\'#\\]')
+
+# Maximum number of arping processes run at the same time when sending the
+# gratuitous ARPs of several addresses.
+GARP_POOL_SIZE = 16
+
 
 def remove_interface_suffix(interface):
     """Remove a possible "<if>@<endpoint>" suffix from an interface' name.
@@ -63,11 +75,69 @@ class AddressNotReady(exceptions.NeutronException):
                 "become ready: %(reason)s")
 
 
+class IPBatchError(RuntimeError):
+    """An ip -batch process failed.
+
+    The commands queued after the failing one were not run.
+    """
+
+
+class IPBatch(object):
+    """ip commands run together by 'ip -batch'.
+
+    Queued commands are fed to a single ip process per namespace and set of
+    options, instead of forking one ip process, through the root helper,
+    per command.
+    """
+
+    def __init__(self, namespace=None, log_fail_as_error=True):
+        self.namespace = namespace
+        self.log_fail_as_error = log_fail_as_error
+        self.commands = []
+        self.callbacks = []
+
+    def add(self, options, command, args):
+        line = [command] + [str(arg) for arg in args]
+        for arg in line:
+            if not arg or BATCH_INVALID_CHARS.search(arg):
+                raise ValueError(_("Invalid ip batch argument %r") % arg)
+        self.commands.append((tuple(options), ' '.join(line)))
+
+    def add_callback(self, callback, *args):
+        """Call callback(*args) once the queued commands succeeded."""
+        self.callbacks.append((callback, args))
+
+    def execute(self):
+        """Run the queued commands, in order, then the callbacks.
+
+        ip stops at the first failing command, the following ones are not
+        run and IPBatchError, a RuntimeError, is raised. The callbacks are
+        not called in this case.
+        """
+        commands, self.commands = self.commands, []
+        callbacks, self.callbacks = self.callbacks, []
+        for options, group in itertools.groupby(commands,
+                                                key=lambda c: c[0]):
+            opt_list = ['-%s' % o for o in options]
+            cmd = add_namespace_to_cmd(['ip'] + opt_list + ['-batch', '-'],
+                                       self.namespace)
+            process_input = ''.join('%s\n' % line for _o, line in group)
+            try:
+                utils.execute(cmd, process_input=process_input,
+                              run_as_root=True,
+                              log_fail_as_error=self.log_fail_as_error)
+            except RuntimeError as e:
+                raise IPBatchError(str(e))
+        for callback, args in callbacks:
+            callback(*args)
+
+
 class SubProcessBase(object):
     def __init__(self, namespace=None,
                  log_fail_as_error=True):
         self.namespace = namespace
         self.log_fail_as_error = log_fail_as_error
+        self._batch = None
         try:
             self.force_root = cfg.CONF.ip_lib_force_root
         except cfg.NoSuchOptError:
@@ -103,6 +173,29 @@ class SubProcessBase(object):
         return utils.execute(cmd, run_as_root=run_as_root,
                              log_fail_as_error=log_fail_as_error)
 
+    @contextlib.contextmanager
+    def batch(self):
+        """Run the address, route, neighbour and rule changes together.
+
+        Changes made through this object in the context are queued and run
+        by a single ip process when the context exits normally, so errors are
+        only raised then. The queued changes are dropped if the context
+        raises. Queries and other commands still run immediately.
+        """
+        if self._batch is not None:
+            yield
+            return
+        batch = self._batch = IPBatch(self.namespace, self.log_fail_as_error)
+        try:
+            yield
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._batch = None
+                LOG.debug("Dropping the queued ip commands %s",
+                          batch.commands)
+        self._batch = None
+        batch.execute()
+
     def set_log_fail_as_error(self, fail_with_error):
         self.log_fail_as_error = fail_with_error
 
@@ -289,7 +382,13 @@ class IPDevice(SubProcessBase):
             can also be passed.
         """
         self.addr.delete(cidr)
+        if self._batch is not None:
+            # Delete the connection state once the address is removed
+            self._batch.add_callback(self.delete_conntrack_state, cidr)
+        else:
+            self.delete_conntrack_state(cidr)
 
+    def delete_conntrack_state(self, cidr):
         ip_str = str(netaddr.IPNetwork(cidr).ip)
         ip_wrapper = IPWrapper(namespace=self.namespace)
 
@@ -356,6 +455,12 @@ class IpCommandBase(object):
         return self._parent._run(options, self.COMMAND, args)
 
     def _as_root(self, options, args, use_root_namespace=False):
+        batch = getattr(self._parent, '_batch', None)
+        if (isinstance(batch, IPBatch) and not use_root_namespace and
+                self.COMMAND in BATCH_COMMANDS and args and
+                args[0] in BATCH_ACTIONS):
+            batch.add(options, self.COMMAND, args)
+            return ''
         return self._parent._as_root(options,
                                      self.COMMAND,
                                      args,
@@ -1015,6 +1120,27 @@ def send_ip_addr_adv_notif(ns_name, iface_name, address, config):
         eventlet.spawn_n(arping)
 
 
+def send_ip_addrs_adv_notif(ns_name, iface_name, addresses, config):
+    """Send advance notifications of several IP address assignments.
+
+    Like send_ip_addr_adv_notif, but a single green thread sends the
+    gratuitous ARPs, running at most GARP_POOL_SIZE arping processes at the
+    same time.
+    """
+    count = config.send_arp_for_ha
+    addresses = [address for address in addresses
+                 if netaddr.IPAddress(address).version == 4]
+
+    def arping():
+        pool = eventlet.GreenPool(GARP_POOL_SIZE)
+        for address in addresses:
+            pool.spawn_n(_arping, ns_name, iface_name, address, count)
+        pool.waitall()
+
+    if count > 0 and addresses:
+        eventlet.spawn_n(arping)
+
+
 def add_namespace_to_cmd(cmd, namespace=None):
     """Add an optional namespace to the command."""
 
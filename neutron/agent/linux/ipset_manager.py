@@ -14,10 +14,14 @@
 import copy
 
 import netaddr
+from oslo_log import log as logging
+from oslo_utils import excutils
 
 from neutron.agent.linux import utils as linux_utils
 from neutron.common import utils
 
+LOG = logging.getLogger(__name__)
+
 IPSET_ADD_BULK_THRESHOLD = 5
 NET_PREFIX = 'N'
 SWAP_SUFFIX = '-n'
@@ -35,6 +39,37 @@ class IpsetManager(object):
         self.execute = execute or linux_utils.execute
         self.namespace = namespace
         self.ipset_sets = {}
+        self._defer_apply = False
+        self._deferred_commands = []
+        self._deferred_sets = set()
+        self.sync_stats = self._new_sync_stats()
+
+    @staticmethod
+    def _new_sync_stats():
+        return {'sets_touched': 0,
+                'members_added': 0,
+                'members_removed': 0,
+                'ipset_calls': 0}
+
+    def defer_apply_on(self):
+        """Queue set mutations until defer_apply_off is called.
+
+        All the sets created or updated in the meantime are then applied
+        with a single 'ipset restore' call instead of one call per set or
+        per member. sync_stats is reset and counts the work of the sync.
+        """
+        if not self._defer_apply:
+            self._defer_apply = True
+            self._deferred_commands = []
+            self._deferred_sets = set()
+            self.sync_stats = self._new_sync_stats()
+
+    def defer_apply_off(self):
+        if self._defer_apply:
+            self._defer_apply = False
+            if self._deferred_commands:
+                self._apply_deferred_commands()
+            LOG.debug("ipset sync done: %s", self.sync_stats)
 
     def _sanitize_addresses(self, addresses):
         """This method converts any address to ipset format.
@@ -82,7 +117,53 @@ class IpsetManager(object):
         if not add_ips and not del_ips and self.set_name_exists(set_name):
             # nothing to do because no membership changes and the ipset exists
             return
-        self.set_members_mutate(set_name, ethertype, member_ips)
+        self.sync_stats['sets_touched'] += 1
+        self.sync_stats['members_added'] += len(add_ips)
+        self.sync_stats['members_removed'] += len(del_ips)
+        if self._defer_apply:
+            self._defer_set_members(set_name, ethertype, member_ips,
+                                    add_ips, del_ips)
+        else:
+            self.set_members_mutate(set_name, ethertype, member_ips)
+
+    def _defer_set_members(self, set_name, ethertype, member_ips,
+                           add_ips, del_ips):
+        set_type = self._get_ipset_set_type(ethertype)
+        if not self.set_name_exists(set_name):
+            # Same as the create/refresh done when not deferring: the set
+            # may already exist in the system with stale members.
+            new_set_name = set_name + SWAP_SUFFIX
+            self._deferred_commands.append(
+                "create %s hash:net family %s" % (set_name, set_type))
+            self._deferred_commands.append(
+                "create %s hash:net family %s" % (new_set_name, set_type))
+            self._deferred_commands.extend(
+                "add %s %s" % (new_set_name, ip) for ip in member_ips)
+            self._deferred_commands.append(
+                "swap %s %s" % (new_set_name, set_name))
+            self._deferred_commands.append("destroy %s" % new_set_name)
+        else:
+            # members are added before the stale ones are removed so that
+            # a member present before and after the sync is never missing
+            self._deferred_commands.extend(
+                "add %s %s" % (set_name, ip) for ip in add_ips)
+            self._deferred_commands.extend(
+                "del %s %s" % (set_name, ip) for ip in del_ips)
+        self._deferred_sets.add(set_name)
+        self.ipset_sets[set_name] = copy.copy(member_ips)
+
+    @utils.synchronized('ipset', external=True)
+    def _apply_deferred_commands(self):
+        commands, self._deferred_commands = self._deferred_commands, []
+        deferred_sets, self._deferred_sets = self._deferred_sets, set()
+        try:
+            self._restore_sets(commands)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                # The system state of these sets is unknown now, forget
+                # them so that they are refreshed on the next update.
+                for set_name in deferred_sets:
+                    self.ipset_sets.pop(set_name, None)
 
     @utils.synchronized('ipset', external=True)
     def set_members_mutate(self, set_name, ethertype, member_ips):
@@ -146,6 +227,7 @@ class IpsetManager(object):
         if self.namespace:
             cmd_ns.extend(['ip', 'netns', 'exec', self.namespace])
         cmd_ns.extend(cmd)
+        self.sync_stats['ipset_calls'] += 1
         self.execute(cmd_ns, run_as_root=True, process_input=input,
                      check_exit_code=fail_on_errors)
 
@@ -14,6 +14,7 @@
 #    under the License.
 
 import collections
+import itertools
 import re
 
 import netaddr
@@ -83,6 +84,9 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         # List of security group rules for ports residing on this host
         self.sg_rules = {}
         self.pre_sg_rules = None
+        # Security group rules converted to iptables rules, shared by all
+        # the ports which are members of the security group
+        self._compiled_sg_rules = {}
         # List of security group member ips for ports residing on this host
         self.sg_members = collections.defaultdict(
             lambda: collections.defaultdict(list))
@@ -458,20 +462,65 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                              '-j RETURN' % icmp6_type]
         return icmpv6_rules
 
-    def _select_sg_rules_for_port(self, port, direction):
-        """Select rules from the security groups the port is member of."""
-        port_sg_ids = port.get('security_groups', [])
-        port_rules = []
+    def _compile_sg_rule(self, rule):
+        remote_gid = rule.get('remote_group_id')
+        if not remote_gid:
+            return rule, ' '.join(self._generate_plain_rule_args(rule)), None
+        if not self.enable_ipset:
+            # expanded to a rule per remote IP for each port
+            return rule, None, None
+        ipset_name = self.ipset.get_name(remote_gid, rule.get('ethertype'))
+        args = self._generate_ipset_match_args(rule, ipset_name)
+        return rule, ' '.join(args), ipset_name
+
+    def _compile_sg_rules(self, sg_id, direction):
+        """Convert the rules of a security group for a given direction.
+
+        The conversion doesn't depend on the port the rules are applied to,
+        so the result is shared by all the ports of the security group and
+        only computed again when the rules of the group change.
+
+        :returns: dict mapping ethertypes to lists of (rule, iptables_rule,
+            ipset_name) tuples. iptables_rule is None for rules which have
+            to be expanded per port.
+        """
+        sg_rules = [rule for rule in self.sg_rules.get(sg_id, [])
+                    if rule['direction'] == direction]
+        cached = self._compiled_sg_rules.get((sg_id, direction))
+        if cached and cached[0] == sg_rules:
+            return cached[1]
+        ipv4_sg_rules, ipv6_sg_rules = self._split_sgr_by_ethertype(sg_rules)
+        compiled = {
+            constants.IPv4: [self._compile_sg_rule(r) for r in ipv4_sg_rules],
+            constants.IPv6: [self._compile_sg_rule(r) for r in ipv6_sg_rules]}
+        self._compiled_sg_rules[(sg_id, direction)] = (
+            [dict(rule) for rule in sg_rules], compiled)
+        return compiled
+
+    def _remove_compiled_sg_rules(self, sg_id):
+        for direction in (firewall.INGRESS_DIRECTION,
+                          firewall.EGRESS_DIRECTION):
+            self._compiled_sg_rules.pop((sg_id, direction), None)
 
-        for sg_id in port_sg_ids:
-            for rule in self.sg_rules.get(sg_id, []):
-                if rule['direction'] == direction:
-                    if self.enable_ipset:
-                        port_rules.append(rule)
-                    else:
-                        port_rules.extend(
+    def _select_sg_rules_for_port(self, port, direction):
+        """Select iptables rules from the security groups of the port."""
+        port_rules = {constants.IPv4: [], constants.IPv6: []}
+        for sg_id in port.get('security_groups', []):
+            compiled = self._compile_sg_rules(sg_id, direction)
+            for ethertype, rules in compiled.items():
+                for rule, iptables_rule, ipset_name in rules:
+                    if iptables_rule is None:
+                        port_rules[ethertype].extend(
+                            ' '.join(self._generate_plain_rule_args(ip_rule))
+                            for ip_rule in
                             self._expand_sg_rule_with_remote_ips(
                                 rule, port, direction))
+                    elif (not ipset_name or
+                          self.ipset.set_name_exists(ipset_name)):
+                        #NOTE(mangelajo): ipsets for empty groups are not
+                        #                 created thus we can't reference
+                        #                 them.
+                        port_rules[ethertype].append(iptables_rule)
         return port_rules
 
     def _expand_sg_rule_with_remote_ips(self, rule, port, direction):
@@ -507,12 +556,12 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
     def _add_rules_by_security_group(self, port, direction):
         # select rules for current port and direction
         security_group_rules = self._select_sgr_by_direction(port, direction)
-        security_group_rules += self._select_sg_rules_for_port(port, direction)
         # split groups by ip version
         # for ipv4, iptables command is used
         # for ipv6, iptables6 command is used
         ipv4_sg_rules, ipv6_sg_rules = self._split_sgr_by_ethertype(
             security_group_rules)
+        sg_iptables_rules = self._select_sg_rules_for_port(port, direction)
         ipv4_iptables_rules = []
         ipv6_iptables_rules = []
         # include fixed egress/ingress rules
@@ -524,9 +573,9 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             ipv6_iptables_rules += self._accept_inbound_icmpv6()
         # include IPv4 and IPv6 iptable rules from security group
         ipv4_iptables_rules += self._convert_sgr_to_iptables_rules(
-            ipv4_sg_rules)
+            ipv4_sg_rules, sg_iptables_rules[constants.IPv4])
         ipv6_iptables_rules += self._convert_sgr_to_iptables_rules(
-            ipv6_sg_rules)
+            ipv6_sg_rules, sg_iptables_rules[constants.IPv6])
         # finally add the rules to the port chain for a given direction
         self._add_rules_to_chain_v4v6(self._port_chain_name(port, direction),
                                       ipv4_iptables_rules,
@@ -546,6 +595,9 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             #NOTE(mangelajo): ipsets for empty groups are not created
             #                 thus we can't reference them.
             return None
+        return self._generate_ipset_match_args(sg_rule, ipset_name)
+
+    def _generate_ipset_match_args(self, sg_rule, ipset_name):
         ipset_direction = IPSET_DIRECTION[sg_rule.get('direction')]
         args = self._generate_protocol_and_port_args(sg_rule)
         args += ['-m set', '--match-set', ipset_name, ipset_direction]
@@ -582,14 +634,17 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         else:
             return self._generate_plain_rule_args(sg_rule)
 
-    def _convert_sgr_to_iptables_rules(self, security_group_rules):
+    def _convert_sgr_to_iptables_rules(self, security_group_rules,
+                                       compiled_rules=()):
         iptables_rules = []
         self._allow_established(iptables_rules)
         seen_sg_rules = set()
-        for rule in security_group_rules:
-            args = self._convert_sg_rule_to_iptables_args(rule)
-            if args:
-                rule_command = ' '.join(args)
+        rule_commands = (
+            ' '.join(args) if args else None
+            for args in map(self._convert_sg_rule_to_iptables_args,
+                            security_group_rules))
+        for rule_command in itertools.chain(rule_commands, compiled_rules):
+            if rule_command:
                 if rule_command in seen_sg_rules:
                     # since these rules are from multiple security groups,
                     # there may be duplicates so we prune them out here
@@ -669,6 +724,8 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
     def filter_defer_apply_on(self):
         if not self._defer_apply:
             self.iptables.defer_apply_on()
+            if self.enable_ipset:
+                self.ipset.defer_apply_on()
             self._pre_defer_filtered_ports = dict(self.filtered_ports)
             self._pre_defer_unfiltered_ports = dict(self.unfiltered_ports)
             self.pre_sg_members = dict(self.sg_members)
@@ -697,6 +754,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         for remove_group_id in self._determine_sg_rules_to_remove(
                 filtered_ports):
             self.sg_rules.pop(remove_group_id, None)
+            self._remove_compiled_sg_rules(remove_group_id)
 
     def _determine_remote_sgs_to_remove(self, filtered_ports):
         """Calculate which remote security groups we don't need anymore.
@@ -832,6 +890,9 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                                       self._pre_defer_unfiltered_ports)
             self._setup_chains_apply(self.filtered_ports,
                                      self.unfiltered_ports)
+            if self.enable_ipset:
+                # the sets have to exist before iptables references them
+                self.ipset.defer_apply_off()
             self.iptables.defer_apply_off()
             self._remove_conntrack_entries_from_sg_updates()
             self._remove_unused_security_group_info()
@@ -29,6 +29,7 @@ from oslo_concurrency import lockutils
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import excutils
+from oslo_utils import timeutils
 import six
 
 from neutron._i18n import _, _LE, _LW
@@ -131,6 +132,8 @@ class IptablesTable(object):
         self.unwrapped_chains = set()
         self.remove_chains = set()
         self.wrap_name = binary_name[:16]
+        # Whether the table was modified since it was last applied
+        self.dirty = True
 
     def add_chain(self, name, wrap=True):
         """Adds a named chain to the table.
@@ -145,6 +148,7 @@ class IptablesTable(object):
 
         """
         name = get_chain_name(name, wrap)
+        self.dirty = True
         if wrap:
             self.chains.add(name)
         else:
@@ -174,6 +178,7 @@ class IptablesTable(object):
             return
 
         chain_set.remove(name)
+        self.dirty = True
 
         if not wrap:
             # non-wrapped chains and rules need to be dealt with specially,
@@ -221,6 +226,7 @@ class IptablesTable(object):
 
         self.rules.append(IptablesRule(chain, rule, wrap, top, self.wrap_name,
                                        tag, comment))
+        self.dirty = True
 
     def _wrap_target_chain(self, s, wrap):
         if s.startswith('$'):
@@ -245,6 +251,7 @@ class IptablesTable(object):
             self.rules.remove(IptablesRule(chain, rule, wrap, top,
                                            self.wrap_name,
                                            comment=comment))
+            self.dirty = True
             if not wrap:
                 self.remove_rules.append(str(IptablesRule(chain, rule, wrap,
                                                           top, self.wrap_name,
@@ -265,6 +272,8 @@ class IptablesTable(object):
         chained_rules = self._get_chain_rules(chain, wrap)
         for rule in chained_rules:
             self.rules.remove(rule)
+        if chained_rules:
+            self.dirty = True
 
     def clear_rules_by_tag(self, tag):
         if not tag:
@@ -272,6 +281,8 @@ class IptablesTable(object):
         rules = [rule for rule in self.rules if rule.tag == tag]
         for rule in rules:
             self.rules.remove(rule)
+        if rules:
+            self.dirty = True
 
 
 class IptablesManager(object):
@@ -309,6 +320,17 @@ class IptablesManager(object):
         self.iptables_apply_deferred = False
         self.wrap_name = binary_name[:16]
 
+        # Rules applied by the last successful apply, per command and table.
+        # Only used when AGENT.iptables_state_verify_interval is set.
+        self._applied_state = {}
+        self._last_verification = None
+        self.apply_stats = {'applies': 0,
+                            'saves': 0,
+                            'saves_skipped': 0,
+                            'last_apply_time': 0.0,
+                            'max_apply_time': 0.0,
+                            'total_apply_time': 0.0}
+
         self.ipv4 = {'filter': IptablesTable(binary_name=self.wrap_name)}
         self.ipv6 = {'filter': IptablesTable(binary_name=self.wrap_name)}
 
@@ -454,70 +476,167 @@ class IptablesManager(object):
 
         Returns a list of the changes that were sent to iptables-save.
         """
+        watch = timeutils.StopWatch()
+        watch.start()
+        try:
+            return self._apply_tables()
+        finally:
+            elapsed = watch.elapsed()
+            stats = self.apply_stats
+            stats['applies'] += 1
+            stats['last_apply_time'] = elapsed
+            stats['total_apply_time'] += elapsed
+            stats['max_apply_time'] = max(stats['max_apply_time'], elapsed)
+            LOG.debug("IPTablesManager.apply took %(elapsed).3f seconds, "
+                      "stats: %(stats)s", {'elapsed': elapsed,
+                                           'stats': stats})
+
+    def _state_verification_due(self):
+        interval = cfg.CONF.AGENT.iptables_state_verify_interval
+        if interval <= 0:
+            return True
+        return (self._last_verification is None or
+                self._last_verification.expired())
+
+    def _only_owned_chains_changed(self, commands):
+        """Check whether commands only modify chains wrapped by us.
+
+        Shared chains, like the built-in ones, may contain rules from other
+        components which are not part of the applied state model, so rule
+        indexes computed for them can only be trusted after iptables-save.
+        """
+        prefix = '%s-' % self.wrap_name
+        for command in commands:
+            if command[:1] not in (':', '-'):
+                continue
+            chain = command.split(' ', 2)[0 if command[0] == ':' else 1]
+            if not chain.lstrip(':').startswith(prefix):
+                return False
+        return True
+
+    def _get_tables_changes(self, tables, current_state, only_dirty=False):
+        commands = []
+        new_state = dict(current_state)
+        # Traverse tables in sorted order for predictable dump output
+        for table_name in sorted(tables):
+            table = tables[table_name]
+            if only_dirty and not table.dirty:
+                continue
+            old_rules = current_state.get(table_name, [])
+            # generate the new table state we want
+            new_rules = self._modify_rules(old_rules, table, table_name)
+            new_state[table_name] = new_rules
+            # generate the iptables commands to get between the old state
+            # and the new state
+            changes = _generate_path_between_rules(old_rules, new_rules)
+            if changes:
+                # if there are changes to the table, we put on the header
+                # and footer that iptables-save needs
+                commands += (['# Generated by iptables_manager'] +
+                             ['*%s' % table_name] + changes +
+                             ['COMMIT', '# Completed by iptables_manager'])
+        return commands, new_state
+
+    def _get_changes_from_applied_state(self, cmd, tables):
+        """Compute changes against the state applied last time.
+
+        Returns (None, None) when the iptables-save output is needed.
+        """
+        if cmd not in self._applied_state:
+            return None, None
+        removals = dict((name, (set(table.remove_chains),
+                                list(table.remove_rules)))
+                        for name, table in tables.items())
+        commands, new_state = self._get_tables_changes(
+            tables, self._applied_state[cmd], only_dirty=True)
+        if not self._only_owned_chains_changed(commands):
+            # _modify_rules consumed the pending removals, restore them for
+            # the computation based on iptables-save
+            for name, table in tables.items():
+                table.remove_chains, table.remove_rules = removals[name]
+            return None, None
+        return commands, new_state
+
+    def _get_changes_from_save(self, cmd, tables):
+        args = ['%s-save' % (cmd,)]
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        save_output = self.execute(args, run_as_root=True)
+        self.apply_stats['saves'] += 1
+        all_lines = save_output.split('\n')
+        current_state = {}
+        for table_name in tables:
+            # isolate the lines of the table we are modifying
+            start, end = self._find_table(all_lines, table_name)
+            current_state[table_name] = all_lines[start:end]
+        return self._get_tables_changes(tables, current_state)
+
+    def _apply_tables(self):
         s = [('iptables', self.ipv4)]
         if self.use_ipv6:
             s += [('ip6tables', self.ipv6)]
+        use_applied_state = not self._state_verification_due()
         all_commands = []  # variable to keep track all commands for return val
         for cmd, tables in s:
-            args = ['%s-save' % (cmd,)]
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            save_output = self.execute(args, run_as_root=True)
-            all_lines = save_output.split('\n')
-            commands = []
-            # Traverse tables in sorted order for predictable dump output
-            for table_name in sorted(tables):
-                table = tables[table_name]
-                # isolate the lines of the table we are modifying
-                start, end = self._find_table(all_lines, table_name)
-                old_rules = all_lines[start:end]
-                # generate the new table state we want
-                new_rules = self._modify_rules(old_rules, table, table_name)
-                # generate the iptables commands to get between the old state
-                # and the new state
-                changes = _generate_path_between_rules(old_rules, new_rules)
-                if changes:
-                    # if there are changes to the table, we put on the header
-                    # and footer that iptables-save needs
-                    commands += (['# Generated by iptables_manager'] +
-                                 ['*%s' % table_name] + changes +
-                                 ['COMMIT', '# Completed by iptables_manager'])
-            if not commands:
-                continue
-            all_commands += commands
-            args = ['%s-restore' % (cmd,), '-n']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            try:
-                # always end with a new line
-                commands.append('')
-                self.execute(args, process_input='\n'.join(commands),
-                             run_as_root=True)
-            except RuntimeError as r_error:
-                with excutils.save_and_reraise_exception():
-                    try:
-                        line_no = int(re.search(
-                            'iptables-restore: line ([0-9]+?) failed',
-                            str(r_error)).group(1))
-                        context = IPTABLES_ERROR_LINES_OF_CONTEXT
-                        log_start = max(0, line_no - context)
-                        log_end = line_no + context
-                    except AttributeError:
-                        # line error wasn't found, print all lines instead
-                        log_start = 0
-                        log_end = len(commands)
-                    log_lines = ('%7d. %s' % (idx, l)
-                                 for idx, l in enumerate(
-                                     commands[log_start:log_end],
-                                     log_start + 1)
-                                 )
-                    LOG.error(_LE("IPTablesManager.apply failed to apply the "
-                                  "following set of iptables rules:\n%s"),
-                              '\n'.join(log_lines))
+            commands = new_state = None
+            if use_applied_state:
+                commands, new_state = self._get_changes_from_applied_state(
+                    cmd, tables)
+            if new_state is None:
+                commands, new_state = self._get_changes_from_save(cmd, tables)
+            else:
+                self.apply_stats['saves_skipped'] += 1
+            if commands:
+                all_commands += commands
+                self._restore(cmd, commands)
+            if cfg.CONF.AGENT.iptables_state_verify_interval > 0:
+                self._applied_state[cmd] = new_state
+            for table in tables.values():
+                table.dirty = False
+        if not use_applied_state:
+            interval = cfg.CONF.AGENT.iptables_state_verify_interval
+            if interval > 0:
+                self._last_verification = timeutils.StopWatch(
+                    duration=interval)
+                self._last_verification.start()
         LOG.debug("IPTablesManager.apply completed with success. %d iptables "
                   "commands were issued", len(all_commands))
         return all_commands
 
+    def _restore(self, cmd, commands):
+        args = ['%s-restore' % (cmd,), '-n']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        try:
+            # always end with a new line
+            commands.append('')
+            self.execute(args, process_input='\n'.join(commands),
+                         run_as_root=True)
+        except RuntimeError as r_error:
+            with excutils.save_and_reraise_exception():
+                # the state of the tables is unknown, read it again on the
+                # next apply
+                self._applied_state.pop(cmd, None)
+                try:
+                    line_no = int(re.search(
+                        'iptables-restore: line ([0-9]+?) failed',
+                        str(r_error)).group(1))
+                    context = IPTABLES_ERROR_LINES_OF_CONTEXT
+                    log_start = max(0, line_no - context)
+                    log_end = line_no + context
+                except AttributeError:
+                    # line error wasn't found, print all lines instead
+                    log_start = 0
+                    log_end = len(commands)
+                log_lines = ('%7d. %s' % (idx, l)
+                             for idx, l in enumerate(
+                                 commands[log_start:log_end],
+                                 log_start + 1)
+                             )
+                LOG.error(_LE("IPTablesManager.apply failed to apply the "
+                              "following set of iptables rules:\n%s"),
+                          '\n'.join(log_lines))
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
@@ -734,6 +853,8 @@ def _get_rules_by_chain(rules):
 
 def _generate_chain_diff_iptables_commands(chain, old_chain_rules,
                                           new_chain_rules):
+    if old_chain_rules == new_chain_rules:
+        return []
     # keep track of the old index because we have to insert rules
     # in the right position
     old_index = 1
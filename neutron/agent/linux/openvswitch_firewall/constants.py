@@ -35,6 +35,11 @@ CT_MARK_INVALID = '0x1'
 REG_PORT = 5
 REG_NET = 6
 
+# Priority of the flows implementing remote security group rules with
+# conjunctions. It is above the priority of the other rule flows so that a
+# conjunction clause doesn't override a rule flow with the same match.
+CONJ_FLOW_PRIORITY = 71
+
 protocol_to_nw_proto = {
         constants.PROTO_NAME_ICMP: constants.PROTO_NUM_ICMP,
         constants.PROTO_NAME_TCP: constants.PROTO_NUM_TCP,
@@ -13,10 +13,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 import netaddr
 from neutron_lib import constants as lib_const
 from neutron_lib import exceptions
+from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import excutils
 
 from neutron._i18n import _, _LE, _LW
 from neutron.agent import firewall
@@ -55,6 +59,13 @@ def create_reg_numbers(flow_params):
     _replace_register(flow_params, ovsfw_consts.REG_NET, 'reg_net')
 
 
+def _get_flow_key(flow):
+    """Return the table, priority and match identifying a flow"""
+    return (flow.get('table'), flow.get('priority'),
+            frozenset((field, value) for field, value in flow.items()
+                      if field not in ('table', 'priority', 'actions')))
+
+
 class OVSFWPortNotFound(exceptions.NeutronException):
     message = _("Port %(port_id)s is not managed by this agent. ")
 
@@ -76,7 +87,7 @@ class SecurityGroup(object):
 
     def get_ethertype_filtered_addresses(self, ethertype,
                                          exclude_addresses=None):
-        exclude_addresses = set(exclude_addresses) or set()
+        exclude_addresses = set(exclude_addresses or [])
         group_addresses = set(self.members.get(ethertype, []))
         return list(group_addresses - exclude_addresses)
 
@@ -163,6 +174,110 @@ class SGPortMap(object):
         sec_group.members = members
 
 
+class ConjIdMap(object):
+    """Map security group rule sets to OpenFlow conjunction IDs
+
+    A conjunction ID is allocated for each security group, remote group,
+    direction and ethertype, and shared by all the ports of the security
+    group. The ID following it is used for the new connections.
+    """
+    CONJ_ID_BLOCK_SIZE = 2
+
+    def __init__(self):
+        self.id_map = collections.defaultdict(self._conj_id_factory)
+        self.max_id = 0
+
+    def _conj_id_factory(self):
+        self.max_id += self.CONJ_ID_BLOCK_SIZE
+        return self.max_id
+
+    def get_conj_id(self, sg_id, remote_sg_id, direction, ethertype):
+        if direction not in (firewall.INGRESS_DIRECTION,
+                             firewall.EGRESS_DIRECTION):
+            raise ValueError(_("Invalid direction '%s'") % direction)
+        return self.id_map[(sg_id, remote_sg_id, direction, ethertype)]
+
+
+class ConjIPFlowManager(object):
+    """Manage the flows matching the remote group member addresses
+
+    The flows are installed per VLAN tag: each member address of a remote
+    group used by the ports of the network is matched by a single flow per
+    direction and ethertype, which is a clause of all the conjunctions
+    involving that address. They are updated by difference with the
+    installed ones, so that a member change only touches the flows of that
+    member.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        # vlan_tag -> {(direction, ethertype, ip_address): conj_ids}
+        self.flow_state = {}
+        # vlan_tag -> flow state of the VLAN before the deferred flow mods
+        self._unapplied_flow_state = {}
+
+    def _get_conj_ids_by_address(self, vlan_tag):
+        sg_port_map = self.driver.sg_port_map
+        conj_ids_by_address = collections.defaultdict(set)
+        for port in sg_port_map.ports.values():
+            if port.vlan_tag != vlan_tag:
+                continue
+            for sec_group in port.sec_groups:
+                for rule in sec_group.remote_rules:
+                    direction = rule['direction']
+                    ethertype = rule['ethertype']
+                    conj_id = self.driver.conj_id_map.get_conj_id(
+                        sec_group.id, rule['remote_group_id'], direction,
+                        ethertype)
+                    remote_group = sg_port_map.sec_groups[
+                        rule['remote_group_id']]
+                    for ip_addr in (
+                            remote_group.get_ethertype_filtered_addresses(
+                                ethertype)):
+                        conj_ids_by_address[
+                            (direction, ethertype, ip_addr)].add(conj_id)
+        return conj_ids_by_address
+
+    def update_flows_for_vlan(self, vlan_tag):
+        installed = self.flow_state.pop(vlan_tag, {})
+        if self.driver._deferred:
+            self._unapplied_flow_state.setdefault(vlan_tag, installed)
+        desired = self._get_conj_ids_by_address(vlan_tag)
+        for key in set(installed) - set(desired):
+            direction, ethertype, ip_addr = key
+            flow = rules.create_flows_for_ip_address(
+                ip_addr, direction, ethertype, vlan_tag, [])[0]
+            self.driver._delete_flows(
+                **{field: value for field, value in flow.items()
+                   if field not in ('actions', 'priority', 'ct_state')})
+        for key, conj_ids in desired.items():
+            if installed.get(key) == conj_ids:
+                continue
+            direction, ethertype, ip_addr = key
+            for flow in rules.create_flows_for_ip_address(
+                    ip_addr, direction, ethertype, vlan_tag, conj_ids):
+                self.driver._add_flow(**flow)
+        if desired:
+            self.flow_state[vlan_tag] = dict(desired)
+
+    def flows_applied(self):
+        self._unapplied_flow_state = {}
+
+    def flows_not_applied(self):
+        """Forget the flows of the VLANs updated by unapplied flow mods
+
+        Any of the flows installed before or requested since may be
+        installed: all of them are deleted on the next update of the VLAN,
+        and the wanted ones are added again.
+        """
+        for vlan_tag, installed in self._unapplied_flow_state.items():
+            state = dict.fromkeys(installed)
+            state.update(dict.fromkeys(self.flow_state.get(vlan_tag, {})))
+            if state:
+                self.flow_state[vlan_tag] = state
+        self._unapplied_flow_state = {}
+
+
 class OVSFirewallDriver(firewall.FirewallDriver):
     REQUIRED_PROTOCOLS = [
         ovs_consts.OPENFLOW10,
@@ -183,6 +298,15 @@ class OVSFirewallDriver(firewall.FirewallDriver):
         """
         self.int_br = self.initialize_bridge(integration_bridge)
         self.sg_port_map = SGPortMap()
+        self.conj_id_map = ConjIdMap()
+        self.conj_ip_manager = ConjIPFlowManager(self)
+        self._vlans_to_update = set()
+        # port_id -> {flow key: flow}, the flows installed for each port
+        self._installed_port_flows = {}
+        # port_id -> installed flows of the port before the deferred flow
+        # mods
+        self._unapplied_port_flows = {}
+        self._collected_flows = None
         self._deferred = False
         self._drop_all_unmatched_flows()
 
@@ -215,7 +339,9 @@ class OVSFirewallDriver(firewall.FirewallDriver):
         create_reg_numbers(kwargs)
         if isinstance(dl_type, int):
             kwargs['dl_type'] = "0x{:04x}".format(dl_type)
-        if self._deferred:
+        if self._collected_flows is not None:
+            self._collected_flows[_get_flow_key(kwargs)] = kwargs
+        elif self._deferred:
             self.int_br.add_flow(**kwargs)
         else:
             self.int_br.br.add_flow(**kwargs)
@@ -230,7 +356,8 @@ class OVSFirewallDriver(firewall.FirewallDriver):
     @staticmethod
     def initialize_bridge(int_br):
         int_br.set_protocols(OVSFirewallDriver.REQUIRED_PROTOCOLS)
-        return int_br.deferred(full_ordered=True)
+        return int_br.deferred(full_ordered=True,
+                               use_bundle=cfg.CONF.ovs_ofctl_bundles)
 
     def _drop_all_unmatched_flows(self):
         for table in ovs_consts.OVS_FIREWALL_TABLES:
@@ -275,14 +402,15 @@ class OVSFirewallDriver(firewall.FirewallDriver):
                           "initialized."),
                       port['device'])
             self.delete_all_port_flows(of_port)
-        self.initialize_port_flows(of_port)
-        self.add_flows_from_rules(of_port)
+            self._pop_installed_port_flows(of_port)
+        self._install_port_flows(of_port)
 
     def update_port_filter(self, port):
         """Update rules for given port
 
-        Current existing filtering rules are removed and new ones are generated
-        based on current loaded security group rules and members.
+        The flows are generated based on current loaded security group rules
+        and members, only the ones differing from the installed flows of the
+        port are deleted or added.
 
         """
         if not firewall.port_sec_enabled(port):
@@ -292,10 +420,60 @@ class OVSFirewallDriver(firewall.FirewallDriver):
             self.prepare_port_filter(port)
             return
         of_port = self.get_or_create_ofport(port)
-        # TODO(jlibosva): Handle firewall blink
-        self.delete_all_port_flows(of_port)
-        self.initialize_port_flows(of_port)
-        self.add_flows_from_rules(of_port)
+        self._install_port_flows(of_port)
+
+    def _install_port_flows(self, port):
+        """Apply the difference between the generated and installed flows
+
+        Flows are keyed by table, priority and match: stale flows are deleted
+        with a strict match, so that the other flows of the port keep
+        filtering the traffic during the update.
+        """
+        self._collected_flows = {}
+        try:
+            self.initialize_port_flows(port)
+            self.add_flows_from_rules(port)
+            desired = self._collected_flows
+        finally:
+            self._collected_flows = None
+        installed = self._pop_installed_port_flows(port)
+        for key in set(installed) - set(desired):
+            # Flows without a port match, like the invalid state drop, are
+            # shared with the other ports
+            if any(key in flows
+                   for flows in self._installed_port_flows.values()):
+                continue
+            self._delete_flows(
+                strict=True,
+                **{field: value for field, value in installed[key].items()
+                   if field != 'actions'})
+        for key, flow in desired.items():
+            if installed.get(key) != flow:
+                self._add_flow(**flow)
+        self._installed_port_flows[port.id] = desired
+        self._schedule_vlan_update(port.vlan_tag)
+
+    def _pop_installed_port_flows(self, port):
+        installed = self._installed_port_flows.pop(port.id, {})
+        if self._deferred:
+            self._unapplied_port_flows.setdefault(port.id, installed)
+        return installed
+
+    def _forget_unapplied_port_flows(self):
+        """Forget the flows of the ports updated by unapplied flow mods
+
+        Any of the flows installed before or requested since may be
+        installed: their actions are reset so that the wanted ones are added
+        again on the next update of the port, and the others deleted.
+        """
+        for port_id, installed in self._unapplied_port_flows.items():
+            if port_id not in self.sg_port_map.ports:
+                continue
+            flows = dict(installed)
+            flows.update(self._installed_port_flows.get(port_id, {}))
+            self._installed_port_flows[port_id] = {
+                key: dict(flow, actions=None) for key, flow in flows.items()}
+        self._unapplied_port_flows = {}
 
     def remove_port_filter(self, port):
         """Remove port from firewall
@@ -307,21 +485,46 @@ class OVSFirewallDriver(firewall.FirewallDriver):
         if self.is_port_managed(port):
             of_port = self.get_or_create_ofport(port)
             self.delete_all_port_flows(of_port)
+            self._pop_installed_port_flows(of_port)
             self.sg_port_map.remove_port(of_port)
+            self._schedule_vlan_update(of_port.vlan_tag)
 
     def update_security_group_rules(self, sg_id, rules):
         self.sg_port_map.update_rules(sg_id, rules)
 
     def update_security_group_members(self, sg_id, member_ips):
         self.sg_port_map.update_members(sg_id, member_ips)
+        for port in self.sg_port_map.ports.values():
+            if any(rule['remote_group_id'] == sg_id
+                   for sec_group in port.sec_groups
+                   for rule in sec_group.remote_rules):
+                self._schedule_vlan_update(port.vlan_tag)
+
+    def _schedule_vlan_update(self, vlan_tag):
+        self._vlans_to_update.add(vlan_tag)
+        if not self._deferred:
+            self._update_remote_group_flows()
+
+    def _update_remote_group_flows(self):
+        while self._vlans_to_update:
+            self.conj_ip_manager.update_flows_for_vlan(
+                self._vlans_to_update.pop())
 
     def filter_defer_apply_on(self):
         self._deferred = True
 
     def filter_defer_apply_off(self):
         if self._deferred:
-            self.int_br.apply_flows()
+            self._update_remote_group_flows()
             self._deferred = False
+            try:
+                self.int_br.apply_flows(check_error=True)
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    self._forget_unapplied_port_flows()
+                    self.conj_ip_manager.flows_not_applied()
+            self._unapplied_port_flows = {}
+            self.conj_ip_manager.flows_applied()
 
     @property
     def ports(self):
@@ -667,17 +870,44 @@ class OVSFirewallDriver(firewall.FirewallDriver):
                       rule, flows)
             for flow in flows:
                 self._accept_flow(**flow)
+        self._add_conjunction_flows(port)
+
+    def _add_conjunction_flows(self, port):
+        """Add the port clauses and accept flows of remote group rules"""
+        # Rules with the same match are merged in a flow which is a clause
+        # of all their conjunctions
+        conj_ids_by_match = collections.defaultdict(set)
+        for conj_id, rule in self.create_remote_rules_generator_for_port(
+                port):
+            for flow in rules.create_flows_from_rule_and_port(rule, port):
+                match = tuple(sorted((field, value)
+                                     for field, value in flow.items()
+                                     if field != 'actions'))
+                conj_ids_by_match[match].add(conj_id)
+            for flow in rules.create_conj_flows(
+                    port, conj_id, rule['direction'], rule['ethertype']):
+                self._add_flow(**flow)
+        for match, conj_ids in conj_ids_by_match.items():
+            flows = rules.substitute_conjunction_actions(
+                [dict(match)], 2, conj_ids)
+            LOG.debug("RULGEN: Conjunction flows generated for port %s "
+                      "are %s", port.id, flows)
+            for flow in flows:
+                self._add_flow(**flow)
 
     def create_rules_generator_for_port(self, port):
         for sec_group in port.sec_groups:
             for rule in sec_group.raw_rules:
                 yield rule
+
+    def create_remote_rules_generator_for_port(self, port):
+        """Generate the remote group rules of a port with their conj ID"""
+        for sec_group in port.sec_groups:
             for rule in sec_group.remote_rules:
-                remote_group = self.sg_port_map.sec_groups[
-                    rule['remote_group_id']]
-                for ip_addr in remote_group.get_ethertype_filtered_addresses(
-                        rule['ethertype'], port.fixed_ips):
-                    yield rules.create_rule_for_ip_address(ip_addr, rule)
+                conj_id = self.conj_id_map.get_conj_id(
+                    sec_group.id, rule['remote_group_id'],
+                    rule['direction'], rule['ethertype'])
+                yield conj_id, rule
 
     def delete_all_port_flows(self, port):
         """Delete all flows for given port"""
@@ -28,6 +28,13 @@ LOG = logging.getLogger(__name__)
 
 FORBIDDEN_PREFIXES = (n_consts.IPv4_ANY, n_consts.IPv6_ANY)
 
+FLOW_FIELD_FOR_IPVER_AND_DIRECTION = {
+    (n_consts.IP_VERSION_4, firewall.EGRESS_DIRECTION): 'nw_dst',
+    (n_consts.IP_VERSION_6, firewall.EGRESS_DIRECTION): 'ipv6_dst',
+    (n_consts.IP_VERSION_4, firewall.INGRESS_DIRECTION): 'nw_src',
+    (n_consts.IP_VERSION_6, firewall.INGRESS_DIRECTION): 'ipv6_src',
+}
+
 
 def is_valid_prefix(ip_prefix):
     # IPv6 have multiple ways how to describe ::/0 network, converting to
@@ -65,8 +72,8 @@ def create_flows_from_rule_and_port(rule, port):
     return flows
 
 
-def create_protocol_flows(direction, flow_template, port, rule):
-    flow_template = flow_template.copy()
+def populate_flow_common(direction, flow_template, port):
+    """Initialize the table, port MAC and accept actions of a rule flow"""
     if direction == firewall.INGRESS_DIRECTION:
         flow_template['table'] = ovs_consts.RULES_INGRESS_TABLE
         flow_template['dl_dst'] = port.mac
@@ -78,6 +85,12 @@ def create_protocol_flows(direction, flow_template, port, rule):
         # should be applied
         flow_template['actions'] = 'resubmit(,{:d})'.format(
             ovs_consts.ACCEPT_OR_INGRESS_TABLE)
+    return flow_template
+
+
+def create_protocol_flows(direction, flow_template, port, rule):
+    flow_template = populate_flow_common(direction, flow_template.copy(),
+                                         port)
     protocol = rule.get('protocol')
     try:
         flow_template['nw_proto'] = ovsfw_consts.protocol_to_nw_proto[protocol]
@@ -128,12 +141,66 @@ def create_port_range_flows(flow_template, rule):
     return flows
 
 
-def create_rule_for_ip_address(ip_address, rule):
-    new_rule = rule.copy()
-    del new_rule['remote_group_id']
-    direction = rule['direction']
-    ip_prefix = str(netaddr.IPNetwork(ip_address).cidr)
-    new_rule[firewall.DIRECTION_IP_PREFIX[direction]] = ip_prefix
-    LOG.debug('RULGEN: From rule %s with IP %s created new rule %s',
-              rule, ip_address, new_rule)
-    return new_rule
+def substitute_conjunction_actions(flows, dimension, conj_ids):
+    """Turn flows into clauses of the conjunctions with the given IDs
+
+    Every conjunction has two clauses: the remote group member addresses
+    are the first one and the port and protocol matches of the rules are
+    the second one. Each flow is duplicated for established and new
+    connections, the conjunction ID of the new connections being the next
+    one.
+    """
+    result = []
+    for flow in flows:
+        for offset, ct_state in enumerate(
+                (ovsfw_consts.OF_STATE_ESTABLISHED_NOT_REPLY,
+                 ovsfw_consts.OF_STATE_NEW_NOT_ESTABLISHED)):
+            new_flow = flow.copy()
+            new_flow['priority'] = ovsfw_consts.CONJ_FLOW_PRIORITY
+            new_flow['ct_state'] = ct_state
+            new_flow['actions'] = ','.join(
+                'conjunction({:d},{:d}/2)'.format(conj_id + offset, dimension)
+                for conj_id in sorted(conj_ids))
+            result.append(new_flow)
+    return result
+
+
+def create_flows_for_ip_address(ip_address, direction, ethertype,
+                                vlan_tag, conj_ids):
+    """Create the flows matching a remote group member address"""
+    ip_network = netaddr.IPNetwork(ip_address)
+    if direction == firewall.INGRESS_DIRECTION:
+        table = ovs_consts.RULES_INGRESS_TABLE
+    else:
+        table = ovs_consts.RULES_EGRESS_TABLE
+    flow_template = {
+        'table': table,
+        'dl_type': ovsfw_consts.ethertype_to_dl_type_map[ethertype],
+        # Addresses of different networks may overlap
+        'reg_net': vlan_tag,
+    }
+    ip_field = FLOW_FIELD_FOR_IPVER_AND_DIRECTION[
+        (ip_network.version, direction)]
+    flow_template[ip_field] = str(ip_network.cidr)
+    return substitute_conjunction_actions([flow_template], 1, conj_ids)
+
+
+def create_conj_flows(port, conj_id, direction, ethertype):
+    """Create the flows accepting the traffic of a port conjunction"""
+    flow_template = {
+        'priority': ovsfw_consts.CONJ_FLOW_PRIORITY,
+        'conj_id': conj_id,
+        'dl_type': ovsfw_consts.ethertype_to_dl_type_map[ethertype],
+        # Conjunction IDs are shared by the ports of a security group
+        'reg_port': port.ofport,
+    }
+    flow_template = populate_flow_common(direction, flow_template, port)
+    flows = [flow_template.copy(), flow_template.copy()]
+    flows[0]['ct_state'] = ovsfw_consts.OF_STATE_ESTABLISHED_NOT_REPLY
+    flows[1]['ct_state'] = ovsfw_consts.OF_STATE_NEW_NOT_ESTABLISHED
+    flows[1]['conj_id'] += 1
+    if direction == firewall.INGRESS_DIRECTION:
+        flows[1]['actions'] = (
+            'ct(commit,zone=NXM_NX_REG{:d}[0..15]),{:s}'.format(
+                ovsfw_consts.REG_NET, flows[1]['actions']))
+    return flows
@@ -12,11 +12,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
 import eventlet
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
+from oslo_utils import importutils
+from ovs.db import idl
 
 from neutron._i18n import _LE
+from neutron.agent.common import ovs_lib
 from neutron.agent.linux import async_process
 from neutron.agent.ovsdb import api as ovsdb
 
@@ -116,3 +121,103 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
             with eventlet.timeout.Timeout(timeout):
                 while not self.is_active():
                     eventlet.sleep()
+
+
+class NativeInterfaceMonitor(object):
+    """Monitors the Interface table through the native OVSDB connection.
+
+    Row changes are pushed by the IDL of the connection used by the native
+    ovsdb_interface, so unlike SimpleInterfaceMonitor no ovsdb-client
+    process is spawned and no output has to be parsed. Events are exposed
+    through the same has_updates and get_events() interface.
+    """
+
+    def __init__(self):
+        self._connection = None
+        self._lock = threading.Lock()
+        self.new_events = {'added': [], 'removed': []}
+
+    @staticmethod
+    def is_supported():
+        # Idl.notify() is only available with ovs >= 2.6
+        return hasattr(idl.Idl, 'notify')
+
+    def is_active(self):
+        return self._connection is not None
+
+    @property
+    def has_updates(self):
+        with self._lock:
+            return bool(self.new_events['added'] or
+                        self.new_events['removed'])
+
+    def get_events(self):
+        with self._lock:
+            events = self.new_events
+            self.new_events = {'added': [], 'removed': []}
+        return events
+
+    def start(self, block=False, timeout=5):
+        if self._connection is not None:
+            return
+        # NOTE: the native implementation is loaded on demand, as done by
+        # ovsdb.API.get(), since its connection is set up from the config
+        # options when the module is imported.
+        native_api = importutils.import_class(ovsdb.interface_map['native'])
+        connection = native_api.ovsdb_connection
+        connection.start()
+        connection.register_notify_handler(self._handle_row_event)
+        self._connection = connection
+        # As with the 'initial' rows of ovsdb-client, report every existing
+        # interface as added. The agent processes duplicates only once.
+        table = connection.idl.tables['Interface']
+        for row in list(table.rows.values()):
+            self._add_event('added', row)
+
+    def stop(self):
+        if self._connection is not None:
+            self._connection.unregister_notify_handler(
+                self._handle_row_event)
+            self._connection = None
+
+    @staticmethod
+    def _row_to_device(row):
+        return {'name': row.name,
+                'ofport': (row.ofport[0] if row.ofport
+                           else ovs_lib.UNASSIGNED_OFPORT),
+                'external_ids': dict(row.external_ids)}
+
+    @staticmethod
+    def _column_updated(updates, column):
+        try:
+            getattr(updates, column)
+        except (AttributeError, KeyError):
+            return False
+        return True
+
+    def _add_event(self, action, row):
+        device = self._row_to_device(row)
+        with self._lock:
+            self.new_events[action].append(device)
+
+    def _handle_row_event(self, event, row, updates=None):
+        if row._table.name != 'Interface':
+            return
+        if event == idl.ROW_CREATE:
+            self._add_event('added', row)
+        elif event == idl.ROW_DELETE:
+            self._add_event('removed', row)
+        elif event == idl.ROW_UPDATE and updates is not None:
+            ofport_updated = self._column_updated(updates, 'ofport')
+            if not (ofport_updated or
+                    self._column_updated(updates, 'external_ids')):
+                return
+            device = self._row_to_device(row)
+            with self._lock:
+                pending = [e for e in self.new_events['added']
+                           if e['name'] == device['name']]
+                for event_device in pending:
+                    event_device.update(device)
+                if not pending and ofport_updated:
+                    # the interface got (re)attached to the bridge
+                    self.new_events['added'].append(device)
@@ -17,6 +17,7 @@ import contextlib
 import eventlet
 from oslo_log import log as logging
 
+from neutron._i18n import _LW
 from neutron.agent.common import base_polling
 from neutron.agent.linux import async_process
 from neutron.agent.linux import ovsdb_monitor
@@ -28,10 +29,13 @@ LOG = logging.getLogger(__name__)
 @contextlib.contextmanager
 def get_polling_manager(minimize_polling=False,
                         ovsdb_monitor_respawn_interval=(
-                            constants.DEFAULT_OVSDBMON_RESPAWN)):
+                            constants.DEFAULT_OVSDBMON_RESPAWN),
+                        ovsdb_monitor_interface=(
+                            constants.OVSDB_MONITOR_OVSDB_CLIENT)):
     if minimize_polling:
         pm = InterfacePollingMinimizer(
-            ovsdb_monitor_respawn_interval=ovsdb_monitor_respawn_interval)
+            ovsdb_monitor_respawn_interval=ovsdb_monitor_respawn_interval,
+            ovsdb_monitor_interface=ovsdb_monitor_interface)
         pm.start()
     else:
         pm = base_polling.AlwaysPoll()
@@ -47,9 +51,17 @@ class InterfacePollingMinimizer(base_polling.BasePollingManager):
 
     def __init__(
             self,
-            ovsdb_monitor_respawn_interval=constants.DEFAULT_OVSDBMON_RESPAWN):
+            ovsdb_monitor_respawn_interval=constants.DEFAULT_OVSDBMON_RESPAWN,
+            ovsdb_monitor_interface=constants.OVSDB_MONITOR_OVSDB_CLIENT):
 
         super(InterfacePollingMinimizer, self).__init__()
+        if ovsdb_monitor_interface == constants.OVSDB_MONITOR_NATIVE:
+            if ovsdb_monitor.NativeInterfaceMonitor.is_supported():
+                self._monitor = ovsdb_monitor.NativeInterfaceMonitor()
+                return
+            LOG.warning(_LW("The installed ovs library doesn't support "
+                            "native OVSDB monitoring, falling back to "
+                            "ovsdb-client"))
         self._monitor = ovsdb_monitor.SimpleInterfaceMonitor(
             respawn_interval=ovsdb_monitor_respawn_interval)
 
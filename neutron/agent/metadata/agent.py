@@ -12,21 +12,30 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import bisect
+import collections
+import fnmatch
 import hashlib
 import hmac
+import os
+import time
 
+import eventlet.pools
 import httplib2
 from neutron_lib import constants
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging
+from oslo_serialization import jsonutils
 from oslo_service import loopingcall
 from oslo_utils import encodeutils
+from oslo_utils import excutils
+from oslo_utils import timeutils
 import six
 import six.moves.urllib.parse as urlparse
 import webob
 
-from neutron._i18n import _, _LE, _LW
+from neutron._i18n import _, _LE, _LI, _LW
 from neutron.agent.linux import utils as agent_utils
 from neutron.agent.metadata import config
 from neutron.agent import rpc as agent_rpc
@@ -38,6 +47,10 @@ from neutron import context
 
 LOG = logging.getLogger(__name__)
 
+LOOKUP_SOCKET_SUFFIX = '.lookup'
+LOOKUP_HEADERS = ('X-Forwarded-For', 'X-Neutron-Network-ID',
+                  'X-Neutron-Router-ID')
+
 MODE_MAP = {
     config.USER_MODE: 0o644,
     config.GROUP_MODE: 0o664,
@@ -71,19 +84,231 @@ class MetadataPluginAPI(object):
         return cctxt.call(context, 'get_ports', filters=filters)
 
 
+class PortIndex(object):
+    """Local index of the ports by network and IP address.
+
+    The index is fed with the ports returned by the server and kept up to
+    date by the port and network notifications sent to the agents. It also
+    keeps the networks of the routers whose interfaces were all retrieved
+    from the server, to resolve requests coming from a router namespace.
+
+    As notifications can be lost, the entries not refreshed for max_age
+    seconds expire.
+    """
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.clear()
+
+    def clear(self):
+        self._ports = {}
+        self._updated_at = {}
+        self._address_index = collections.defaultdict(dict)
+        self._router_networks = {}
+
+    def _is_expired(self, updated_at):
+        return timeutils.now() - updated_at > self.max_age
+
+    def put_port(self, port):
+        port_id = port.get('id')
+        if not port_id or 'network_id' not in port:
+            return
+        self.remove_port(port_id)
+        self._ports[port_id] = port
+        self._updated_at[port_id] = timeutils.now()
+        for fixed_ip in port.get('fixed_ips', []):
+            key = (port['network_id'], fixed_ip['ip_address'])
+            self._address_index[key][port_id] = port
+        self._router_networks.pop(port.get('device_id'), None)
+
+    def remove_port(self, port_id):
+        port = self._ports.pop(port_id, None)
+        if not port:
+            return
+        del self._updated_at[port_id]
+        for fixed_ip in port.get('fixed_ips', []):
+            key = (port['network_id'], fixed_ip['ip_address'])
+            ports = self._address_index.get(key, {})
+            ports.pop(port_id, None)
+            if not ports:
+                self._address_index.pop(key, None)
+        # The interfaces of the router changed, they will be retrieved
+        # again from the server on the next request.
+        self._router_networks.pop(port.get('device_id'), None)
+
+    def remove_network(self, network_id):
+        port_ids = [port_id for port_id, port in self._ports.items()
+                    if port['network_id'] == network_id]
+        for port_id in port_ids:
+            self.remove_port(port_id)
+        router_ids = [router_id for router_id, (networks, _updated_at)
+                      in self._router_networks.items()
+                      if network_id in networks]
+        for router_id in router_ids:
+            del self._router_networks[router_id]
+
+    def set_router_ports(self, router_id, ports):
+        for port in ports:
+            self.put_port(port)
+        self._router_networks[router_id] = (
+            frozenset(p['network_id'] for p in ports), timeutils.now())
+
+    def get_ports(self, ip_address, network_id=None, router_id=None):
+        """Return the ports with the given IP address, or None on a miss.
+
+        The ports are searched on the given network, or else on all the
+        networks connected to the given router.
+        """
+        if network_id:
+            networks = (network_id,)
+        elif router_id in self._router_networks:
+            networks, updated_at = self._router_networks[router_id]
+            if self._is_expired(updated_at):
+                del self._router_networks[router_id]
+                return None
+        else:
+            return None
+        ports = []
+        for network in networks:
+            for port_id, port in list(self._address_index.get(
+                    (network, ip_address), {}).items()):
+                if self._is_expired(self._updated_at[port_id]):
+                    self.remove_port(port_id)
+                else:
+                    ports.append(port)
+        return ports or None
+
+
+class PortIndexCallback(object):
+    """Agent-side handler of the notifications updating the port index."""
+
+    target = oslo_messaging.Target(version='1.0')
+
+    def __init__(self, port_index):
+        self.port_index = port_index
+
+    def port_update(self, context, **kwargs):
+        port = kwargs.get('port')
+        LOG.debug("Port %s updated, refreshing the port index", port['id'])
+        self.port_index.put_port(port)
+
+    def port_delete(self, context, **kwargs):
+        port_id = kwargs.get('port_id')
+        LOG.debug("Port %s deleted, removing it from the port index",
+                  port_id)
+        self.port_index.remove_port(port_id)
+
+    def network_delete(self, context, **kwargs):
+        network_id = kwargs.get('network_id')
+        LOG.debug("Network %s deleted, removing its ports from the port "
+                  "index", network_id)
+        self.port_index.remove_network(network_id)
+
+
+class LatencyHistogram(object):
+    """Histogram of latencies, in seconds."""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, latency):
+        self.counts[bisect.bisect_left(self.BUCKETS, latency)] += 1
+        self.count += 1
+        self.total += latency
+
+    def __str__(self):
+        bounds = ['<=%ss' % bound for bound in self.BUCKETS]
+        bounds.append('>%ss' % self.BUCKETS[-1])
+        average = self.total / self.count if self.count else 0
+        return 'count=%d avg=%.3fs %s' % (
+            self.count, average,
+            ' '.join('%s:%d' % (bound, count)
+                     for bound, count in zip(bounds, self.counts)))
+
+
+class MetadataLookupHTTPConnection(agent_utils.UnixDomainHTTPConnection):
+    """Connection class for the instance lookup service of the agent."""
+    def __init__(self, *args, **kwargs):
+        super(MetadataLookupHTTPConnection, self).__init__(*args, **kwargs)
+        self.socket_path = cfg.CONF.metadata_proxy_socket + (
+            LOOKUP_SOCKET_SUFFIX)
+
+
 class MetadataProxyHandler(object):
 
-    def __init__(self, conf):
+    def __init__(self, conf, use_lookup_service=False):
         self.conf = conf
+        self.use_lookup_service = use_lookup_service
         self._cache = cache.get_cache(self.conf)
+        self._port_index = None
+        self._port_index_pid = None
+        self._port_index_connection = None
+        self._http_pool = eventlet.pools.Pool(
+            max_size=self.conf.nova_metadata_pool_size,
+            create=self._create_http)
+        self._stats = collections.Counter()
+        self._nova_latency = LatencyHistogram()
+        self._stats_reported_at = time.time()
 
         self.plugin_rpc = MetadataPluginAPI(topics.PLUGIN)
         self.context = context.get_admin_context_without_session()
 
+    def _report_stats(self):
+        interval = self.conf.metadata_stats_interval
+        now = time.time()
+        if not interval or now - self._stats_reported_at < interval:
+            return
+        self._stats_reported_at = now
+        LOG.info(_LI("Metadata proxy statistics over the last %(interval)d "
+                     "seconds: %(stats)s, Nova metadata latency: "
+                     "%(latency)s"),
+                 {'interval': interval,
+                  'stats': ', '.join('%s=%d' % stat
+                                     for stat in sorted(self._stats.items())),
+                  'latency': self._nova_latency})
+        self._stats.clear()
+        self._nova_latency.reset()
+
+    def _get_port_index_max_age(self):
+        # ML2 does not notify every port change, like a change of the fixed
+        # IPs or of the device of a port, so an entry of the index may
+        # resolve the address of another instance. Entries are not kept
+        # longer than the server query results would have been cached.
+        max_age = self.conf.metadata_port_index_max_age
+        cache_ttl = getattr(self._cache, 'expiration_time', None)
+        if cache_ttl and cache_ttl > 0:
+            max_age = min(max_age, cache_ttl)
+        return max_age
+
+    def _get_port_index(self):
+        if not self.conf.metadata_port_index:
+            return None
+        # The handler is created before the worker processes are forked,
+        # each of them maintains its own index and consumes notifications
+        # on its own connection.
+        pid = os.getpid()
+        if self._port_index_pid != pid:
+            self._port_index = PortIndex(self._get_port_index_max_age())
+            self._port_index_pid = pid
+            self._port_index_connection = agent_rpc.create_consumers(
+                [PortIndexCallback(self._port_index)], topics.AGENT,
+                [[topics.PORT, topics.UPDATE],
+                 [topics.PORT, topics.DELETE],
+                 [topics.NETWORK, topics.DELETE]])
+        return self._port_index
+
     @webob.dec.wsgify(RequestClass=webob.Request)
     def __call__(self, req):
         try:
             LOG.debug("Request: %s", req)
+            self._report_stats()
 
             instance_id, tenant_id = self._get_instance_and_tenant_id(req)
             if instance_id:
@@ -102,7 +327,24 @@ class MetadataProxyHandler(object):
                                networks=None):
         """Get ports from server."""
         filters = self._get_port_filters(router_id, ip_address, networks)
-        return self.plugin_rpc.get_ports(self.context, filters)
+        try:
+            ports = self.plugin_rpc.get_ports(self.context, filters)
+        except oslo_messaging.MessagingException:
+            with excutils.save_and_reraise_exception():
+                # The notifications sent while the connection to the
+                # messaging server is broken are lost
+                if self._port_index is not None:
+                    LOG.warning(_LW("Messaging error, resetting the port "
+                                    "index"))
+                    self._port_index.clear()
+        port_index = self._get_port_index()
+        if port_index is not None:
+            if router_id and not ip_address and not networks:
+                port_index.set_router_ports(router_id, ports)
+            else:
+                for port in ports:
+                    port_index.put_port(port)
+        return ports
 
     def _get_port_filters(self, router_id=None, ip_address=None,
                           networks=None):
@@ -153,18 +395,89 @@ class MetadataProxyHandler(object):
 
         return self._get_ports_for_remote_address(remote_address, networks)
 
+    def _lookup_instance_and_tenant_id(self, req):
+        headers = dict((header, req.headers[header])
+                       for header in LOOKUP_HEADERS if header in req.headers)
+        h = httplib2.Http()
+        resp, content = h.request(
+            'http://lookup/', method='GET', headers=headers,
+            connection_type=MetadataLookupHTTPConnection)
+        if resp.status != 200:
+            raise Exception(_('Unexpected response code from the lookup '
+                              'service: %s') % resp.status)
+        return tuple(jsonutils.loads(content))
+
     def _get_instance_and_tenant_id(self, req):
+        if self.use_lookup_service:
+            try:
+                return self._lookup_instance_and_tenant_id(req)
+            except Exception:
+                self._stats['lookup_service_errors'] += 1
+                LOG.warning(_LW("Failed to query the lookup service of the "
+                                "metadata agent, resolving the instance "
+                                "locally."), exc_info=True)
+
         remote_address = req.headers.get('X-Forwarded-For')
         network_id = req.headers.get('X-Neutron-Network-ID')
         router_id = req.headers.get('X-Neutron-Router-ID')
 
-        ports = self._get_ports(remote_address, network_id, router_id)
+        ports = index_ports = None
+        port_index = self._get_port_index()
+        if port_index is not None:
+            index_ports = port_index.get_ports(remote_address, network_id,
+                                               router_id)
+            # Several ports with the address are resolved by the server, a
+            # deletion may have been missed
+            if index_ports and len(index_ports) == 1:
+                ports = index_ports
+                self._stats['port_index_hits'] += 1
+            else:
+                self._stats['port_index_misses'] += 1
+        if ports is None:
+            ports = self._get_ports(remote_address, network_id, router_id)
+            if index_ports:
+                port_ids = set(port['id'] for port in ports)
+                for port in index_ports:
+                    if port['id'] not in port_ids:
+                        port_index.remove_port(port['id'])
 
         if len(ports) == 1:
             return ports[0]['device_id'], ports[0]['tenant_id']
         return None, None
 
+    def _create_http(self):
+        h = httplib2.Http(
+            ca_certs=self.conf.auth_ca_cert,
+            disable_ssl_certificate_validation=(
+                self.conf.nova_metadata_insecure),
+            timeout=self.conf.nova_metadata_timeout)
+        if self.conf.nova_client_cert and self.conf.nova_client_priv_key:
+            h.add_certificate(self.conf.nova_client_priv_key,
+                              self.conf.nova_client_cert,
+                              '%s:%s' % (self.conf.nova_metadata_ip,
+                                         self.conf.nova_metadata_port))
+        return h
+
+    def _get_response_cache_key(self, instance_id, req):
+        if not self._cache or req.method != 'GET':
+            return None
+        if not any(fnmatch.fnmatch(req.path_info, pattern)
+                   for pattern in self.conf.nova_metadata_cached_paths):
+            return None
+        # oslo.cache expects a string or a buffer
+        return str(('nova_metadata', instance_id, req.path_info,
+                    req.query_string))
+
     def _proxy_request(self, instance_id, tenant_id, req):
+        cache_key = self._get_response_cache_key(instance_id, req)
+        if cache_key:
+            cached_response = self._cache.get(cache_key)
+            if cached_response:
+                self._stats['response_cache_hits'] += 1
+                (req.response.content_type,
+                 req.response.body) = cached_response
+                return req.response
+
         headers = {
             'X-Forwarded-For': req.headers.get('X-Forwarded-For'),
             'X-Instance-ID': instance_id,
@@ -181,21 +494,20 @@ class MetadataProxyHandler(object):
             req.query_string,
             ''))
 
-        h = httplib2.Http(
-            ca_certs=self.conf.auth_ca_cert,
-            disable_ssl_certificate_validation=self.conf.nova_metadata_insecure
-        )
-        if self.conf.nova_client_cert and self.conf.nova_client_priv_key:
-            h.add_certificate(self.conf.nova_client_priv_key,
-                              self.conf.nova_client_cert,
-                              nova_ip_port)
-        resp, content = h.request(url, method=req.method, headers=headers,
-                                  body=req.body)
+        # The connections of the pooled clients are kept alive and reused
+        # by the next requests.
+        start = time.time()
+        with self._http_pool.item() as h:
+            resp, content = h.request(url, method=req.method,
+                                      headers=headers, body=req.body)
+        self._nova_latency.observe(time.time() - start)
 
         if resp.status == 200:
             LOG.debug(str(resp))
             req.response.content_type = resp['content-type']
             req.response.body = content
+            if cache_key:
+                self._cache.set(cache_key, (resp['content-type'], content))
             return req.response
         elif resp.status == 403:
             LOG.warning(_LW(
@@ -226,6 +538,27 @@ class MetadataProxyHandler(object):
         return hmac.new(secret, instance_id, hashlib.sha256).hexdigest()
 
 
+class MetadataLookupHandler(MetadataProxyHandler):
+    """Resolves instances on behalf of the metadata workers.
+
+    It runs in the main process of the agent, so that the workers share a
+    single port cache and index.
+    """
+
+    @webob.dec.wsgify(RequestClass=webob.Request)
+    def __call__(self, req):
+        try:
+            self._report_stats()
+            instance_id, tenant_id = self._get_instance_and_tenant_id(req)
+        except Exception:
+            LOG.exception(_LE("Unexpected error."))
+            return webob.exc.HTTPInternalServerError()
+        req.response.content_type = 'application/json'
+        req.response.body = encodeutils.to_utf8(
+            jsonutils.dumps([instance_id, tenant_id]))
+        return req.response
+
+
 class UnixDomainMetadataProxy(object):
 
     def __init__(self, conf):
@@ -289,12 +622,28 @@ class UnixDomainMetadataProxy(object):
                     mode = config.ALL_MODE
         return MODE_MAP[mode]
 
+    def _start_lookup_service(self):
+        lookup_socket = (self.conf.metadata_proxy_socket +
+                         LOOKUP_SOCKET_SUFFIX)
+        agent_utils.ensure_directory_exists_without_file(lookup_socket)
+        # Served by green threads of the main process, the workers are
+        # already forked at this point.
+        server = agent_utils.UnixDomainWSGIServer('neutron-metadata-lookup')
+        server.start(MetadataLookupHandler(self.conf), lookup_socket,
+                     workers=0, backlog=self.conf.metadata_backlog,
+                     mode=MODE_MAP[config.USER_MODE])
+        return server
+
     def run(self):
+        use_lookup_service = (self.conf.metadata_lookup_service and
+                              self.conf.metadata_workers > 0)
         server = agent_utils.UnixDomainWSGIServer('neutron-metadata-agent')
-        server.start(MetadataProxyHandler(self.conf),
+        server.start(MetadataProxyHandler(self.conf, use_lookup_service),
                      self.conf.metadata_proxy_socket,
                      workers=self.conf.metadata_workers,
                      backlog=self.conf.metadata_backlog,
                      mode=self._get_socket_mode())
+        if use_lookup_service:
+            self._start_lookup_service()
         self._init_state_reporting()
         server.wait()
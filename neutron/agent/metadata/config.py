@@ -79,7 +79,46 @@ METADATA_PROXY_HANDLER_OPTS = [
                 help=_("Client certificate for nova metadata api server.")),
      cfg.StrOpt('nova_client_priv_key',
                 default='',
-                help=_("Private key of client certificate."))
+                help=_("Private key of client certificate.")),
+     cfg.BoolOpt('metadata_port_index', default=False,
+                 help=_("Resolve the instance sending a metadata request "
+                        "with a local index of the ports, kept up to date "
+                        "by the port and network notifications sent to the "
+                        "L2 agents. The Neutron server is only queried "
+                        "for the addresses missing from the index. This "
+                        "requires a core plugin sending these "
+                        "notifications, like ML2.")),
+     cfg.IntOpt('metadata_port_index_max_age', default=600, min=1,
+                help=_("Number of seconds after which an entry of the local "
+                       "port index that was not refreshed by the Neutron "
+                       "server expires, in case a notification was lost. "
+                       "It is capped by the expiration time of the cache "
+                       "when a cache is configured. Changes of the fixed "
+                       "IPs or of the device of a port are not always "
+                       "notified, so during that time a request may be "
+                       "answered with the metadata, including the user "
+                       "data, of the instance which previously had the "
+                       "address of the requester.")),
+     cfg.IntOpt('nova_metadata_pool_size', default=100, min=1,
+                help=_("Maximum number of connections to the Nova "
+                       "metadata server kept open by each metadata worker. "
+                       "The connections are reused across requests.")),
+     cfg.IntOpt('nova_metadata_timeout', min=1,
+                help=_("Timeout in seconds of the requests sent to the Nova "
+                       "metadata server. By default, the requests have no "
+                       "timeout.")),
+     cfg.ListOpt('nova_metadata_cached_paths', default=[],
+                 help=_("List of path patterns, like "
+                        "'/openstack/2012-08-10/user_data', of the metadata "
+                        "which never changes for a given instance. When "
+                        "caching is enabled, the responses of the Nova "
+                        "metadata server for these paths are cached by "
+                        "instance.")),
+     cfg.IntOpt('metadata_stats_interval', default=300, min=0,
+                help=_("Interval in seconds between the logs of the "
+                       "statistics of each metadata worker, including the "
+                       "latency histogram of the Nova metadata server. 0 "
+                       "disables these logs."))
 ]
 
 DEDUCE_MODE = 'deduce'
@@ -112,5 +151,14 @@ UNIX_DOMAIN_METADATA_PROXY_OPTS = [
     cfg.IntOpt('metadata_backlog',
                default=4096,
                help=_('Number of backlog requests to configure the '
-                      'metadata server socket with'))
+                      'metadata server socket with')),
+    cfg.BoolOpt('metadata_lookup_service',
+                default=False,
+                help=_('Resolve the instances sending metadata requests in '
+                       'the main process of the metadata agent, on behalf '
+                       'of all the metadata workers. The workers query it '
+                       'over a local UNIX domain socket, so that they share '
+                       'the port cache and index instead of each querying '
+                       'the Neutron server. Only used when '
+                       'metadata_workers is greater than 0.'))
 ]
@@ -16,14 +16,18 @@ import os
 import threading
 import traceback
 
+from oslo_log import log as logging
 from ovs.db import idl
 from ovs import poller
 import retrying
 from six.moves import queue as Queue
 
+from neutron._i18n import _LE
 from neutron.agent.ovsdb.native import helpers
 from neutron.agent.ovsdb.native import idlutils
 
+LOG = logging.getLogger(__name__)
+
 
 class TransactionQueue(Queue.Queue, object):
     def __init__(self, *args, **kwargs):
@@ -60,6 +64,7 @@ class Connection(object):
         self.txns = TransactionQueue(1)
         self.lock = threading.Lock()
         self.schema_name = schema_name
+        self._notify_handlers = []
 
     def start(self, table_name_list=None):
         """
@@ -94,6 +99,10 @@ class Connection(object):
                 for table_name in table_name_list:
                     helper.register_table(table_name)
             self.idl = idl.Idl(self.connection, helper)
+            # NOTE: Idl.notify() is a no-op hook called for every row change
+            # processed by Idl.run(), override it to dispatch the changes to
+            # the registered handlers.
+            self.idl.notify = self._notify
             idlutils.wait_for_change(self.idl, self.timeout)
             self.poller = poller.Poller()
             self.thread = threading.Thread(target=self.run)
@@ -121,3 +130,27 @@ class Connection(object):
 
     def queue_txn(self, txn):
         self.txns.put(txn)
+
+    def register_notify_handler(self, handler):
+        """Call handler(event, row, updates) for each row change.
+
+        The handler is called from the connection thread, event being one
+        of idl.ROW_CREATE, idl.ROW_UPDATE or idl.ROW_DELETE and updates
+        holding the previous values of the updated columns.
+        """
+        self._notify_handlers.append(handler)
+
+    def unregister_notify_handler(self, handler):
+        try:
+            self._notify_handlers.remove(handler)
+        except ValueError:
+            pass
+
+    def _notify(self, event, row, updates=None):
+        for handler in list(self._notify_handlers):
+            try:
+                handler(event, row, updates)
+            except Exception:
+                LOG.exception(_LE("Error handling OVSDB %(event)s event "
+                                  "for row %(row)s"),
+                              {'event': event, 'row': row.uuid})
@@ -114,6 +114,12 @@ class SecurityGroupAgentRpc(object):
         # Flag raised when a global refresh is needed
         self.global_refresh_firewall = False
         self._use_enhanced_rpc = None
+        self._use_sg_info_delta = True
+        # Security group information received from the server, as
+        # {kind: {sg_id: (version, content)}}, used to apply the changes sent
+        # by the server instead of the full information.
+        self._sg_info_cache = dict(
+            (kind, {}) for kind in securitygroups_rpc.SG_INFO_DELTA_KINDS)
 
     @property
     def use_enhanced_rpc(self):
@@ -154,10 +160,73 @@ class SecurityGroupAgentRpc(object):
         LOG.info(_LI("Preparing filters for devices %s"), device_ids)
         self._apply_port_filter(device_ids)
 
+    def _get_security_group_info(self, device_ids):
+        if self._use_sg_info_delta:
+            sg_versions = dict(
+                (kind, dict((sg_id, version)
+                            for sg_id, (version, _content) in cache.items()))
+                for kind, cache in self._sg_info_cache.items())
+            try:
+                devices_info = (
+                    self.plugin_rpc.security_group_info_for_devices(
+                        self.context, list(device_ids),
+                        sg_versions=sg_versions))
+            except oslo_messaging.UnsupportedVersion:
+                LOG.warning(_LW('Security group information changes not '
+                                'supported by the server, falling back to '
+                                'getting the full information.'))
+                self._use_sg_info_delta = False
+            else:
+                if 'sg_versions' not in devices_info:
+                    return devices_info
+                sg_info = self._merge_security_group_info_delta(devices_info)
+                if sg_info is not None:
+                    return sg_info
+                LOG.warning(_LW('Security group information changes do not '
+                                'match the known information, getting the '
+                                'full information.'))
+                for cache in self._sg_info_cache.values():
+                    cache.clear()
+        return self.plugin_rpc.security_group_info_for_devices(
+            self.context, list(device_ids))
+
+    def _merge_security_group_info_delta(self, devices_info):
+        """Build the full security group information from a delta reply.
+
+        Returns None if applying the changes does not give the versions
+        sent by the server.
+        """
+        sg_info = {'devices': devices_info['devices']}
+        for kind, (version_func, _delta_func, apply_func) in (
+                securitygroups_rpc.SG_INFO_DELTA_KINDS.items()):
+            cache = self._sg_info_cache[kind]
+            versions = devices_info['sg_versions'][kind]
+            sg_info[kind] = dict(devices_info[kind])
+            for sg_id, delta in devices_info[kind + '_delta'].items():
+                if sg_id not in cache:
+                    return None
+                content = apply_func(cache[sg_id][1], delta)
+                if version_func(content) != versions.get(sg_id):
+                    return None
+                sg_info[kind][sg_id] = content
+        for kind, cache in self._sg_info_cache.items():
+            versions = devices_info['sg_versions'][kind]
+            for sg_id, content in sg_info[kind].items():
+                cache[sg_id] = (versions[sg_id], content)
+        return sg_info
+
+    def _prune_security_group_info_cache(self):
+        sg_ids = set()
+        for device in self.firewall.ports.values():
+            sg_ids.update(device.get('security_groups', []))
+            sg_ids.update(device.get('security_group_source_groups', []))
+        for cache in self._sg_info_cache.values():
+            for sg_id in set(cache) - sg_ids:
+                del cache[sg_id]
+
     def _apply_port_filter(self, device_ids, update_filter=False):
         if self.use_enhanced_rpc:
-            devices_info = self.plugin_rpc.security_group_info_for_devices(
-                self.context, list(device_ids))
+            devices_info = self._get_security_group_info(device_ids)
             devices = devices_info['devices']
             security_groups = devices_info['security_groups']
             security_group_member_ips = devices_info['sg_member_ips']
@@ -241,6 +310,7 @@ class SecurityGroupAgentRpc(object):
                 if not device:
                     continue
                 self.firewall.remove_port_filter(device)
+        self._prune_security_group_info_cache()
 
     @skip_if_noopfirewall_or_firewall_disabled
     def refresh_firewall(self, device_ids=None):
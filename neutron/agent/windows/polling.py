@@ -19,7 +19,8 @@ from neutron.agent.common import base_polling
 
 
 @contextlib.contextmanager
-def get_polling_manager(minimize_polling, ovsdb_monitor_respawn_interval):
+def get_polling_manager(minimize_polling, ovsdb_monitor_respawn_interval,
+                        ovsdb_monitor_interface=None):
     pm = base_polling.AlwaysPoll()
     yield pm
 
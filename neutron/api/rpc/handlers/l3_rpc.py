@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+
 from neutron_lib import constants
 from neutron_lib import exceptions
 from oslo_config import cfg
@@ -48,7 +50,8 @@ class L3RpcCallback(object):
     # 1.7 Added method delete_agent_gateway_port for DVR Routers
     # 1.8 Added address scope information
     # 1.9 Added get_router_ids
-    target = oslo_messaging.Target(version='1.9')
+    # 1.10 Added router_revisions to sync_routers
+    target = oslo_messaging.Target(version='1.10')
 
     @property
     def plugin(self):
@@ -81,12 +84,15 @@ class L3RpcCallback(object):
         """Sync routers according to filters to a specific agent.
 
         @param context: contain user information
-        @param kwargs: host, router_ids
+        @param kwargs: host, router_ids, router_revisions
         @return: a list of routers
-                 with their interfaces and floating_ips
+                 with their interfaces and floating_ips. Routers whose
+                 sync_revision matches the one the agent passed in
+                 router_revisions are returned as unchanged stubs.
         """
         router_ids = kwargs.get('router_ids')
         host = kwargs.get('host')
+        router_revisions = kwargs.get('router_revisions') or {}
         context = neutron_context.get_admin_context()
         if utils.is_extension_supported(
             self.l3plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS):
@@ -98,11 +104,38 @@ class L3RpcCallback(object):
         if utils.is_extension_supported(
             self.plugin, constants.PORT_BINDING_EXT_ALIAS):
             self._ensure_host_set_on_ports(context, host, routers)
+        for router in routers:
+            router['sync_revision'] = self._get_sync_revision(router)
+        if router_revisions:
+            routers = [self._make_unchanged_router_stub(router)
+                       if (router_revisions.get(router['id']) ==
+                           router['sync_revision'])
+                       else router
+                       for router in routers]
         LOG.debug("Routers returned to l3 agent:\n %s",
                   utils.DelayedStringRenderer(jsonutils.dumps,
                                               routers, indent=5))
         return routers
 
+    @staticmethod
+    def _get_sync_revision(router):
+        """Return a fingerprint of the router data synced to an agent.
+
+        Router revision numbers are not bumped when related resources such
+        as floating IPs, interfaces or subnets change, so the revision sent
+        to the agent is derived from the content of the sync data instead.
+        The sync data of unchanged routers is therefore still built, only
+        the reply sent to the agent is reduced.
+        """
+        data = jsonutils.dumps(router, sort_keys=True)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _make_unchanged_router_stub(router):
+        return {'id': router['id'],
+                'sync_revision': router['sync_revision'],
+                'unchanged': True}
+
     def _ensure_host_set_on_ports(self, context, host, routers):
         for router in routers:
             LOG.debug("Checking router: %(id)s for host: %(host)s",
@@ -12,8 +12,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import hashlib
+
 from oslo_log import log as logging
 import oslo_messaging
+from oslo_serialization import jsonutils
 
 from neutron._i18n import _LW
 from neutron.common import constants
@@ -24,6 +28,145 @@ from neutron import manager
 
 LOG = logging.getLogger(__name__)
 
+# Number of security group rule and member IP sets kept by each server
+# process to compute the changes since the version known by an agent.
+SG_INFO_SNAPSHOTS_SIZE = 1024
+
+
+def _version(canonical):
+    return hashlib.sha1(
+        jsonutils.dumps(canonical, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+
+def _rule_key(rule):
+    return jsonutils.dumps(rule, sort_keys=True)
+
+
+def get_rules_version(rules):
+    """Return a version identifying the content of a rule list."""
+    return _version(sorted(_rule_key(rule) for rule in rules))
+
+
+def get_member_ips_version(member_ips):
+    """Return a version identifying the content of member IPs."""
+    return _version({ethertype: sorted(ips)
+                     for ethertype, ips in member_ips.items()})
+
+
+def get_rules_delta(old_rules, new_rules):
+    old = {_rule_key(rule): rule for rule in old_rules}
+    new = {_rule_key(rule): rule for rule in new_rules}
+    return {'added': [rule for key, rule in new.items() if key not in old],
+            'removed': [rule for key, rule in old.items() if key not in new]}
+
+
+def apply_rules_delta(rules, delta):
+    removed = set(_rule_key(rule) for rule in delta['removed'])
+    return ([rule for rule in rules if _rule_key(rule) not in removed] +
+            list(delta['added']))
+
+
+def get_member_ips_delta(old_member_ips, new_member_ips):
+    """Return the changes between two member IP dicts.
+
+    Ethertypes missing from new_member_ips are mapped to None.
+    """
+    delta = dict.fromkeys(old_member_ips)
+    for ethertype, ips in new_member_ips.items():
+        old_ips = set(old_member_ips.get(ethertype, ()))
+        ips = set(ips)
+        delta[ethertype] = {'added': sorted(ips - old_ips),
+                            'removed': sorted(old_ips - ips)}
+    return delta
+
+
+def apply_member_ips_delta(member_ips, delta):
+    result = {}
+    for ethertype, ips_delta in delta.items():
+        if ips_delta is None:
+            continue
+        ips = ((set(member_ips.get(ethertype, ())) -
+                set(ips_delta['removed'])) | set(ips_delta['added']))
+        result[ethertype] = sorted(ips)
+    return result
+
+
+# (version function, delta function, apply function) for each part of the
+# security group information which can be sent as a delta
+SG_INFO_DELTA_KINDS = {
+    'security_groups': (get_rules_version, get_rules_delta,
+                        apply_rules_delta),
+    'sg_member_ips': (get_member_ips_version, get_member_ips_delta,
+                      apply_member_ips_delta),
+}
+
+
+class SecurityGroupInfoSnapshots(object):
+    """LRU of the security group information recently sent to agents.
+
+    Entries are keyed by their content version, so any server process
+    holding the version known by an agent can compute the changes from it,
+    and the others just send the full information.
+    """
+
+    def __init__(self, size=SG_INFO_SNAPSHOTS_SIZE):
+        self.size = size
+        self._snapshots = collections.OrderedDict()
+
+    def get(self, kind, sg_id, version):
+        key = (kind, sg_id, version)
+        content = self._snapshots.pop(key, None)
+        if content is not None:
+            self._snapshots[key] = content
+        return content
+
+    def add(self, kind, sg_id, version, content):
+        key = (kind, sg_id, version)
+        self._snapshots.pop(key, None)
+        self._snapshots[key] = content
+        while len(self._snapshots) > self.size:
+            self._snapshots.popitem(last=False)
+
+    def get_sg_info_delta(self, sg_info, sg_versions):
+        """Replace the parts of sg_info known by the agent by deltas.
+
+        :param sg_versions: {'security_groups': {sg_id: version},
+                             'sg_member_ips': {sg_id: version}}
+            as known by the agent
+        :returns: sg_info where the rules and member IPs of the groups for
+            which the version known by the agent is available are moved to
+            'security_groups_delta' and 'sg_member_ips_delta', with the
+            current version of all the groups in 'sg_versions'
+        """
+        result = {'devices': sg_info['devices'],
+                  'sg_versions': {}}
+        counts = {'full': 0, 'delta': 0}
+        for kind, (version_func, delta_func, _apply_func) in (
+                SG_INFO_DELTA_KINDS.items()):
+            known_versions = sg_versions.get(kind) or {}
+            full = result[kind] = {}
+            deltas = result[kind + '_delta'] = {}
+            versions = result['sg_versions'][kind] = {}
+            for sg_id, content in sg_info[kind].items():
+                version = version_func(content)
+                versions[sg_id] = version
+                known_version = known_versions.get(sg_id)
+                if known_version == version:
+                    deltas[sg_id] = delta_func(content, content)
+                else:
+                    known = known_version and self.get(
+                        kind, sg_id, known_version)
+                    if known is None:
+                        full[sg_id] = content
+                    else:
+                        deltas[sg_id] = delta_func(known, content)
+                self.add(kind, sg_id, version, content)
+                counts['delta' if sg_id in deltas else 'full'] += 1
+        LOG.debug("Security group information sent as deltas: %(delta)d, "
+                  "in full: %(full)d", counts)
+        return result
+
 
 class SecurityGroupServerRpcApi(object):
     """RPC client for security group methods in the plugin.
@@ -47,12 +190,17 @@ class SecurityGroupServerRpcApi(object):
         return cctxt.call(context, 'security_group_rules_for_devices',
                           devices=devices)
 
-    def security_group_info_for_devices(self, context, devices):
+    def security_group_info_for_devices(self, context, devices,
+                                        sg_versions=None):
         LOG.debug("Get security group information for devices via rpc %r",
                   devices)
-        cctxt = self.client.prepare(version='1.2')
+        if sg_versions is None:
+            cctxt = self.client.prepare(version='1.2')
+            return cctxt.call(context, 'security_group_info_for_devices',
+                              devices=devices)
+        cctxt = self.client.prepare(version='1.3')
         return cctxt.call(context, 'security_group_info_for_devices',
-                          devices=devices)
+                          devices=devices, sg_versions=sg_versions)
 
 
 class SecurityGroupServerRpcCallback(object):
@@ -66,12 +214,15 @@ class SecurityGroupServerRpcCallback(object):
     # API version history:
     #   1.1 - Initial version
     #   1.2 - security_group_info_for_devices introduced as an optimization
+    #   1.3 - sg_versions argument added to security_group_info_for_devices
 
     # NOTE: target must not be overridden in subclasses
     # to keep RPC API version consistent across plugins.
-    target = oslo_messaging.Target(version='1.2',
+    target = oslo_messaging.Target(version='1.3',
                                    namespace=constants.RPC_NAMESPACE_SECGROUP)
 
+    sg_info_snapshots = SecurityGroupInfoSnapshots()
+
     @property
     def plugin(self):
         return manager.NeutronManager.get_plugin()
@@ -107,11 +258,19 @@ class SecurityGroupServerRpcCallback(object):
           'devices': {device_id: {device_info}}
         }
 
+        When sg_versions is given, the rules and member IPs of the groups
+        already known by the agent are returned as changes, see
+        SecurityGroupInfoSnapshots.get_sg_info_delta.
+
         Note that sets are serialized into lists by rpc code.
         """
         devices_info = kwargs.get('devices')
+        sg_versions = kwargs.get('sg_versions')
         ports = self._get_devices_info(context, devices_info)
-        return self.plugin.security_group_info_for_ports(context, ports)
+        sg_info = self.plugin.security_group_info_for_ports(context, ports)
+        if sg_versions is None:
+            return sg_info
+        return self.sg_info_snapshots.get_sg_info_delta(sg_info, sg_versions)
 
 
 class SecurityGroupAgentRpcApiMixin(object):
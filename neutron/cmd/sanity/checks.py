@@ -342,6 +342,23 @@ def ovs_conntrack_supported():
     return ofctl_arg_supported(cmd='add-flow', ct_state='+trk', actions='drop')
 
 
+def ovs_ofctl_bundle_supported():
+    br_name = base.get_rand_device_name(prefix="ovs-test-")
+
+    with ovs_lib.OVSBridge(br_name) as br:
+        try:
+            br.set_protocols(["OpenFlow%d" % i for i in range(10, 15)])
+            br.do_action_flows_bundle([
+                ('add', {'table': 0, 'priority': 1, 'in_port': 1,
+                         'actions': 'drop'}),
+                ('del', {'table': 0, 'in_port': 1})])
+        except RuntimeError as e:
+            LOG.debug("Exception while checking ovs-ofctl bundle support: "
+                      "%s", e)
+            return False
+    return True
+
+
 def ebtables_supported():
     try:
         cmd = ['ebtables', '--version']
@@ -205,6 +205,16 @@ def check_ovs_conntrack():
     return result
 
 
+def check_ovs_ofctl_bundle():
+    result = checks.ovs_ofctl_bundle_supported()
+    if not result:
+        LOG.error(_LE('Check for Open vSwitch support of OpenFlow bundles '
+                      'mixing flow additions and deletions failed. Disable '
+                      'the ovs_ofctl_bundles option or upgrade Open '
+                      'vSwitch.'))
+    return result
+
+
 def check_ebtables():
     result = checks.ebtables_supported()
     if not result:
@@ -256,6 +266,8 @@ OPTS = [
                     help=_('Check ovsdb native interface support')),
     BoolOptCallback('ovs_conntrack', check_ovs_conntrack,
                     help=_('Check ovs conntrack support')),
+    BoolOptCallback('ovs_ofctl_bundle', check_ovs_ofctl_bundle,
+                    help=_('Check ovs-ofctl bundle support')),
     BoolOptCallback('ebtables_installed', check_ebtables,
                     help=_('Check ebtables installation')),
     BoolOptCallback('keepalived_ipv6_support', check_keepalived_ipv6_support,
@@ -303,6 +315,8 @@ def enable_tests_from_config():
         cfg.CONF.set_default('ovsdb_native', True)
     if cfg.CONF.l3_ha:
         cfg.CONF.set_default('keepalived_ipv6_support', True)
+    if cfg.CONF.ovs_ofctl_bundles:
+        cfg.CONF.set_default('ovs_ofctl_bundle', True)
     if cfg.CONF.SECURITYGROUP.enable_ipset:
         cfg.CONF.set_default('ipset_installed', True)
     if cfg.CONF.SECURITYGROUP.enable_security_group:
@@ -58,7 +58,26 @@ DHCP_AGENT_OPTS = [
     cfg.IntOpt('num_sync_threads', default=4,
                help=_('Number of threads to use during sync process. '
                       'Should not exceed connection pool size configured on '
-                      'server.'))
+                      'server.')),
+    cfg.IntOpt('sync_networks_batch_size', default=0, min=0,
+               help=_('Number of networks whose subnets and ports are '
+                      'retrieved per RPC call during a full sync. The agent '
+                      'first retrieves the ids of its networks, then their '
+                      'details in batches, and configures the networks of a '
+                      'batch while the next one is retrieved. 0 retrieves '
+                      'all the networks with a single call.')),
+    cfg.BoolOpt('persist_network_cache', default=False,
+                help=_('Save a snapshot of the networks known by the agent '
+                       'to a local file and restore it at startup. Networks '
+                       'whose state on the server did not change while the '
+                       'agent was stopped are then only reloaded instead of '
+                       'having their DHCP server restarted.')),
+    cfg.FloatOpt('reload_allocations_delay', default=0, min=0,
+                 help=_('Number of seconds to wait after a port or subnet '
+                        'event before reloading the DHCP allocations of its '
+                        'network. All the events received for the network '
+                        'during that window are applied with a single reload '
+                        'of the DHCP server. 0 reloads on every event.')),
 ]
 
 DHCP_OPTS = [
@@ -96,6 +96,11 @@ OPTS = [
                help=_('Iptables mangle mark used to mark ingress from '
                       'external network. This mark will be masked with '
                       '0xffff so that only the lower 16 bits will be used.')),
+    cfg.IntOpt('router_processing_workers', default=8, min=1,
+               help=_('Number of routers processed concurrently. Processing '
+                      'a router mostly waits for external commands, so '
+                      'raising this value shortens the full synchronization '
+                      'of agents hosting many routers.')),
 ]
 
 OPTS += config.EXT_NET_BRIDGE_OPTS
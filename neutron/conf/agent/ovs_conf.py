@@ -26,6 +26,14 @@ OPTS = [
                help=_('Timeout in seconds for ovs-vsctl commands. '
                       'If the timeout expires, ovs commands will fail with '
                       'ALARMCLOCK error.')),
+    cfg.BoolOpt('ovs_ofctl_bundles',
+                default=False,
+                help=_('Apply the deferred flows of the Open vSwitch '
+                       'firewall in atomic OpenFlow bundles, with a single '
+                       'ovs-ofctl call per batch. Open vSwitch must support '
+                       'bundles mixing flow additions and deletions, which '
+                       'can be checked with neutron-sanity-check '
+                       '--ovs_ofctl_bundle.')),
 ]
 
 
@@ -533,7 +533,14 @@ class DhcpAgentSchedulerDbMixin(dhcpagentscheduler
             self._get_agent(context, id)
             return {'networks': []}
 
-    def list_active_networks_on_active_dhcp_agent(self, context, host):
+    def list_active_networks_on_active_dhcp_agent(self, context, host,
+                                                  network_ids=None):
+        """List the active networks hosted by an active DHCP agent.
+
+        When network_ids is given, only the networks among them are listed.
+        """
+        if network_ids is not None and not network_ids:
+            return []
         try:
             agent = self._get_agent_by_type_and_host(
                 context, constants.AGENT_TYPE_DHCP, host)
@@ -547,6 +554,10 @@ class DhcpAgentSchedulerDbMixin(dhcpagentscheduler
             ndab_model.NetworkDhcpAgentBinding.network_id)
         query = query.filter(
             ndab_model.NetworkDhcpAgentBinding.dhcp_agent_id == agent.id)
+        if network_ids is not None:
+            query = query.filter(
+                ndab_model.NetworkDhcpAgentBinding.network_id.in_(
+                    network_ids))
 
         net_ids = [item[0] for item in query]
         if net_ids:
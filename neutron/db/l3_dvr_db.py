@@ -21,6 +21,7 @@ from oslo_log import helpers as log_helper
 from oslo_log import log as logging
 from oslo_utils import excutils
 import six
+from sqlalchemy import orm
 
 from neutron._i18n import _, _LE, _LI, _LW
 from neutron.callbacks import events
@@ -540,6 +541,7 @@ class L3_NAT_with_dvr_db_mixin(l3_db.L3_NAT_db_mixin,
         router_ids = [r['id'] for r in routers]
         snat_binding = l3_sched_db.RouterL3AgentBinding
         query = (context.session.query(snat_binding).
+                 options(orm.joinedload('l3_agent')).
                  filter(snat_binding.router_id.in_(router_ids))).all()
         bindings = dict((b.router_id, b) for b in query)
 
@@ -629,10 +629,15 @@ class L3_HA_NAT_db_mixin(l3_dvr_db.L3_NAT_with_dvr_db_mixin,
         for agent in self.get_l3_agents_hosting_routers(context, [router_id]):
             self.remove_router_from_l3_agent(context, agent['id'], router_id)
 
-    def get_ha_router_port_bindings(self, context, router_ids, host=None):
+    def get_ha_router_port_bindings(self, context, router_ids, host=None,
+                                    load_ports=False):
         if not router_ids:
             return []
         query = context.session.query(L3HARouterAgentPortBinding)
+        if load_ports:
+            # Fetch the HA ports in the same query instead of lazy loading
+            # them one binding at a time.
+            query = query.options(orm.joinedload('port'))
 
         if host:
             query = query.join(agents_db.Agent).filter(
@@ -700,7 +705,8 @@ class L3_HA_NAT_db_mixin(l3_dvr_db.L3_NAT_with_dvr_db_mixin,
 
         bindings = self.get_ha_router_port_bindings(context,
                                                     routers_dict.keys(),
-                                                    host)
+                                                    host,
+                                                    load_ports=True)
         for binding in bindings:
             port = binding.port
             if not port:
@@ -716,10 +722,10 @@ class L3_HA_NAT_db_mixin(l3_dvr_db.L3_NAT_with_dvr_db_mixin,
             router[constants.HA_INTERFACE_KEY] = port_dict
             router[n_const.HA_ROUTER_STATE_KEY] = binding.state
 
-        for router in routers_dict.values():
-            interface = router.get(constants.HA_INTERFACE_KEY)
-            if interface:
-                self._populate_mtu_and_subnets_for_ports(context, [interface])
+        interfaces = [router[constants.HA_INTERFACE_KEY]
+                      for router in routers_dict.values()
+                      if router.get(constants.HA_INTERFACE_KEY)]
+        self._populate_mtu_and_subnets_for_ports(context, interfaces)
 
         # Could not filter the HA_INTERFACE_KEY here, because a DVR router
         # with SNAT HA in DVR compute host also does not have that attribute.
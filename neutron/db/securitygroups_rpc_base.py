@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
 import netaddr
 from neutron_lib import constants as const
 from oslo_log import log as logging
@@ -35,6 +37,105 @@ DIRECTION_IP_PREFIX = {'ingress': 'source_ip_prefix',
 DHCP_RULE_PORT = {4: (67, 68, const.IPv4), 6: (547, 546, const.IPv6)}
 
 
+class _MemberIpsQuery(object):
+
+    def __init__(self):
+        self.sg_ids = set()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RemoteGroupMemberIpsCoalescer(object):
+    """Shares remote group member IP queries between concurrent requests.
+
+    A security group member update makes every agent hosting a member ask
+    for the member IPs of the group at about the same time. Instead of one
+    query per request, requests for a group which is already being queried
+    are grouped in a single follow-up query.
+
+    Results are never kept once returned, and a request only gets results
+    from a query started after it was received, so it always sees the
+    changes committed before it arrived, whichever server process made
+    them. This is what makes it safe without any cross-process
+    invalidation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # sg_id -> query being run
+        self._running = {}
+        # sg_id -> query which will run once the running one is done
+        self._queued = {}
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, sg_ids, query_func):
+        """Return the member IPs of sg_ids as a dict of sets.
+
+        :param query_func: called with a list of security group ids, returns
+            their member IPs as a dict of sets
+        """
+        own = None
+        queued = None
+        running_before = set()
+        shared = set()
+        with self._lock:
+            for sg_id in set(sg_ids):
+                if sg_id in self._queued:
+                    # not started yet, so it will see everything committed
+                    # before this request
+                    shared.add(self._queued[sg_id])
+                    self.stats['hits'] += 1
+                    continue
+                self.stats['misses'] += 1
+                if sg_id in self._running:
+                    queued = queued or _MemberIpsQuery()
+                    queued.sg_ids.add(sg_id)
+                    running_before.add(self._running[sg_id])
+                    self._queued[sg_id] = queued
+                else:
+                    own = own or _MemberIpsQuery()
+                    own.sg_ids.add(sg_id)
+                    self._running[sg_id] = own
+        # The own query is run before waiting for anything else, so that a
+        # running query never waits for another one.
+        if own:
+            self._run(own, query_func)
+        if queued:
+            for query in running_before:
+                query.done.wait()
+            with self._lock:
+                for sg_id in queued.sg_ids:
+                    del self._queued[sg_id]
+                    self._running[sg_id] = queued
+            self._run(queued, query_func)
+        ips_by_group = {}
+        for query in [own, queued] + list(shared):
+            if query is None:
+                continue
+            query.done.wait()
+            if query.error is not None:
+                raise query.error
+            for sg_id in query.sg_ids:
+                ips_by_group[sg_id] = set(query.result[sg_id])
+        return {sg_id: ips_by_group[sg_id] for sg_id in sg_ids}
+
+    def _run(self, query, query_func):
+        try:
+            query.result = query_func(list(query.sg_ids))
+        except Exception as e:
+            query.error = e
+        finally:
+            with self._lock:
+                for sg_id in query.sg_ids:
+                    if self._running.get(sg_id) is query:
+                        del self._running[sg_id]
+            query.done.set()
+
+
+_member_ips_coalescer = RemoteGroupMemberIpsCoalescer()
+
+
 class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
     """Mixin class to add agent-based security group implementation."""
 
@@ -222,7 +323,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         return self._get_security_group_member_ips(context, sg_info)
 
     def _get_security_group_member_ips(self, context, sg_info):
-        ips = self._select_ips_for_remote_group(
+        ips = self._get_ips_for_remote_groups(
             context, sg_info['sg_member_ips'].keys())
         for sg_id, member_ips in ips.items():
             for ip in member_ips:
@@ -255,6 +356,19 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         query = query.filter(sg_binding_port.in_(ports.keys()))
         return query.all()
 
+    def _get_ips_for_remote_groups(self, context, remote_group_ids):
+        """Return the member IPs of the remote groups, sharing the queries
+        with concurrent requests for the same groups.
+        """
+        if not remote_group_ids:
+            return {}
+        ips = _member_ips_coalescer.get(
+            remote_group_ids,
+            lambda sg_ids: self._select_ips_for_remote_group(context, sg_ids))
+        LOG.debug("Remote group member IPs query stats: %s",
+                  _member_ips_coalescer.stats)
+        return ips
+
     def _select_ips_for_remote_group(self, context, remote_group_ids):
         ips_by_group = {}
         if not remote_group_ids:
@@ -385,7 +499,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
 
     def _convert_remote_group_id_to_ip_prefix(self, context, ports):
         remote_group_ids = self._select_remote_group_ids(ports)
-        ips = self._select_ips_for_remote_group(context, remote_group_ids)
+        ips = self._get_ips_for_remote_groups(context, remote_group_ids)
         for port in ports.values():
             updated_rule = []
             for rule in port.get('security_group_rules'):
@@ -0,0 +1,210 @@
+# Copyright 2016 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+
+import netaddr
+
+# In-memory free range index used by the Neutron DB IPAM driver.
+#
+# The database remains the only source of truth for IP allocations; the
+# structures in this module are a per-process hint which allows the driver
+# to pick a candidate address without loading every allocation of a subnet
+# on each request. Candidates are always validated against the database
+# before being handed out, and a stale index is simply rebuilt.
+
+
+class FreeRangeIndex(object):
+    """Sorted set of disjoint free IP intervals for an allocation pool.
+
+    Intervals are stored as two parallel sorted lists of integers, so that
+    looking up the interval containing a given address is a binary search.
+    """
+
+    def __init__(self, first, last, ip_version, allocated=()):
+        self.first = int(first)
+        self.last = int(last)
+        self.ip_version = ip_version
+        self._firsts = []
+        self._lasts = []
+        self._size = 0
+        start = self.first
+        for ip in sorted(set(int(netaddr.IPAddress(a)) for a in allocated)):
+            if ip < self.first or ip > self.last:
+                continue
+            if ip > start:
+                self._append(start, ip - 1)
+            start = ip + 1
+        if start <= self.last:
+            self._append(start, self.last)
+
+    def _append(self, first, last):
+        self._firsts.append(first)
+        self._lasts.append(last)
+        self._size += last - first + 1
+
+    @property
+    def size(self):
+        """Number of free addresses in the pool."""
+        return self._size
+
+    def __len__(self):
+        return len(self._firsts)
+
+    def _find(self, ip):
+        """Return the index of the interval containing ip, or -1."""
+        pos = bisect.bisect_right(self._firsts, ip) - 1
+        if pos >= 0 and ip <= self._lasts[pos]:
+            return pos
+        return -1
+
+    def is_free(self, ip_address):
+        return self._find(int(netaddr.IPAddress(ip_address))) >= 0
+
+    def candidates(self, count):
+        """Return up to count free addresses, lowest first."""
+        result = []
+        for first, last in zip(self._firsts, self._lasts):
+            last = min(last, first + count - len(result) - 1)
+            for ip in range(first, last + 1):
+                result.append(str(netaddr.IPAddress(ip, self.ip_version)))
+            if len(result) >= count:
+                break
+        return result
+
+    def allocate(self, ip_address):
+        """Remove ip_address from the free set.
+
+        :returns: True if the address was free, False otherwise.
+        """
+        ip = int(netaddr.IPAddress(ip_address))
+        pos = self._find(ip)
+        if pos < 0:
+            return False
+        first, last = self._firsts[pos], self._lasts[pos]
+        if first == last:
+            del self._firsts[pos]
+            del self._lasts[pos]
+        elif ip == first:
+            self._firsts[pos] = ip + 1
+        elif ip == last:
+            self._lasts[pos] = ip - 1
+        else:
+            self._lasts[pos] = ip - 1
+            self._firsts.insert(pos + 1, ip + 1)
+            self._lasts.insert(pos + 1, last)
+        self._size -= 1
+        return True
+
+    def release(self, ip_address):
+        """Add ip_address back to the free set, merging adjacent intervals.
+
+        :returns: True if the address was added, False if it was already
+            free or lies outside of the pool.
+        """
+        ip = int(netaddr.IPAddress(ip_address))
+        if ip < self.first or ip > self.last or self._find(ip) >= 0:
+            return False
+        pos = bisect.bisect_right(self._firsts, ip)
+        merge_left = pos > 0 and self._lasts[pos - 1] == ip - 1
+        merge_right = (pos < len(self._firsts) and
+                       self._firsts[pos] == ip + 1)
+        if merge_left and merge_right:
+            self._lasts[pos - 1] = self._lasts[pos]
+            del self._firsts[pos]
+            del self._lasts[pos]
+        elif merge_left:
+            self._lasts[pos - 1] = ip
+        elif merge_right:
+            self._firsts[pos] = ip
+        else:
+            self._firsts.insert(pos, ip)
+            self._lasts.insert(pos, ip)
+        self._size += 1
+        return True
+
+
+class SubnetAllocationIndex(object):
+    """Free range indexes for all the allocation pools of an IPAM subnet."""
+
+    def __init__(self, pools, ip_version, allocations):
+        """Build the index.
+
+        :param pools: iterable of (pool_id, first_ip, last_ip) tuples
+        :param ip_version: IP version of the subnet
+        :param allocations: iterable of allocated IP address strings
+        """
+        self.signature = self.pools_signature(pools)
+        allocated = [netaddr.IPAddress(ip) for ip in allocations]
+        self.pools = []
+        for pool_id, first_ip, last_ip in self.signature:
+            first = netaddr.IPAddress(first_ip)
+            last = netaddr.IPAddress(last_ip)
+            self.pools.append(
+                (pool_id, FreeRangeIndex(
+                    first, last, ip_version,
+                    [ip for ip in allocated if first <= ip <= last])))
+
+    @staticmethod
+    def pools_signature(pools):
+        return tuple((pool_id, str(first_ip), str(last_ip))
+                     for pool_id, first_ip, last_ip in pools)
+
+    @property
+    def size(self):
+        return sum(index.size for _pool_id, index in self.pools)
+
+    def allocate(self, ip_address):
+        for _pool_id, index in self.pools:
+            if index.allocate(ip_address):
+                return True
+        return False
+
+    def release(self, ip_address):
+        for _pool_id, index in self.pools:
+            if index.release(ip_address):
+                return True
+        return False
+
+
+class AllocationIndexCache(object):
+    """Per-process cache of SubnetAllocationIndex keyed by subnet id."""
+
+    def __init__(self):
+        self._indexes = {}
+
+    def get(self, subnet_id, pools):
+        """Return the cached index if it still matches the subnet pools."""
+        index = self._indexes.get(subnet_id)
+        if (index is not None and
+                index.signature != SubnetAllocationIndex.pools_signature(
+                    pools)):
+            self.invalidate(subnet_id)
+            return None
+        return index
+
+    def build(self, subnet_id, pools, ip_version, allocations):
+        index = SubnetAllocationIndex(pools, ip_version, allocations)
+        self._indexes[subnet_id] = index
+        return index
+
+    def lookup(self, subnet_id):
+        return self._indexes.get(subnet_id)
+
+    def invalidate(self, subnet_id):
+        self._indexes.pop(subnet_id, None)
+
+    def clear(self):
+        self._indexes.clear()
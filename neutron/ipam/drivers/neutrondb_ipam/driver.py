@@ -13,16 +13,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import itertools
 import random
 
 import netaddr
 from neutron_lib import exceptions as n_exc
 from oslo_log import log
 from oslo_utils import uuidutils
+from sqlalchemy import event
 
 from neutron._i18n import _, _LE
 from neutron.ipam import driver as ipam_base
+from neutron.ipam.drivers.neutrondb_ipam import allocation_index
 from neutron.ipam.drivers.neutrondb_ipam import db_api as ipam_db_api
 from neutron.ipam import exceptions as ipam_exc
 from neutron.ipam import requests as ipam_req
@@ -33,6 +34,49 @@ from neutron import manager
 
 LOG = log.getLogger(__name__)
 
+# Maximum number of candidates found already allocated in the database
+# before the in-memory allocation index is considered stale and rebuilt.
+MAX_INDEX_MISSES = 10
+
+_allocation_indexes = allocation_index.AllocationIndexCache()
+
+# Key of the session info entry holding the allocation index changes of
+# the session's current transaction.
+_INDEX_CHANGES_KEY = 'neutrondb_ipam_index_changes'
+
+
+def _apply_index_changes(session):
+    changes = session.info.get(_INDEX_CHANGES_KEY, [])
+    for subnet_id, allocated, ip_address in changes:
+        index = _allocation_indexes.lookup(subnet_id)
+        if not index:
+            continue
+        if allocated:
+            index.allocate(ip_address)
+        else:
+            index.release(ip_address)
+    del changes[:]
+
+
+def _discard_index_changes(session):
+    del session.info.get(_INDEX_CHANGES_KEY, [])[:]
+
+
+def _get_index_changes(session):
+    """Return the allocation index changes pending on a session.
+
+    The per-process allocation index is shared by every request served by
+    this process, so allocations and deallocations are only applied to it
+    once the transaction which made them has been committed. They are
+    dropped if the transaction is rolled back.
+    """
+    changes = session.info.get(_INDEX_CHANGES_KEY)
+    if changes is None:
+        changes = session.info[_INDEX_CHANGES_KEY] = []
+        event.listen(session, 'after_commit', _apply_index_changes)
+        event.listen(session, 'after_rollback', _discard_index_changes)
+    return changes
+
 
 class NeutronDbSubnet(ipam_base.Subnet):
     """Manage IP addresses for Neutron DB IPAM driver.
@@ -154,31 +198,91 @@ class NeutronDbSubnet(ipam_base.Subnet):
                 subnet_id=self.subnet_manager.neutron_id,
                 ip=ip_address)
 
-    def _generate_ip(self, session, prefer_next=False):
-        """Generate an IP address from the set of available addresses."""
-        ip_allocations = netaddr.IPSet()
-        for ipallocation in self.subnet_manager.list_allocations(session):
-            ip_allocations.add(netaddr.IPAddress(ipallocation.ip_address))
-
-        for ip_pool in self.subnet_manager.list_pools(session):
-            ip_set = netaddr.IPSet()
-            ip_set.add(netaddr.IPRange(ip_pool.first_ip, ip_pool.last_ip))
-            av_set = ip_set.difference(ip_allocations)
-            if av_set.size == 0:
+    def _build_allocation_index(self, session, pools):
+        allocations = [allocation.ip_address for allocation in
+                       self.subnet_manager.list_allocations(session)]
+        ip_version = netaddr.IPAddress(pools[0][1]).version
+        index = _allocation_indexes.build(
+            self.subnet_manager.neutron_id, pools, ip_version, allocations)
+        # The changes of the current transaction are only applied to the
+        # index once it has been committed
+        for subnet_id, allocated, ip_address in reversed(
+                _get_index_changes(session)):
+            if subnet_id != self.subnet_manager.neutron_id:
                 continue
+            if allocated:
+                index.release(ip_address)
+            else:
+                index.allocate(ip_address)
+        return index
 
+    @staticmethod
+    def _pick_candidate(index, prefer_next, excluded):
+        for pool_id, pool_index in index.pools:
             if prefer_next:
                 window = 1
             else:
                 # Compute a value for the selection window
-                window = min(av_set.size, 10)
-            ip_index = random.randint(1, window)
-            candidate_ips = list(itertools.islice(av_set, ip_index))
-            allocated_ip = candidate_ips[-1]
-            return str(allocated_ip), ip_pool.id
+                window = min(pool_index.size, 10)
+            candidate_ips = [
+                ip for ip in pool_index.candidates(window + len(excluded))
+                if ip not in excluded][:window]
+            if candidate_ips:
+                return random.choice(candidate_ips), pool_id
+        return None, None
+
+    def _generate_ip(self, session, prefer_next=False):
+        """Generate an IP address from the set of available addresses.
+
+        Free addresses are looked up in a per-process index of the free
+        ranges of each allocation pool, which is built from the database
+        the first time it is needed. The index is only a hint: every
+        candidate is checked against the database, and the index is rebuilt
+        when it looks stale or does not have any free address left. As
+        deallocations made by other server processes are not reflected in
+        the index, it is always rebuilt when the lowest free address is
+        requested.
+        """
+        pools = [(pool.id, pool.first_ip, pool.last_ip)
+                 for pool in self.subnet_manager.list_pools(session)]
+        if not pools:
+            raise ipam_exc.IpAddressGenerationFailure(
+                subnet_id=self.subnet_manager.neutron_id)
+
+        subnet_id = self.subnet_manager.neutron_id
+        # Addresses allocated by the current transaction are not in the
+        # index yet
+        excluded = set(ip_address for change_subnet_id, allocated, ip_address
+                       in _get_index_changes(session)
+                       if change_subnet_id == subnet_id and allocated)
+        index = None
+        if not prefer_next:
+            index = _allocation_indexes.get(subnet_id, pools)
+        fresh = index is None
+        if fresh:
+            index = self._build_allocation_index(session, pools)
+        misses = 0
+        while True:
+            ip_address, pool_id = self._pick_candidate(index, prefer_next,
+                                                       excluded)
+            if ip_address is None or (misses >= MAX_INDEX_MISSES and
+                                      not fresh):
+                if fresh:
+                    break
+                LOG.debug("Rebuilding allocation index for subnet %s",
+                          subnet_id)
+                index = self._build_allocation_index(session, pools)
+                fresh = True
+                misses = 0
+                continue
+            if self.subnet_manager.check_unique_allocation(session,
+                                                           ip_address):
+                return ip_address, pool_id
+            # The address has been allocated by another server process
+            index.allocate(ip_address)
+            misses += 1
 
-        raise ipam_exc.IpAddressGenerationFailure(
-                  subnet_id=self.subnet_manager.neutron_id)
+        raise ipam_exc.IpAddressGenerationFailure(subnet_id=subnet_id)
 
     def allocate(self, address_request):
         # NOTE(pbondar): Ipam driver is always called in context of already
@@ -204,6 +308,8 @@ class NeutronDbSubnet(ipam_base.Subnet):
         # The only defined status at this stage is 'ALLOCATED'.
         # More states will be available in the future - e.g.: RECYCLABLE
         self.subnet_manager.create_allocation(session, ip_address)
+        _get_index_changes(session).append(
+            (self.subnet_manager.neutron_id, True, ip_address))
         return ip_address
 
     def deallocate(self, address):
@@ -213,6 +319,8 @@ class NeutronDbSubnet(ipam_base.Subnet):
         # an IPRequest entry.
         session = self._context.session
 
+        _get_index_changes(session).append(
+            (self.subnet_manager.neutron_id, False, address))
         count = self.subnet_manager.delete_allocation(
             session, address)
         # count can hardly be greater than 1, but it can be 0...
@@ -237,6 +345,7 @@ class NeutronDbSubnet(ipam_base.Subnet):
             return
         self.subnet_manager.delete_allocation_pools(session)
         self.create_allocation_pools(self.subnet_manager, session, pools, cidr)
+        _allocation_indexes.invalidate(self.subnet_manager.neutron_id)
         self._pools = pools
 
     def get_details(self):
@@ -309,6 +418,7 @@ class NeutronDbPool(subnet_alloc.SubnetAllocator):
         """
         count = ipam_db_api.IpamSubnetManager.delete(self._context.session,
                                                      subnet_id)
+        _allocation_indexes.invalidate(subnet_id)
         if count < 1:
             LOG.error(_LE("IPAM subnet referenced to "
                           "Neutron subnet %s does not exist"),
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 from debtcollector import moves
 from neutron_lib import constants as n_const
 from oslo_db import exception as db_exc
@@ -120,6 +122,22 @@ def get_binding_levels(session, port_id, host):
         return result
 
 
+def get_binding_levels_for_ports(session, port_ids):
+    """Return binding levels of several ports grouped by (port_id, host).
+
+    The levels of each port and host are sorted by level.
+    """
+    result = {}
+    if not port_ids:
+        return result
+    query = (session.query(models.PortBindingLevel).
+             filter(models.PortBindingLevel.port_id.in_(port_ids)).
+             order_by(models.PortBindingLevel.level))
+    for level in query:
+        result.setdefault((level.port_id, level.host), []).append(level)
+    return result
+
+
 def clear_binding_levels(session, port_id, host):
     if host:
         (session.query(models.PortBindingLevel).
@@ -179,6 +197,50 @@ def get_port(session, port_id):
             return
 
 
+def partial_port_ids_to_full_ids(session, partial_ids):
+    """Map partial port IDs to full IDs.
+
+    Full UUIDs are matched with a single IN statement, while partial UUIDs
+    are matched with startswith in queries of at most MAX_PORTS_PER_QUERY
+    criteria. Partial IDs which do not match exactly one port are not
+    included in the result.
+    """
+    partial_uuids = [port_id for port_id in set(partial_ids)
+                     if not uuidutils.is_uuid_like(port_id)]
+    full_uuids = set(partial_ids) - set(partial_uuids)
+    result = {}
+    if full_uuids:
+        query = session.query(models_v2.Port.id).filter(
+            models_v2.Port.id.in_(full_uuids))
+        result.update((port_id, port_id) for (port_id, ) in query)
+    for i in range(0, len(partial_uuids), MAX_PORTS_PER_QUERY):
+        chunk = partial_uuids[i:i + MAX_PORTS_PER_QUERY]
+        query = session.query(models_v2.Port.id).filter(
+            or_(*[models_v2.Port.id.startswith(port_id)
+                  for port_id in chunk]))
+        matches = collections.defaultdict(list)
+        for (port_id, ) in query:
+            for partial_id in chunk:
+                if port_id.startswith(partial_id):
+                    matches[partial_id].append(port_id)
+        for partial_id, port_ids in matches.items():
+            if len(port_ids) > 1:
+                LOG.error(_LE("Multiple ports have port_id starting "
+                              "with %s"), partial_id)
+                continue
+            result[partial_id] = port_ids[0]
+    return result
+
+
+def get_port_db_objects(session, port_ids):
+    """Return port records, with eagerly loaded attributes, keyed by ID."""
+    if not port_ids:
+        return {}
+    query = session.query(models_v2.Port).filter(
+        models_v2.Port.id.in_(port_ids))
+    return {port.id: port for port in query}
+
+
 def get_port_from_device_mac(context, device_mac):
     LOG.debug("get_port_from_device_mac() called for mac %s", device_mac)
     qry = context.session.query(models_v2.Port).filter_by(
@@ -288,6 +350,18 @@ def get_distributed_port_binding_by_host(session, port_id, host):
     return binding
 
 
+def get_distributed_port_bindings_by_host(session, port_ids, host):
+    """Return distributed bindings of several ports on a host by port ID."""
+    if not port_ids:
+        return {}
+    with session.begin(subtransactions=True):
+        bindings = (session.query(models.DistributedPortBinding).
+                    filter(models.DistributedPortBinding.port_id.in_(
+                           port_ids),
+                           models.DistributedPortBinding.host == host).all())
+    return {binding.port_id: binding for binding in bindings}
+
+
 def get_distributed_port_bindings(session, port_id):
     with session.begin(subtransactions=True):
         bindings = (session.query(models.DistributedPortBinding).
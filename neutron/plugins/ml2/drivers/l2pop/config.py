@@ -22,6 +22,11 @@ l2_population_options = [
     cfg.IntOpt('agent_boot_time', default=180,
                help=_('Delay within which agent is expected to update '
                       'existing ports whent it restarts')),
+    cfg.IntOpt('fdb_batch_interval', default=0, min=0,
+               help=_('Number of seconds during which the FDB notifications '
+                      'are queued and coalesced per network before being '
+                      'sent to the agents. The notifications are sent right '
+                      'away if it is 0.')),
 ]
 
 cfg.CONF.register_opts(l2_population_options, "l2pop")
@@ -13,13 +13,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 from neutron_lib import constants as const
 from oslo_config import cfg
 from oslo_log import log as logging
 
-from neutron._i18n import _LW
+from neutron._i18n import _LE, _LW
 from neutron import context as n_context
 from neutron.db import api as db_api
+from neutron.notifiers import batch_notifier
 from neutron.plugins.ml2.common import exceptions as ml2_exc
 from neutron.plugins.ml2 import driver_api as api
 from neutron.plugins.ml2.drivers.l2pop import config  # noqa
@@ -34,10 +37,14 @@ class L2populationMechanismDriver(api.MechanismDriver):
     def __init__(self):
         super(L2populationMechanismDriver, self).__init__()
         self.L2populationAgentNotify = l2pop_rpc.L2populationAgentNotifyAPI()
+        self._fdb_notifier = None
 
     def initialize(self):
         LOG.debug("Experimental L2 population driver")
         self.rpc_ctx = n_context.get_admin_context_without_session()
+        if cfg.CONF.l2pop.fdb_batch_interval > 0:
+            self._fdb_notifier = batch_notifier.BatchNotifier(
+                cfg.CONF.l2pop.fdb_batch_interval, self._send_fdb_events)
 
     def _get_port_fdb_entries(self, port):
         # the port might be concurrently deleted
@@ -53,8 +60,7 @@ class L2populationMechanismDriver(api.MechanismDriver):
         agent_host = context.host
         fdb_entries = self._get_agent_fdb(context.bottom_bound_segment,
                                           port, agent_host)
-        self.L2populationAgentNotify.remove_fdb_entries(self.rpc_ctx,
-            fdb_entries)
+        self._notify_fdb_entries('remove_fdb_entries', fdb_entries)
 
     def filter_hosts_with_segment_access(
             self, context, segments, candidate_hosts, agent_getter):
@@ -103,8 +109,8 @@ class L2populationMechanismDriver(api.MechanismDriver):
         if port_mac_ip:
             ports['after'] = port_mac_ip
 
-        self.L2populationAgentNotify.update_fdb_entries(
-            self.rpc_ctx, {'chg_ip': upd_fdb_entries})
+        self._notify_fdb_entries('update_fdb_entries',
+                                 {'chg_ip': upd_fdb_entries})
 
         return True
 
@@ -132,8 +138,7 @@ class L2populationMechanismDriver(api.MechanismDriver):
                 agent_host = context.host
                 fdb_entries = self._get_agent_fdb(
                         context.bottom_bound_segment, port, agent_host)
-                self.L2populationAgentNotify.remove_fdb_entries(
-                    self.rpc_ctx, fdb_entries)
+                self._notify_fdb_entries('remove_fdb_entries', fdb_entries)
         elif (context.host != context.original_host
               and context.original_status == const.PORT_STATUS_ACTIVE
               and context.status == const.PORT_STATUS_DOWN):
@@ -142,16 +147,14 @@ class L2populationMechanismDriver(api.MechanismDriver):
             fdb_entries = self._get_agent_fdb(
                 context.original_bottom_bound_segment,
                 orig, context.original_host)
-            self.L2populationAgentNotify.remove_fdb_entries(
-                self.rpc_ctx, fdb_entries)
+            self._notify_fdb_entries('remove_fdb_entries', fdb_entries)
         elif context.status != context.original_status:
             if context.status == const.PORT_STATUS_ACTIVE:
                 self._update_port_up(context)
             elif context.status == const.PORT_STATUS_DOWN:
                 fdb_entries = self._get_agent_fdb(
                     context.bottom_bound_segment, port, context.host)
-                self.L2populationAgentNotify.remove_fdb_entries(
-                    self.rpc_ctx, fdb_entries)
+                self._notify_fdb_entries('remove_fdb_entries', fdb_entries)
 
     def _validate_segment(self, segment, port_id, agent):
         if not segment:
@@ -167,32 +170,49 @@ class L2populationMechanismDriver(api.MechanismDriver):
 
         return True
 
-    def _create_agent_fdb(self, session, agent, segment, network_id):
-        agent_fdb_entries = {network_id:
-                             {'segment_id': segment['segmentation_id'],
-                              'network_type': segment['network_type'],
-                              'ports': {}}}
+    def _get_network_fdb(self, session, network_id):
+        """Return the active ports of a network and their FDB entries
+
+        The FDB entries of the non distributed ports are indexed by the IP
+        address of their agent.
+        """
         tunnel_network_ports = (
             l2pop_db.get_distributed_active_network_ports(session, network_id))
         fdb_network_ports = (
             l2pop_db.get_nondistributed_active_network_ports(session,
                                                              network_id))
+        agent_ips = {}
+        fdb_entries_by_ip = collections.defaultdict(list)
+        for binding, agent in fdb_network_ports:
+            if agent not in agent_ips:
+                agent_ips[agent] = l2pop_db.get_agent_ip(agent)
+            fdb_entries_by_ip[agent_ips[agent]].extend(
+                self._get_port_fdb_entries(binding.port))
+        return fdb_network_ports + tunnel_network_ports, fdb_entries_by_ip
+
+    def _create_agent_fdb(self, session, agent, segment, network_id,
+                          network_fdb=None):
+        agent_fdb_entries = {network_id:
+                             {'segment_id': segment['segmentation_id'],
+                              'network_type': segment['network_type'],
+                              'ports': {}}}
+        if network_fdb is None:
+            network_fdb = self._get_network_fdb(session, network_id)
+        network_ports, fdb_entries_by_ip = network_fdb
         ports = agent_fdb_entries[network_id]['ports']
-        ports.update(self._get_tunnels(
-            fdb_network_ports + tunnel_network_ports,
-            agent.host))
+        ports.update(self._get_tunnels(network_ports, agent.host))
         for agent_ip, fdbs in ports.items():
-            for binding, agent in fdb_network_ports:
-                if l2pop_db.get_agent_ip(agent) == agent_ip:
-                    fdbs.extend(self._get_port_fdb_entries(binding.port))
+            fdbs.extend(fdb_entries_by_ip.get(agent_ip, []))
 
         return agent_fdb_entries
 
     def _get_tunnels(self, tunnel_network_ports, exclude_host):
         agents = {}
+        hosts = set()
         for __, agent in tunnel_network_ports:
-            if agent.host == exclude_host:
+            if agent.host == exclude_host or agent.host in hosts:
                 continue
+            hosts.add(agent.host)
 
             ip = l2pop_db.get_agent_ip(agent)
             if not ip:
@@ -232,24 +252,127 @@ class L2populationMechanismDriver(api.MechanismDriver):
                                        cfg.CONF.l2pop.agent_boot_time):
             # First port activated on current agent in this network,
             # we have to provide it with the whole list of fdb entries
-            agent_fdb_entries = self._create_agent_fdb(session,
-                                                       agent,
-                                                       segment,
-                                                       network_id)
+            if self._fdb_notifier:
+                self._fdb_notifier.queue_event(
+                    ('agent_fdb', agent, segment, network_id))
+            else:
+                self._send_agent_fdb(session, agent, segment, network_id)
 
             # And notify other agents to add flooding entry
             other_fdb_ports[agent_ip].append(const.FLOODING_ENTRY)
 
-            if agent_fdb_entries[network_id]['ports'].keys():
-                self.L2populationAgentNotify.add_fdb_entries(
-                    self.rpc_ctx, agent_fdb_entries, agent_host)
-
         # Notify other agents to add fdb rule for current port
         if port['device_owner'] != const.DEVICE_OWNER_DVR_INTERFACE:
             other_fdb_ports[agent_ip] += self._get_port_fdb_entries(port)
 
-        self.L2populationAgentNotify.add_fdb_entries(self.rpc_ctx,
-                                                     other_fdb_entries)
+        self._notify_fdb_entries('add_fdb_entries', other_fdb_entries)
+
+    def _send_agent_fdb(self, session, agent, segment, network_id,
+                        network_fdb=None):
+        agent_fdb_entries = self._create_agent_fdb(session, agent, segment,
+                                                   network_id, network_fdb)
+        if agent_fdb_entries[network_id]['ports'].keys():
+            self.L2populationAgentNotify.add_fdb_entries(
+                self.rpc_ctx, agent_fdb_entries, agent.host)
+
+    def _notify_fdb_entries(self, method, fdb_entries):
+        """Fanout FDB entries to the agents, or queue them if batching"""
+        if not fdb_entries:
+            return
+        if self._fdb_notifier:
+            self._fdb_notifier.queue_event((method, fdb_entries))
+        else:
+            getattr(self.L2populationAgentNotify, method)(self.rpc_ctx,
+                                                          fdb_entries)
+
+    def _send_fdb_events(self, events):
+        """Send the FDB notifications queued during a batch interval
+
+        The additions and removals of FDB entries are coalesced, the last
+        event of an entry superseding the previous ones, and sent in a
+        single cast per network and method. The FDB of the agents
+        activating their first port on a network is built once per network,
+        with its entries at the time of the batch. A failure only affects
+        the notifications of its network, or of its agent.
+        """
+        fdb_changes = collections.OrderedDict()
+        agent_fdb_requests = collections.OrderedDict()
+        for event in events:
+            if event[0] == 'agent_fdb':
+                __, agent, segment, network_id = event
+                agent_fdb_requests[(agent.host, network_id)] = (
+                    agent, segment, network_id)
+            elif event[0] == 'update_fdb_entries':
+                # IP address changes aren't coalesced, the changes queued
+                # before are sent first to keep them ordered
+                self._send_fdb_changes(fdb_changes)
+                fdb_changes.clear()
+                try:
+                    self.L2populationAgentNotify.update_fdb_entries(
+                        self.rpc_ctx, event[1])
+                except Exception:
+                    LOG.exception(_LE("Failed to send the FDB updates of "
+                                      "networks %s"),
+                                  list(event[1].get('chg_ip', {})))
+            else:
+                self._merge_fdb_changes(fdb_changes, *event)
+        self._send_fdb_changes(fdb_changes)
+
+        if not agent_fdb_requests:
+            return
+        session = db_api.get_session()
+        network_fdbs = {}
+        for agent, segment, network_id in agent_fdb_requests.values():
+            if network_id not in network_fdbs:
+                try:
+                    network_fdbs[network_id] = self._get_network_fdb(
+                        session, network_id)
+                except Exception:
+                    LOG.exception(_LE("Failed to get the FDB entries of "
+                                      "network %s"), network_id)
+                    network_fdbs[network_id] = None
+            if network_fdbs[network_id] is None:
+                continue
+            try:
+                self._send_agent_fdb(session, agent, segment, network_id,
+                                     network_fdbs[network_id])
+            except Exception:
+                LOG.exception(_LE("Failed to send the FDB entries of "
+                                  "network %(network)s to agent %(host)s"),
+                              {'network': network_id, 'host': agent.host})
+
+    @staticmethod
+    def _merge_fdb_changes(fdb_changes, method, fdb_entries):
+        for network_id, network_fdb in fdb_entries.items():
+            if network_id not in fdb_changes:
+                fdb_changes[network_id] = (
+                    network_fdb['segment_id'], network_fdb['network_type'],
+                    collections.OrderedDict())
+            changes = fdb_changes[network_id][2]
+            for agent_ip, entries in network_fdb['ports'].items():
+                for entry in entries:
+                    key = (agent_ip, tuple(entry))
+                    changes.pop(key, None)
+                    changes[key] = (method, entry)
+
+    def _send_fdb_changes(self, fdb_changes):
+        for network_id, (segment_id, network_type, changes) in (
+                fdb_changes.items()):
+            fdb_entries = {'add_fdb_entries': {}, 'remove_fdb_entries': {}}
+            for (agent_ip, __), (method, entry) in changes.items():
+                network_fdb = fdb_entries[method].setdefault(
+                    network_id, {'segment_id': segment_id,
+                                 'network_type': network_type,
+                                 'ports': {}})
+                network_fdb['ports'].setdefault(agent_ip, []).append(entry)
+            try:
+                for method in ('remove_fdb_entries', 'add_fdb_entries'):
+                    if fdb_entries[method]:
+                        getattr(self.L2populationAgentNotify, method)(
+                            self.rpc_ctx, fdb_entries[method])
+            except Exception:
+                LOG.exception(_LE("Failed to send the FDB changes of "
+                                  "network %s"), network_id)
 
     def _get_agent_fdb(self, segment, port, agent_host):
         if not agent_host:
@@ -108,6 +108,16 @@ agent_opts = [
                default=constants.DEFAULT_OVSDBMON_RESPAWN,
                help=_("The number of seconds to wait before respawning the "
                       "ovsdb monitor after losing communication with it.")),
+    cfg.StrOpt('ovsdb_monitor_interface',
+               default=constants.OVSDB_MONITOR_OVSDB_CLIENT,
+               choices=[constants.OVSDB_MONITOR_OVSDB_CLIENT,
+                        constants.OVSDB_MONITOR_NATIVE],
+               help=_("The interface used to monitor ovsdb for interface "
+                      "changes when minimize_polling is enabled. "
+                      "'ovsdb-client' spawns an 'ovsdb-client monitor' "
+                      "process, 'native' gets the changes pushed by the "
+                      "connection of the native ovsdb_interface, defined by "
+                      "ovsdb_connection, and requires ovs >= 2.6.")),
     cfg.ListOpt('tunnel_types', default=DEFAULT_TUNNEL_TYPES,
                 help=_("Network types supported by the agent "
                        "(gre and/or vxlan).")),
@@ -104,6 +104,10 @@ TUN_TABLE = {p_const.TYPE_GRE: GRE_TUN_TO_LV,
 # The default respawn interval for the ovsdb monitor
 DEFAULT_OVSDBMON_RESPAWN = 30
 
+# Interfaces used to monitor ovsdb for interface changes
+OVSDB_MONITOR_OVSDB_CLIENT = 'ovsdb-client'
+OVSDB_MONITOR_NATIVE = 'native'
+
 # Represent invalid OF Port
 OFPORT_INVALID = -1
 
@@ -142,6 +142,11 @@ class OpenFlowSwitchMixin(object):
                         {'cookie': c})
             self.delete_flows(cookie=c, cookie_mask=((1 << 64) - 1))
 
+    def start_flows_reconciliation(self):
+        # NOTE: the flows are installed with Ryu rather than ovs-ofctl,
+        # cleanup_flows only relies on the cookies to find the stale ones.
+        pass
+
     def install_goto_next(self, table_id):
         self.install_goto(table_id=table_id, dest_table_id=table_id + 1)
 
@@ -18,7 +18,7 @@ import re
 
 from oslo_log import log as logging
 
-from neutron._i18n import _LW
+from neutron._i18n import _LI, _LW
 
 LOG = logging.getLogger(__name__)
 
@@ -104,8 +104,17 @@ class OpenFlowSwitchMixin(object):
 
     def cleanup_flows(self):
         flows = self.dump_flows_all_tables()
+        stale = set()
         for flow, cookie, table in self._filter_flows(flows):
             # deleting a stale flow should be rare.
             # it might deserve some attention
             LOG.warning(_LW("Deleting flow %s"), flow)
-            self.delete_flows(cookie=cookie + '/-1', table=table)
+            stale.add((cookie, table))
+        if stale:
+            # NOTE: delete all the stale flows with a single ovs-ofctl call
+            self.do_action_flows('del', [
+                {'cookie': cookie + '/-1', 'table': table}
+                for cookie, table in sorted(stale)])
+        LOG.info(_LI("Deleted the stale flows of bridge %(br)s: %(count)d "
+                     "cookie and table pairs"),
+                 {'br': self.br_name, 'count': len(stale)})
@@ -178,6 +178,9 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
         # Keep track of int_br's device count for use by _report_state()
         self.int_br_device_count = 0
 
+        # Reconcile the flows installed on the bridges by a previous run
+        # with the ones requested until the stale flows are cleaned
+        self.reconcile_flows = not self.conf.AGENT.drop_flows_on_start
         self.int_br = self.br_int_cls(ovs_conf.integration_bridge)
         self.setup_integration_br()
         # Stores port update notifications for processing in main rpc loop
@@ -201,6 +204,7 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
         self.ovsdb_monitor_respawn_interval = (
             agent_conf.ovsdb_monitor_respawn_interval or
             constants.DEFAULT_OVSDBMON_RESPAWN)
+        self.ovsdb_monitor_interface = agent_conf.ovsdb_monitor_interface
         self.local_ip = ovs_conf.local_ip
         self.tunnel_count = 0
         self.vxlan_udp_port = agent_conf.vxlan_udp_port
@@ -1004,6 +1008,8 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
             # while flows are missing.
             self.int_br.delete_port(self.conf.OVS.int_peer_patch_port)
             self.int_br.delete_flows()
+        elif self.reconcile_flows:
+            self.int_br.start_flows_reconciliation()
         self.int_br.setup_default_table()
 
     def setup_ancillary_bridges(self, integ_br, tun_br):
@@ -1066,6 +1072,8 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
             sys.exit(1)
         if self.conf.AGENT.drop_flows_on_start:
             self.tun_br.delete_flows()
+        elif self.reconcile_flows:
+            self.tun_br.start_flows_reconciliation()
 
     def setup_tunnel_br_flows(self):
         '''Setup the tunnel bridge.
@@ -1109,6 +1117,8 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
             br.setup_controllers(self.conf)
             if cfg.CONF.AGENT.drop_flows_on_start:
                 br.delete_flows()
+            elif self.reconcile_flows:
+                br.start_flows_reconciliation()
             br.setup_default_table()
             self.phys_brs[physical_network] = br
 
@@ -1807,7 +1817,13 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
             bridges.append(self.tun_br)
         for bridge in bridges:
             LOG.info(_LI("Cleaning stale %s flows"), bridge.br_name)
+            if not bridge.finish_flows_reconciliation():
+                LOG.warning(_LW("Not cleaning the stale flows of bridge %s, "
+                                "its flows could not be reconciled"),
+                            bridge.br_name)
+                continue
             bridge.cleanup_flows()
+        self.reconcile_flows = False
 
     def process_port_info(self, start, polling_manager, sync, ovs_restarted,
                        ports, ancillary_ports, updated_ports_copy,
@@ -2082,7 +2098,8 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
             signal.signal(signal.SIGHUP, self._handle_sighup)
         with polling.get_polling_manager(
             self.minimize_polling,
-            self.ovsdb_monitor_respawn_interval) as pm:
+            self.ovsdb_monitor_respawn_interval,
+            ovsdb_monitor_interface=self.ovsdb_monitor_interface) as pm:
 
             self.rpc_loop(polling_manager=pm)
 
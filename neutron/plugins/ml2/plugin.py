@@ -1655,6 +1655,101 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
 
         return self._bind_port_if_needed(port_context)
 
+    def get_bound_ports_contexts(self, plugin_context, devices, host=None,
+                                 cached_networks=None):
+        """Return bound port contexts for a list of agent devices.
+
+        Ports, bindings, binding levels and networks for all the devices
+        are fetched with a fixed number of queries instead of a few queries
+        per device. Devices whose port or binding can not be found are
+        mapped to None.
+
+        :returns: a tuple of the dict of bound port contexts by device, and
+            the list of devices whose context could not be built or bound.
+        """
+        cached_networks = {} if cached_networks is None else cached_networks
+        result = {}
+        failed_devices = []
+        session = plugin_context.session
+        with session.begin(subtransactions=True):
+            dev_to_port_ids = {}
+            for device in devices:
+                try:
+                    dev_to_port_ids[device] = self._device_to_port_id(
+                        plugin_context, device)
+                except Exception:
+                    LOG.exception(_LE("Failed to get port id of device %s"),
+                                  device)
+                    failed_devices.append(device)
+            partial_to_full_ids = db.partial_port_ids_to_full_ids(
+                session, list(set(dev_to_port_ids.values())))
+            port_dbs = db.get_port_db_objects(
+                session, list(set(partial_to_full_ids.values())))
+            network_ids = set(port_db.network_id
+                              for port_db in port_dbs.values())
+            missing_network_ids = network_ids - set(cached_networks)
+            if missing_network_ids:
+                for network in self.get_networks(
+                        plugin_context,
+                        filters={'id': list(missing_network_ids)}):
+                    cached_networks[network['id']] = network
+            levels = db.get_binding_levels_for_ports(session, list(port_dbs))
+            dvr_bindings = db.get_distributed_port_bindings_by_host(
+                session,
+                [port_id for port_id, port_db in port_dbs.items() if
+                 port_db.device_owner == const.DEVICE_OWNER_DVR_INTERFACE],
+                host)
+
+            for device, port_id in dev_to_port_ids.items():
+                result[device] = None
+                port_db = port_dbs.get(partial_to_full_ids.get(port_id))
+                if not port_db:
+                    LOG.info(_LI("No ports have port_id starting with %s"),
+                             port_id)
+                    continue
+                network = cached_networks.get(port_db.network_id)
+                if not network:
+                    continue
+                if port_db.device_owner == const.DEVICE_OWNER_DVR_INTERFACE:
+                    binding = dvr_bindings.get(port_db.id)
+                    if not binding:
+                        LOG.error(_LE("Binding info for DVR port %s not "
+                                      "found"), port_id)
+                        continue
+                    binding_host = host
+                else:
+                    binding = port_db.port_binding
+                    if not binding:
+                        LOG.info(_LI("Binding info for port %s was not "
+                                     "found, it might have been deleted "
+                                     "already."), port_id)
+                        continue
+                    binding_host = binding.host
+                try:
+                    port = self._make_port_dict(port_db)
+                    result[device] = driver_context.PortContext(
+                        self, plugin_context, port, network, binding,
+                        levels.get((port_db.id, binding_host), []))
+                except Exception:
+                    LOG.exception(_LE("Failed to get port context of "
+                                      "device %s"), device)
+                    del result[device]
+                    failed_devices.append(device)
+
+        bound_contexts = {}
+        for device, port_context in result.items():
+            if not port_context:
+                bound_contexts[device] = None
+                continue
+            try:
+                bound_contexts[device] = self._bind_port_if_needed(
+                    port_context)
+            except Exception:
+                LOG.exception(_LE("Failed to bind port of device %s"),
+                              device)
+                failed_devices.append(device)
+        return bound_contexts, failed_devices
+
     @utils.transaction_guard
     @db_api.retry_db_errors
     def update_port_status(self, context, port_id, status, host=None,
@@ -1717,23 +1812,81 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                 self.mechanism_manager.update_port_precommit(mech_context)
 
         if updated:
-            self.mechanism_manager.update_port_postcommit(mech_context)
-            kwargs = {'context': context, 'port': mech_context.current,
-                      'original_port': original_port}
-            if status == const.PORT_STATUS_ACTIVE:
-                # NOTE(kevinbenton): this kwarg was carried over from
-                # the RPC handler that used to call this. it's not clear
-                # who uses it so maybe it can be removed. added in commit
-                # 3f3874717c07e2b469ea6c6fd52bcb4da7b380c7
-                kwargs['update_device_up'] = True
-            registry.notify(resources.PORT, events.AFTER_UPDATE, self,
-                            **kwargs)
+            self._after_port_status_update(context, mech_context,
+                                           original_port, status)
 
         if port['device_owner'] == const.DEVICE_OWNER_DVR_INTERFACE:
             db.delete_distributed_port_binding_if_stale(session, binding)
 
         return port['id']
 
+    def _after_port_status_update(self, context, mech_context, original_port,
+                                  status):
+        self.mechanism_manager.update_port_postcommit(mech_context)
+        kwargs = {'context': context, 'port': mech_context.current,
+                  'original_port': original_port}
+        if status == const.PORT_STATUS_ACTIVE:
+            # NOTE(kevinbenton): this kwarg was carried over from
+            # the RPC handler that used to call this. it's not clear
+            # who uses it so maybe it can be removed. added in commit
+            # 3f3874717c07e2b469ea6c6fd52bcb4da7b380c7
+            kwargs['update_device_up'] = True
+        registry.notify(resources.PORT, events.AFTER_UPDATE, self,
+                        **kwargs)
+
+    @utils.transaction_guard
+    @db_api.retry_db_errors
+    def update_port_statuses(self, context, port_id_to_status, host=None,
+                             cached_networks=None):
+        """Update the status of several ports.
+
+        Non distributed ports are loaded with their binding levels and
+        updated in a single transaction; distributed router ports, whose
+        status depends on the host, go through update_port_status.
+        Returns the IDs of the ports which have been found.
+        """
+        cached_networks = {} if cached_networks is None else cached_networks
+        updated = []
+        distributed_port_ids = []
+        session = context.session
+        with session.begin(subtransactions=True):
+            port_dbs = db.get_port_db_objects(session,
+                                              list(port_id_to_status))
+            levels = db.get_binding_levels_for_ports(session, list(port_dbs))
+            missing_network_ids = set(
+                port_db.network_id for port_db in port_dbs.values()
+            ) - set(cached_networks)
+            if missing_network_ids:
+                for network in self.get_networks(
+                        context, filters={'id': list(missing_network_ids)}):
+                    cached_networks[network['id']] = network
+            for port_id, port in port_dbs.items():
+                status = port_id_to_status[port_id]
+                if port.device_owner == const.DEVICE_OWNER_DVR_INTERFACE:
+                    distributed_port_ids.append(port_id)
+                    continue
+                if port.status == status or not port.port_binding:
+                    continue
+                original_port = self._make_port_dict(port)
+                port.status = status
+                updated_port = self._make_port_dict(port)
+                mech_context = driver_context.PortContext(
+                    self, context, updated_port,
+                    cached_networks[port.network_id], port.port_binding,
+                    levels.get((port.id, port.port_binding.host), []),
+                    original_port=original_port)
+                self.mechanism_manager.update_port_precommit(mech_context)
+                updated.append((mech_context, original_port, status))
+
+        for mech_context, original_port, status in updated:
+            self._after_port_status_update(context, mech_context,
+                                           original_port, status)
+        for port_id in distributed_port_ids:
+            self.update_port_status(
+                context, port_id, port_id_to_status[port_id], host,
+                cached_networks.get(port_dbs[port_id].network_id))
+        return list(port_dbs)
+
     def port_bound_to_host(self, context, port_id, host):
         if not host:
             return
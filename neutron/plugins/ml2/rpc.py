@@ -81,7 +81,6 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
                       {'device': device, 'agent_id': agent_id})
             return {'device': device}
 
-        segment = port_context.bottom_bound_segment
         port = port_context.current
         # caching information about networks for future use
         if cached_networks is not None:
@@ -89,6 +88,26 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
                 cached_networks[port['network_id']] = (
                     port_context.network.current)
 
+        entry, new_status = self._get_device_details(
+            agent_id, host, device, port_context)
+        if new_status:
+            plugin.update_port_status(rpc_context,
+                                      port_id,
+                                      new_status,
+                                      host,
+                                      port_context.network.current)
+        LOG.debug("Returning: %s", entry)
+        return entry
+
+    def _get_device_details(self, agent_id, host, device, port_context):
+        """Build the details of a device from its bound port context.
+
+        Returns the device details and the status the port should be set
+        to, or None if the port status does not need to change.
+        """
+        segment = port_context.bottom_bound_segment
+        port = port_context.current
+
         if not segment:
             LOG.warning(_LW("Device %(device)s requested by agent "
                             "%(agent_id)s on network %(network_id)s not "
@@ -97,17 +116,14 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
                          'agent_id': agent_id,
                          'network_id': port['network_id'],
                          'vif_type': port_context.vif_type})
-            return {'device': device}
+            return {'device': device}, None
 
+        new_status = None
         if (not host or host == port_context.host):
             new_status = (n_const.PORT_STATUS_BUILD if port['admin_state_up']
                           else n_const.PORT_STATUS_DOWN)
-            if port['status'] != new_status:
-                plugin.update_port_status(rpc_context,
-                                          port_id,
-                                          new_status,
-                                          host,
-                                          port_context.network.current)
+            if port['status'] == new_status:
+                new_status = None
 
         network_qos_policy_id = port_context.network._network.get(
             qos_consts.QOS_POLICY_ID)
@@ -128,8 +144,7 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
                  'profile': port[portbindings.PROFILE]}
         if 'security_groups' in port:
             entry['security_groups'] = port['security_groups']
-        LOG.debug("Returning: %s", entry)
-        return entry
+        return entry, new_status
 
     def get_devices_details_list(self, rpc_context, **kwargs):
         # cached networks used for reducing number of network db calls
@@ -147,20 +162,71 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
     def get_devices_details_list_and_failed_devices(self,
                                                     rpc_context,
                                                     **kwargs):
+        """Return the details of a list of devices.
+
+        Ports, bindings and networks of all the devices are fetched in
+        bulk, and the status of the ports is updated in bulk as well.
+        """
         devices = []
         failed_devices = []
+        devices_to_fetch = kwargs.pop('devices', [])
+        if not devices_to_fetch:
+            return {'devices': devices,
+                    'failed_devices': failed_devices}
+        agent_id = kwargs.get('agent_id')
+        host = kwargs.get('host')
+        LOG.debug("Details of devices %(devices)s requested by agent "
+                  "%(agent_id)s with host %(host)s",
+                  {'devices': devices_to_fetch, 'agent_id': agent_id,
+                   'host': host})
+        plugin = manager.NeutronManager.get_plugin()
         cached_networks = {}
-        for device in kwargs.pop('devices', []):
+        try:
+            bound_contexts, failed_devices = plugin.get_bound_ports_contexts(
+                rpc_context, devices_to_fetch, host, cached_networks)
+        except Exception:
+            LOG.exception(_LE("Failed to get details for devices %s"),
+                          devices_to_fetch)
+            return {'devices': devices,
+                    'failed_devices': list(devices_to_fetch)}
+
+        port_statuses = {}
+        status_devices = {}
+        for device in devices_to_fetch:
+            if device in failed_devices:
+                continue
+            port_context = bound_contexts.get(device)
+            if not port_context:
+                LOG.debug("Device %(device)s requested by agent "
+                          "%(agent_id)s not found in database",
+                          {'device': device, 'agent_id': agent_id})
+                devices.append({'device': device})
+                continue
             try:
-                devices.append(self.get_device_details(
-                               rpc_context,
-                               device=device,
-                               cached_networks=cached_networks,
-                               **kwargs))
+                entry, new_status = self._get_device_details(
+                    agent_id, host, device, port_context)
             except Exception:
                 LOG.error(_LE("Failed to get details for device %s"),
                           device)
                 failed_devices.append(device)
+                continue
+            if new_status:
+                port_id = port_context.current['id']
+                port_statuses[port_id] = new_status
+                status_devices[port_id] = device
+            devices.append(entry)
+
+        if port_statuses:
+            try:
+                plugin.update_port_statuses(rpc_context, port_statuses,
+                                            host, cached_networks)
+            except Exception:
+                LOG.exception(_LE("Failed to update status of devices %s"),
+                              list(status_devices.values()))
+                failed = set(status_devices.values())
+                devices = [entry for entry in devices
+                           if entry['device'] not in failed]
+                failed_devices.extend(failed)
 
         return {'devices': devices,
                 'failed_devices': failed_devices}
@@ -62,6 +62,9 @@ class SanityTestCaseRoot(functional_base.BaseSudoTestCase):
     def test_iproute2_vxlan_support_runs(self):
         checks.iproute2_vxlan_supported()
 
+    def test_ovs_ofctl_bundle_support_runs(self):
+        checks.ovs_ofctl_bundle_supported()
+
     def test_ovs_patch_support_runs(self):
         checks.patch_supported()
 
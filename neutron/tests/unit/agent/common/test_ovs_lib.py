@@ -311,6 +311,17 @@ class OVS_Lib_Test(base.BaseTestCase):
                           self.br.delete_flows,
                           **params)
 
+    def test_delete_flow_strict(self):
+        self.br.delete_flows(strict=True, table=3, priority=70, in_port=1)
+        self.execute.assert_has_calls([
+            self._ofctl_mock("del-flows", self.BR_NAME, '--strict', '-',
+                             process_input="table=3,priority=70,in_port=1")])
+
+    def test_do_action_flows_mixed_strict(self):
+        self.assertRaises(exceptions.InvalidInput,
+                          self.br.do_action_flows, 'del',
+                          [dict(in_port=1, strict=True), dict(in_port=2)])
+
     def test_dump_flows(self):
         table = 23
         nxst_flow = "NXST_FLOW reply (xid=0x4):"
@@ -369,6 +380,151 @@ class OVS_Lib_Test(base.BaseTestCase):
         self.assertEqual(0, sleep.call_count)
         self.assertEqual(1, self.execute.call_count)
 
+    def test_run_ofctl_check_error(self):
+        self.execute.side_effect = RuntimeError('garbage')
+        self.assertRaises(RuntimeError, self.br.run_ofctl,
+                          'add-flows', [], check_error=True)
+        self.assertEqual(1, self.execute.call_count)
+
+    def test_run_ofctl_check_error_success(self):
+        self.execute.return_value = 'output'
+        with mock.patch.object(ovs_lib, 'LOG') as log:
+            self.assertEqual('output', self.br.run_ofctl(
+                'add-flows', [], check_error=True))
+        self.assertEqual(1, self.execute.call_count)
+        self.assertFalse(log.error.called)
+
+    def test_run_ofctl_success_after_socket_error(self):
+        err = RuntimeError('failed to connect to socket')
+        self.execute.side_effect = [err, 'output']
+        with mock.patch('time.sleep'), \
+                mock.patch.object(ovs_lib, 'LOG') as log:
+            self.assertEqual('output', self.br.run_ofctl(
+                'add-flows', [], check_error=True))
+        self.assertEqual(2, self.execute.call_count)
+        self.assertFalse(log.error.called)
+
+    def test_run_ofctl_check_error_on_socket_error(self):
+        err = RuntimeError('failed to connect to socket')
+        self.execute.side_effect = err
+        with mock.patch('time.sleep') as sleep:
+            self.assertIsNone(self.br.run_ofctl('add-flows', []))
+            self.assertRaises(RuntimeError, self.br.run_ofctl,
+                              'add-flows', [], check_error=True)
+        self.assertEqual(20, sleep.call_count)
+
+    def test_do_action_flows_bundle(self):
+        with mock.patch.object(self.br, 'run_ofctl') as run_ofctl:
+            self.br.do_action_flows_bundle([
+                ('add', dict(actions='drop', cookie=1)),
+                ('del', dict(in_port=31)),
+                ('mod', dict(actions='drop', cookie=2))])
+        run_ofctl.assert_called_once_with(
+            'add-flows', ['--bundle', '-'],
+            'add hard_timeout=0,idle_timeout=0,priority=1,'
+            'cookie=1,actions=drop\n'
+            'delete in_port=31\n'
+            'modify cookie=2,actions=drop',
+            check_error=True)
+
+    def test_do_action_flows_bundle_strict(self):
+        with mock.patch.object(self.br, 'run_ofctl') as run_ofctl:
+            self.br.do_action_flows_bundle([
+                ('del', dict(in_port=31, priority=2, strict=True)),
+                ('mod', dict(in_port=32, priority=2, actions='drop',
+                             cookie=2, strict=True))])
+        run_ofctl.assert_called_once_with(
+            'add-flows', ['--bundle', '-'],
+            'delete_strict in_port=31,priority=2\n'
+            'modify_strict in_port=32,priority=2,cookie=2,actions=drop',
+            check_error=True)
+
+    def _start_flows_reconciliation(self):
+        self.execute.return_value = '\n'.join([
+            'NXST_FLOW reply (xid=0x4):',
+            ' cookie=0x1, duration=3.1s, table=0, n_packets=0, n_bytes=0, '
+            'idle_age=3, priority=2,in_port=1 actions=drop',
+            ' cookie=0x1, duration=3.1s, table=3, n_packets=0, n_bytes=0, '
+            'idle_age=3, priority=1,reg5=0x5,dl_dst=FA:16:3E:00:00:01 '
+            'actions=NORMAL'])
+        self.br.start_flows_reconciliation()
+        self.execute.reset_mock()
+
+    def test_flows_reconciliation_skips_installed_flows(self):
+        self._start_flows_reconciliation()
+        with mock.patch.object(self.br, 'run_ofctl') as run_ofctl:
+            self.br.add_flow(table=0, priority=2, in_port=1, actions='drop')
+            self.br.add_flow(table=3, priority=1, reg5=5,
+                             dl_dst='fa:16:3e:00:00:01', actions='normal')
+            self.assertFalse(run_ofctl.called)
+            self.br.add_flow(table=3, priority=1, reg5=5,
+                             dl_dst='fa:16:3e:00:00:01', actions='drop')
+            self.assertEqual(1, run_ofctl.call_count)
+
+    def test_flows_reconciliation_after_deletion(self):
+        self._start_flows_reconciliation()
+        with mock.patch.object(self.br, 'run_ofctl') as run_ofctl:
+            self.br.delete_flows(table=3, reg5=6)
+            self.br.delete_flows(table=0, in_port=1)
+            run_ofctl.reset_mock()
+            self.br.add_flow(table=3, priority=1, reg5=5,
+                             dl_dst='fa:16:3e:00:00:01', actions='normal')
+            self.assertFalse(run_ofctl.called)
+            self.br.add_flow(table=0, priority=2, in_port=1, actions='drop')
+            self.assertEqual(1, run_ofctl.call_count)
+
+    def test_finish_flows_reconciliation(self):
+        self._start_flows_reconciliation()
+        self.br.set_agent_uuid_stamp(1234)
+        self.br.add_flow(table=0, priority=2, in_port=1, actions='drop')
+        self.assertTrue(self.br.finish_flows_reconciliation())
+        self.execute.assert_has_calls([
+            mock.call(['ovs-ofctl', 'dump-flows', self.BR_NAME],
+                      run_as_root=True, process_input=None),
+            mock.call(['ovs-ofctl', 'mod-flows', self.BR_NAME,
+                       '--strict', '-'], run_as_root=True,
+                      process_input='table=0,cookie=1234,priority=2,'
+                                    'in_port=1,actions=drop')])
+        # flows are sent again once the reconciliation is finished
+        self.execute.reset_mock()
+        self.br.add_flow(table=0, priority=2, in_port=1, actions='drop')
+        self.assertEqual(1, self.execute.call_count)
+
+    def _finish_flows_reconciliation(self, *results):
+        self._start_flows_reconciliation()
+        dumped_flows = self.execute.return_value
+        self.br.set_agent_uuid_stamp(1234)
+        self.br.add_flow(table=0, priority=2, in_port=1, actions='drop')
+        self.execute.side_effect = (dumped_flows,) + results
+        return self.br.finish_flows_reconciliation()
+
+    def test_finish_flows_reconciliation_stamp_failure(self):
+        self.assertTrue(self._finish_flows_reconciliation(RuntimeError(),
+                                                          ''))
+        self.assertEqual(3, self.execute.call_count)
+        args, kwargs = self.execute.call_args
+        self.assertEqual(['ovs-ofctl', 'add-flows', self.BR_NAME, '-'],
+                         args[0])
+        self.assertIn('cookie=1234', kwargs['process_input'])
+        self.assertIn('in_port=1', kwargs['process_input'])
+
+    def test_finish_flows_reconciliation_reinstall_failure(self):
+        self.assertFalse(self._finish_flows_reconciliation(RuntimeError(),
+                                                           RuntimeError()))
+        self.assertEqual(3, self.execute.call_count)
+
+    def test_finish_flows_reconciliation_not_started(self):
+        self.assertTrue(self.br.finish_flows_reconciliation())
+        self.assertFalse(self.execute.called)
+
+    def test_start_flows_reconciliation_dump_failure(self):
+        self.execute.side_effect = RuntimeError()
+        self.br.start_flows_reconciliation()
+        self.execute.side_effect = None
+        self.execute.reset_mock()
+        self.br.add_flow(table=0, priority=2, in_port=1, actions='drop')
+        self.assertEqual(1, self.execute.call_count)
+
     def test_add_tunnel_port(self):
         pname = "tap99"
         local_ip = "1.1.1.1"
@@ -846,6 +1002,16 @@ class TestDeferredOVSBridge(base.BaseTestCase):
             self._verify_mock_call([])
         self._verify_mock_call(expected_calls)
 
+    def test_apply_with_check_error(self):
+        deferred_br = ovs_lib.DeferredOVSBridge(self.br)
+        deferred_br.add_flow(**self.add_flow_dict1)
+        deferred_br.delete_flows(**self.del_flow_dict1)
+        deferred_br.apply_flows(check_error=True)
+        self._verify_mock_call([
+            mock.call('add', [self.add_flow_dict1], check_error=True),
+            mock.call('del', [self.del_flow_dict1], check_error=True),
+        ])
+
     def test_apply_on_exit_with_errors(self):
         try:
             with ovs_lib.DeferredOVSBridge(self.br) as deferred_br:
@@ -891,6 +1057,20 @@ class TestDeferredOVSBridge(base.BaseTestCase):
             deferred_br.mod_flow(**self.mod_flow_dict2)
         self._verify_mock_call(expected_calls)
 
+    def test_apply_groups_strict_flows(self):
+        del_strict_flow_dict = dict(in_port=33, priority=2, strict=True)
+        expected_calls = [
+            mock.call('del', [self.del_flow_dict1]),
+            mock.call('del', [del_strict_flow_dict]),
+            mock.call('del', [self.del_flow_dict2]),
+        ]
+
+        with ovs_lib.DeferredOVSBridge(self.br) as deferred_br:
+            deferred_br.delete_flows(**self.del_flow_dict1)
+            deferred_br.delete_flows(**del_strict_flow_dict)
+            deferred_br.delete_flows(**self.del_flow_dict2)
+        self._verify_mock_call(expected_calls)
+
     def test_apply_full_ordered(self):
         expected_calls = [
             mock.call('add', [self.add_flow_dict1]),
@@ -910,6 +1090,27 @@ class TestDeferredOVSBridge(base.BaseTestCase):
             deferred_br.mod_flow(**self.mod_flow_dict2)
         self._verify_mock_call(expected_calls)
 
+    def test_apply_bundle(self):
+        with ovs_lib.DeferredOVSBridge(self.br,
+                                       use_bundle=True) as deferred_br:
+            deferred_br.delete_flows(**self.del_flow_dict1)
+            deferred_br.add_flow(**self.add_flow_dict1)
+            deferred_br.mod_flow(**self.mod_flow_dict1)
+        self._verify_mock_call([])
+        self.br.do_action_flows_bundle.assert_called_once_with(
+            [('add', self.add_flow_dict1),
+             ('mod', self.mod_flow_dict1),
+             ('del', self.del_flow_dict1)])
+
+    def test_apply_bundle_full_ordered(self):
+        with ovs_lib.DeferredOVSBridge(self.br, full_ordered=True,
+                                       use_bundle=True) as deferred_br:
+            deferred_br.delete_flows(**self.del_flow_dict1)
+            deferred_br.add_flow(**self.add_flow_dict1)
+        self.br.do_action_flows_bundle.assert_called_once_with(
+            [('del', self.del_flow_dict1),
+             ('add', self.add_flow_dict1)])
+
     def test_getattr_unallowed_attr(self):
         with ovs_lib.DeferredOVSBridge(self.br) as deferred_br:
             self.assertEqual(self.br.add_port, deferred_br.add_port)
@@ -931,9 +1132,11 @@ class TestDeferredOVSBridge(base.BaseTestCase):
         expected_calls = [
             mock.call('add-flows', ['-'],
                       'hard_timeout=0,idle_timeout=0,priority=1,'
-                      'cookie=' + stamp + ',actions=drop'),
+                      'cookie=' + stamp + ',actions=drop',
+                      check_error=False),
             mock.call('mod-flows', ['-'],
-                      'cookie=' + stamp + ',actions=drop')
+                      'cookie=' + stamp + ',actions=drop',
+                      check_error=False)
         ]
         with mock.patch.object(self.br, 'run_ofctl') as f:
             with ovs_lib.DeferredOVSBridge(self.br) as deferred_br:
@@ -15,6 +15,7 @@
 
 import collections
 import copy
+import os
 import sys
 import uuid
 
@@ -412,6 +413,72 @@ class TestDhcpAgent(base.BaseTestCase):
                     self.assertTrue(log.called)
                     schedule_resync.assert_called_with(exc, 'foo_network')
 
+    def _test_sync_state_batches(self, known_net_ids, active_net_ids,
+                                 expected_batches, networks=None):
+        cfg.CONF.set_override('sync_networks_batch_size', 2)
+        with mock.patch(DHCP_PLUGIN) as plug:
+            mock_plugin = mock.Mock()
+            mock_plugin.get_active_network_ids.return_value = active_net_ids
+            mock_plugin.get_active_networks_info.side_effect = (
+                lambda network_ids: [mock.Mock(id=net_id)
+                                     for net_id in network_ids])
+            plug.return_value = mock_plugin
+
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+
+            attrs_to_mock = dict([(a, mock.DEFAULT)
+                                 for a in ['disable_dhcp_helper', 'cache',
+                                           'safe_configure_dhcp_for_network']])
+
+            with mock.patch.multiple(dhcp, **attrs_to_mock) as mocks:
+                mocks['cache'].get_network_ids.return_value = known_net_ids
+                mocks['cache'].get_port_ids.return_value = []
+                dhcp.sync_state(networks)
+
+                mock_plugin.get_active_networks_info.assert_has_calls(
+                    [mock.call(network_ids=batch)
+                     for batch in expected_batches])
+                self.assertEqual(
+                    len(expected_batches),
+                    mock_plugin.get_active_networks_info.call_count)
+                configured = [
+                    c[1][0].id for c in
+                    mocks['safe_configure_dhcp_for_network'].mock_calls]
+                self.assertEqual(sum(expected_batches, []), configured)
+                diff = set(known_net_ids) - set(active_net_ids)
+                mocks['disable_dhcp_helper'].assert_has_calls(
+                    [mock.call(net_id) for net_id in diff])
+
+    def test_sync_state_batches(self):
+        self._test_sync_state_batches(['d'], ['c', 'a', 'b'],
+                                      [['a', 'b'], ['c']])
+
+    def test_sync_state_batches_only_missing_and_requested_networks(self):
+        self._test_sync_state_batches(['a', 'b', 'c'], ['a', 'b', 'c', 'd'],
+                                      [['b', 'd']], networks=['b'])
+
+    def test_sync_state_batches_not_supported_by_server(self):
+        cfg.CONF.set_override('sync_networks_batch_size', 2)
+        with mock.patch(DHCP_PLUGIN) as plug:
+            mock_plugin = mock.Mock()
+            mock_plugin.get_active_network_ids.side_effect = (
+                oslo_messaging.RemoteError('NoSuchMethod'))
+            mock_plugin.get_active_networks_info.return_value = [
+                mock.Mock(id='a')]
+            plug.return_value = mock_plugin
+
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            with mock.patch.multiple(
+                    dhcp, cache=mock.DEFAULT,
+                    safe_configure_dhcp_for_network=mock.DEFAULT) as mocks:
+                mocks['cache'].get_network_ids.return_value = []
+                mocks['cache'].get_port_ids.return_value = []
+                dhcp.sync_state()
+
+            mock_plugin.get_active_networks_info.assert_called_once_with()
+            self.assertEqual(
+                1, mocks['safe_configure_dhcp_for_network'].call_count)
+
     def test_periodic_resync(self):
         dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
         with mock.patch.object(dhcp_agent.eventlet, 'spawn') as spawn:
@@ -527,6 +594,73 @@ class TestDhcpAgent(base.BaseTestCase):
 
         self.assertEqual(set(networks), set(dhcp.cache.get_network_ids()))
 
+    def _write_network_cache_snapshot(self, networks):
+        cfg.CONF.set_override('persist_network_cache', True)
+        state_path = self.get_temp_file_path('state')
+        cfg.CONF.set_override('state_path', state_path)
+        os.mkdir(state_path)
+        os.mkdir(os.path.join(state_path, 'dhcp'))
+        nc = dhcp_agent.NetworkCache()
+        for network in networks:
+            nc.put(network)
+        nc.save_snapshot(os.path.join(state_path, 'dhcp',
+                                      dhcp_agent.NETWORK_CACHE_FILE))
+
+    def test_populate_cache_on_start_from_snapshot(self):
+        self._write_network_cache_snapshot([fake_network])
+        self.driver.existing_dhcp_networks.return_value = [fake_network.id,
+                                                           'bbb']
+
+        dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+
+        self.assertEqual(fake_network,
+                         dhcp.cache.get_network_by_id(fake_network.id))
+        self.assertEqual([], dhcp.cache.get_network_by_id('bbb').ports)
+        self.assertEqual({fake_network.id}, dhcp._restored_network_ids)
+
+    def test_populate_cache_on_start_from_invalid_snapshot(self):
+        self._write_network_cache_snapshot([])
+        with open(os.path.join(cfg.CONF.state_path, 'dhcp',
+                               dhcp_agent.NETWORK_CACHE_FILE), 'w') as f:
+            f.write('invalid')
+        self.driver.existing_dhcp_networks.return_value = [fake_network.id]
+
+        dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+
+        self.assertEqual([], dhcp.cache.get_network_by_id(
+            fake_network.id).ports)
+        self.assertEqual(set(), dhcp._restored_network_ids)
+
+    def _test_get_configure_action(self, network, active=True):
+        self._write_network_cache_snapshot([fake_network])
+        self.driver.existing_dhcp_networks.return_value = [fake_network.id]
+        self.driver.return_value.active = active
+        dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+        action = dhcp._get_configure_action(network)
+        self.assertEqual(set(), dhcp._restored_network_ids)
+        return action
+
+    def test_get_configure_action_unchanged_network(self):
+        network = copy.deepcopy(fake_network)
+        self.assertEqual('reload_allocations',
+                         self._test_get_configure_action(network))
+
+    def test_get_configure_action_changed_network(self):
+        network = copy.deepcopy(fake_network)
+        network.ports = []
+        self.assertEqual('enable',
+                         self._test_get_configure_action(network))
+
+    def test_get_configure_action_inactive_network(self):
+        network = copy.deepcopy(fake_network)
+        self.assertEqual('enable',
+                         self._test_get_configure_action(network,
+                                                         active=False))
+
+    def test_get_configure_action_not_restored_network(self):
+        dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+        self.assertEqual('enable', dhcp._get_configure_action(fake_network))
+
     def test_none_interface_driver(self):
         cfg.CONF.set_override('interface_driver', None)
         self.assertRaises(SystemExit, dhcp.DeviceManager,
@@ -1084,6 +1218,47 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.cache.assert_has_calls([mock.call.get_port_by_id('unknown')])
         self.assertEqual(self.call_driver.call_count, 0)
 
+    def test_port_events_reload_once_with_delay(self):
+        cfg.CONF.set_override('reload_allocations_delay', 0.5)
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = fake_port2
+        with mock.patch.object(eventlet, 'spawn_after') as spawn_after:
+            self.dhcp.port_update_end(None, dict(port=fake_port1))
+            self.dhcp.port_update_end(None, dict(port=fake_port2))
+            self.dhcp.port_delete_end(None, dict(port_id=fake_port2.id))
+        spawn_after.assert_called_once_with(
+            0.5, self.dhcp._process_pending_reload, fake_network.id)
+        self.assertFalse(self.call_driver.called)
+        self.assertEqual(set(), self.dhcp.dhcp_ready_ports)
+
+        self.dhcp._process_pending_reload(fake_network.id)
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+        self.assertEqual({fake_port1.id, fake_port2.id},
+                         self.dhcp.dhcp_ready_ports)
+        self.assertEqual({'events': 3, 'reloads': 1, 'pending': 0},
+                         self.dhcp._report_reload_stats())
+        self.assertEqual({'events': 0, 'reloads': 0, 'pending': 0},
+                         self.dhcp._report_reload_stats())
+
+    def test_process_pending_reload_removed_network(self):
+        cfg.CONF.set_override('reload_allocations_delay', 0.5)
+        with mock.patch.object(eventlet, 'spawn_after'):
+            self.dhcp.reload_allocations(fake_network, [fake_port1.id])
+        self.cache.get_network_by_id.return_value = None
+        self.dhcp._process_pending_reload(fake_network.id)
+        self.assertFalse(self.call_driver.called)
+        # Nothing is pending anymore
+        self.dhcp._process_pending_reload(fake_network.id)
+        self.assertEqual(1, self.cache.get_network_by_id.call_count)
+
+    def test_reload_allocations_without_delay(self):
+        self.dhcp.reload_allocations(fake_network, [fake_port1.id])
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+        self.assertEqual({fake_port1.id}, self.dhcp.dhcp_ready_ports)
+        self.assertEqual({}, self.dhcp._pending_reloads)
+
 
 class TestDhcpPluginApiProxy(base.BaseTestCase):
     def _test_dhcp_api(self, method, **kwargs):
@@ -1109,6 +1284,14 @@ class TestDhcpPluginApiProxy(base.BaseTestCase):
     def test_get_active_networks_info(self):
         self._test_dhcp_api('get_active_networks_info', version='1.1')
 
+    def test_get_active_networks_info_with_network_ids(self):
+        self._test_dhcp_api('get_active_networks_info',
+                            network_ids=['fake_id'], version='1.7')
+
+    def test_get_active_network_ids(self):
+        self._test_dhcp_api('get_active_network_ids',
+                            return_value=['fake_id'], version='1.7')
+
     def test_get_network_info(self):
         self._test_dhcp_api('get_network_info', network_id='fake_id',
                             return_value=None)
@@ -1247,6 +1430,26 @@ class TestNetworkCache(base.BaseTestCase):
         nc.put(fake_network)
         self.assertEqual(nc.get_port_by_id(fake_port1.id), fake_port1)
 
+    def test_snapshot(self):
+        path = self.get_temp_file_path('network_cache.json')
+        nc = dhcp_agent.NetworkCache()
+        self.assertFalse(nc.dirty)
+        nc.put(fake_network)
+        self.assertTrue(nc.dirty)
+        nc.save_snapshot(path)
+        self.assertFalse(nc.dirty)
+        networks = dhcp_agent.NetworkCache.load_snapshot(path)
+        self.assertEqual([fake_network], networks)
+        self.assertIsInstance(networks[0], dhcp.NetModel)
+        self.assertEqual(fake_network.namespace, networks[0].namespace)
+
+    def test_load_snapshot_unsupported_version(self):
+        path = self.get_temp_file_path('network_cache.json')
+        with open(path, 'w') as f:
+            f.write('{"version": 0, "networks": []}')
+        self.assertRaises(ValueError,
+                          dhcp_agent.NetworkCache.load_snapshot, path)
+
 
 class FakePort1(object):
     def __init__(self):
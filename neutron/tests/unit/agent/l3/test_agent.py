@@ -246,6 +246,32 @@ class TestBasicRouterOperations(BasicRouterOperationsFramework):
             agent._report_state()
             self.assertFalse(agent.fullsync)
 
+    def test_report_processing_stats(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue.add(router_processing_queue.RouterUpdate(
+            _uuid(), router_processing_queue.PRIORITY_RPC))
+        agent._queue.stats.add(1.0, 2.0)
+        with mock.patch.object(l3_agent.LOG, 'info') as log_info:
+            stats = agent._report_processing_stats()
+        self.assertEqual(1, stats['queue_depth'])
+        self.assertEqual(1, stats['count'])
+        self.assertEqual(2.0, stats['max_process_time'])
+        self.assertTrue(log_info.called)
+
+    def test_report_processing_stats_idle(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        with mock.patch.object(l3_agent.LOG, 'info') as log_info:
+            agent._report_processing_stats()
+        self.assertFalse(log_info.called)
+
+    def test_process_routers_loop_pool_size(self):
+        self.conf.set_override('router_processing_workers', 4)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        with mock.patch.object(l3_agent.eventlet, 'GreenPool') as pool:
+            pool.return_value.spawn_n.side_effect = [None, RuntimeError]
+            self.assertRaises(RuntimeError, agent._process_routers_loop)
+        pool.assert_called_once_with(size=4)
+
     def test_periodic_sync_routers_task_call_clean_stale_namespaces(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         self.plugin_api.get_routers.return_value = []
@@ -266,7 +292,9 @@ class TestBasicRouterOperations(BasicRouterOperationsFramework):
         self.mock_ip.get_namespaces.return_value = namespace_list
         driver = metadata_driver.MetadataDriver
         with mock.patch.object(
-                driver, 'destroy_monitored_metadata_proxy') as destroy_proxy:
+                driver, 'destroy_monitored_metadata_proxy') as destroy_proxy,\
+                mock.patch.object(eventlet, 'spawn_n',
+                                  side_effect=lambda f, *args: f(*args)):
             agent.periodic_sync_routers_task(agent.context)
 
             expected_calls = [mock.call(mock.ANY, r_id, agent.conf)
@@ -274,12 +302,105 @@ class TestBasicRouterOperations(BasicRouterOperationsFramework):
             self.assertEqual(len(stale_router_ids), destroy_proxy.call_count)
             destroy_proxy.assert_has_calls(expected_calls, any_order=True)
 
+    def test_periodic_sync_routers_task_grows_chunks(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_ids = [_uuid() for _ in range(100)]
+        self.plugin_api.get_router_ids.return_value = router_ids
+        self.plugin_api.get_routers.return_value = []
+        agent.periodic_sync_routers_task(agent.context)
+
+        min_size = l3_agent.SYNC_ROUTERS_MIN_CHUNK_SIZE
+        expected_chunks = [router_ids[:min_size],
+                           router_ids[min_size:3 * min_size],
+                           router_ids[3 * min_size:]]
+        self.assertEqual([mock.call(agent.context, chunk)
+                          for chunk in expected_chunks],
+                         self.plugin_api.get_routers.call_args_list)
+
+    def test_periodic_sync_routers_task_skips_unchanged_routers(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue = mock.Mock()
+        unchanged_id, changed_id = _uuid(), _uuid()
+        ri = mock.Mock(router={'id': unchanged_id})
+        agent.router_info[unchanged_id] = ri
+        agent._router_sync_revisions[unchanged_id] = 'rev1'
+        changed_router = {'id': changed_id, 'sync_revision': 'rev2'}
+        self.plugin_api.get_router_ids.return_value = [unchanged_id,
+                                                       changed_id]
+        self.plugin_api.get_routers.return_value = [
+            {'id': unchanged_id, 'sync_revision': 'rev1', 'unchanged': True},
+            changed_router]
+        agent.periodic_sync_routers_task(agent.context)
+
+        self.plugin_api.get_routers.assert_called_once_with(
+            agent.context, [unchanged_id, changed_id],
+            router_revisions={unchanged_id: 'rev1'})
+        self.assertEqual(1, agent._queue.add.call_count)
+        update = agent._queue.add.call_args[0][0]
+        self.assertEqual(changed_id, update.id)
+        self.assertEqual(changed_router, update.router)
+        self.assertIn(unchanged_id, agent.router_info)
+        self.assertFalse(agent.fullsync)
+
+    def test_periodic_sync_routers_task_refetches_stub_of_removed_router(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue = mock.Mock()
+        router_id = _uuid()
+        agent._router_sync_revisions[router_id] = 'rev1'
+        self.plugin_api.get_router_ids.return_value = [router_id]
+        self.plugin_api.get_routers.return_value = [
+            {'id': router_id, 'sync_revision': 'rev1', 'unchanged': True}]
+        agent.periodic_sync_routers_task(agent.context)
+
+        update = agent._queue.add.call_args[0][0]
+        self.assertEqual(router_id, update.id)
+        self.assertIsNone(update.router)
+
+    def test_get_routers_for_sync_without_revisions_support(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_id = _uuid()
+        agent._router_sync_revisions[router_id] = 'rev1'
+        routers = [{'id': router_id}]
+        self.plugin_api.get_routers.side_effect = [
+            oslo_messaging.RemoteError('UnsupportedVersion'), routers,
+            routers]
+        self.assertEqual(routers,
+                         agent._get_routers_for_sync(agent.context,
+                                                     [router_id]))
+        self.assertFalse(agent._router_sync_revisions_supported)
+
+        agent._get_routers_for_sync(agent.context, [router_id])
+        self.plugin_api.get_routers.assert_called_with(agent.context,
+                                                       [router_id])
+
+    def test_get_routers_for_sync_reraises_remote_errors(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_id = _uuid()
+        agent._router_sync_revisions[router_id] = 'rev1'
+        self.plugin_api.get_routers.side_effect = (
+            oslo_messaging.RemoteError('ValueError'))
+        self.assertRaises(oslo_messaging.RemoteError,
+                          agent._get_routers_for_sync,
+                          agent.context, [router_id])
+        self.assertTrue(agent._router_sync_revisions_supported)
+
     def test_router_info_create(self):
         id = _uuid()
         ri = l3router.RouterInfo(id, {}, **self.ri_kwargs)
 
         self.assertTrue(ri.ns_name.endswith(id))
 
+    def test_router_added_keeps_router_namespaces(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = {'id': _uuid()}
+        with mock.patch.object(agent.namespaces_manager,
+                               'keep_router') as keep_router, \
+                mock.patch.object(agent, '_create_router') as create_router:
+            agent._router_added(router['id'], router)
+        keep_router.assert_called_once_with(router['id'])
+        create_router.return_value.initialize.assert_called_once_with(
+            agent.process_monitor)
+
     def test_router_info_create_with_router(self):
         ns_id = _uuid()
         subnet_id = _uuid()
@@ -2016,6 +2137,35 @@ class TestBasicRouterOperations(BasicRouterOperationsFramework):
         agent._process_router_update()
         self.assertTrue(agent.plugin_rpc.get_routers.called)
 
+    def test_process_routers_update_records_sync_revision(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_id = _uuid()
+        agent._process_router_if_compatible = mock.Mock()
+        agent.router_info[router_id] = mock.Mock()
+        update = router_processing_queue.RouterUpdate(
+            router_id,
+            router_processing_queue.PRIORITY_SYNC_ROUTERS_TASK,
+            router={'id': router_id, 'sync_revision': 'rev1'},
+            timestamp=timeutils.utcnow())
+        agent._queue.add(update)
+        agent._process_router_update()
+        self.assertEqual({router_id: 'rev1'}, agent._router_sync_revisions)
+
+    def test_process_routers_update_failure_forgets_sync_revision(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_id = _uuid()
+        agent._process_router_if_compatible = mock.Mock(
+            side_effect=RuntimeError())
+        agent._router_sync_revisions[router_id] = 'rev1'
+        update = router_processing_queue.RouterUpdate(
+            router_id,
+            router_processing_queue.PRIORITY_SYNC_ROUTERS_TASK,
+            router={'id': router_id, 'sync_revision': 'rev2'},
+            timestamp=timeutils.utcnow())
+        agent._queue.add(update)
+        agent._process_router_update()
+        self.assertEqual({}, agent._router_sync_revisions)
+
     def test_process_routers_update_rpc_timeout_on_get_ext_net(self):
         self._test_process_routers_update_rpc_timeout(ext_net_call=True,
                                                       ext_net_call_failed=True)
@@ -2176,9 +2326,13 @@ class TestBasicRouterOperations(BasicRouterOperationsFramework):
         pm = self.external_process.return_value
         pm.reset_mock()
 
-        with agent.namespaces_manager as ns_manager:
-            for r in router_list:
-                ns_manager.keep_router(r['id'])
+        with mock.patch.object(eventlet, 'spawn_n') as spawn_n:
+            with agent.namespaces_manager as ns_manager:
+                for r in router_list:
+                    ns_manager.keep_router(r['id'])
+        # The stale namespaces are deleted in the background
+        self.assertFalse(mock_router_ns.called)
+        spawn_n.call_args[0][0](*spawn_n.call_args[0][1:])
         qrouters = [n for n in stale_namespace_list
                     if n.startswith(namespaces.NS_PREFIX)]
         self.assertEqual(len(qrouters), mock_router_ns.call_count)
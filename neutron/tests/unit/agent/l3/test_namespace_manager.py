@@ -91,6 +91,68 @@ class TestNamespaceManager(NamespaceManagerTestCaseFramework):
             retrieved_ns_names = self.ns_manager.list_all()
         self.assertFalse(retrieved_ns_names)
 
+    def _test_clean_stale(self, in_background):
+        self.ns_manager._clean_stale_in_background = in_background
+        kept_id, stale_id = _uuid(), _uuid()
+        ns_names = [namespaces.NS_PREFIX + kept_id,
+                    namespaces.NS_PREFIX + stale_id]
+        with mock.patch.object(ip_lib.IPWrapper, 'get_namespaces',
+                               return_value=ns_names), \
+                mock.patch.object(self.ns_manager,
+                                  '_cleanup') as mock_cleanup, \
+                mock.patch.object(namespace_manager.eventlet,
+                                  'spawn_n') as spawn_n:
+            with self.ns_manager as ns_manager:
+                ns_manager.keep_router(kept_id)
+            if in_background:
+                self.assertFalse(mock_cleanup.called)
+                spawn_n.assert_called_once_with(
+                    self.ns_manager._cleanup_stale,
+                    [(namespaces.NS_PREFIX, stale_id)])
+                self.ns_manager._cleanup_stale(*spawn_n.call_args[0][1:])
+            else:
+                self.assertFalse(spawn_n.called)
+            mock_cleanup.assert_called_once_with(namespaces.NS_PREFIX,
+                                                 stale_id)
+
+    def test_clean_stale(self):
+        self._test_clean_stale(in_background=False)
+
+    def test_clean_stale_in_background(self):
+        self._test_clean_stale(in_background=True)
+
+    def test_clean_stale_in_background_router_added_meanwhile(self):
+        self.ns_manager._clean_stale_in_background = True
+        stale_id = _uuid()
+        with mock.patch.object(ip_lib.IPWrapper, 'get_namespaces',
+                               return_value=[namespaces.NS_PREFIX +
+                                             stale_id]), \
+                mock.patch.object(self.ns_manager,
+                                  '_cleanup') as mock_cleanup, \
+                mock.patch.object(namespace_manager.eventlet,
+                                  'spawn_n') as spawn_n:
+            with self.ns_manager:
+                pass
+            # The router is added back before its namespace is deleted,
+            # while another sync starts
+            self.ns_manager.keep_router(stale_id)
+            with self.ns_manager:
+                pass
+            self.ns_manager._cleanup_stale(*spawn_n.call_args[0][1:])
+        self.assertFalse(mock_cleanup.called)
+        self.assertFalse(self.ns_manager._cleaning_stale)
+
+    def test_keep_router_waits_for_cleanup(self):
+        router_id = _uuid()
+        with mock.patch.object(self.ns_manager,
+                               '_get_cleanup_lock') as get_lock:
+            self.ns_manager.keep_router(router_id)
+            self.assertFalse(get_lock.called)
+            self.ns_manager._cleaning_stale = True
+            self.ns_manager.keep_router(router_id)
+        get_lock.assert_called_once_with(router_id)
+        self.assertTrue(get_lock.return_value.__exit__.called)
+
     def test_ensure_snat_cleanup(self):
         router_id = _uuid()
         with mock.patch.object(self.ns_manager, '_cleanup') as mock_cleanup:
@@ -375,7 +375,7 @@ class TestFloatingIpWithMockDevice(BasicRouterTestCaseFramework):
             'status': l3_constants.FLOATINGIP_STATUS_DOWN
         }
 
-        IPDevice.return_value = device = mock.Mock()
+        IPDevice.return_value = device = mock.MagicMock()
         device.addr.list.return_value = [{'cidr': '15.1.2.3/32'}]
         ri = self._create_router()
         ri.get_floating_ips = mock.Mock(return_value=[fip])
@@ -406,7 +406,8 @@ class TestFloatingIpWithMockDevice(BasicRouterTestCaseFramework):
         self.assertIsNone(fip_statuses.get(fip_id))
 
     def test_process_router_floating_ip_with_device_add_error(self, IPDevice):
-        IPDevice.return_value = device = mock.Mock(side_effect=RuntimeError)
+        device = mock.MagicMock(side_effect=RuntimeError)
+        IPDevice.return_value = device
         device.addr.list.return_value = []
         fip_id = _uuid()
         fip = {
@@ -428,7 +429,7 @@ class TestFloatingIpWithMockDevice(BasicRouterTestCaseFramework):
 
     # TODO(mrsmith): refactor for DVR cases
     def test_process_floating_ip_addresses_remove(self, IPDevice):
-        IPDevice.return_value = device = mock.Mock()
+        IPDevice.return_value = device = mock.MagicMock()
         device.addr.list.return_value = [{'cidr': '15.1.2.3/32'}]
 
         ri = self._create_router()
@@ -441,7 +442,7 @@ class TestFloatingIpWithMockDevice(BasicRouterTestCaseFramework):
         ri.remove_floating_ip.assert_called_once_with(device, '15.1.2.3/32')
 
     def test_process_floating_ip_reassignment(self, IPDevice):
-        IPDevice.return_value = device = mock.Mock()
+        IPDevice.return_value = device = mock.MagicMock()
         device.addr.list.return_value = [{'cidr': '15.1.2.3/32'}]
 
         fip_id = _uuid()
@@ -458,3 +459,120 @@ class TestFloatingIpWithMockDevice(BasicRouterTestCaseFramework):
 
         ri.process_floating_ip_addresses(mock.sentinel.interface_name)
         ri.move_floating_ip.assert_called_once_with(fip)
+
+    def _get_fips(self, *addresses):
+        return [{'id': _uuid(), 'port_id': _uuid(),
+                 'floating_ip_address': address,
+                 'fixed_ip_address': '192.168.0.3',
+                 'status': 'DOWN'} for address in addresses]
+
+    def _add_floating_ip(self, ri, failed_addresses=()):
+        def add_floating_ip(fip, interface_name, device):
+            address = fip['floating_ip_address']
+            if address in failed_addresses:
+                return l3_constants.FLOATINGIP_STATUS_ERROR
+            ri.send_ip_addr_adv_notif(ri.ns_name, interface_name, address)
+            return l3_constants.FLOATINGIP_STATUS_ACTIVE
+        return add_floating_ip
+
+    @mock.patch.object(ip_lib, 'send_ip_addrs_adv_notif')
+    @mock.patch.object(ip_lib, 'send_ip_addr_adv_notif')
+    def test_process_floating_ip_addresses_garps(self, send_garp,
+                                                 send_garps, IPDevice):
+        IPDevice.return_value = device = mock.MagicMock()
+        device.addr.list.return_value = []
+        fips = self._get_fips('15.1.2.3', '15.1.2.4')
+        ri = self._create_router()
+        ri.get_floating_ips = mock.Mock(return_value=fips)
+        ri.add_floating_ip = mock.Mock(side_effect=self._add_floating_ip(ri))
+
+        fip_statuses = ri.process_floating_ip_addresses(
+            mock.sentinel.interface_name)
+
+        self.assertEqual(
+            {fip['id']: l3_constants.FLOATINGIP_STATUS_ACTIVE
+             for fip in fips}, fip_statuses)
+        device.batch.assert_called_once_with()
+        self.assertFalse(send_garp.called)
+        send_garps.assert_called_once_with(
+            ri.ns_name, mock.sentinel.interface_name,
+            ['15.1.2.3', '15.1.2.4'], ri.agent_conf)
+        self.assertIsNone(ri._pending_garps)
+
+    def _add_fip_addr_to_device(self, ri):
+        def add_floating_ip(fip, interface_name, device):
+            if not ri._add_fip_addr_to_device(fip, device):
+                return l3_constants.FLOATINGIP_STATUS_ERROR
+            ri.send_ip_addr_adv_notif(ri.ns_name, interface_name,
+                                      fip['floating_ip_address'])
+            return l3_constants.FLOATINGIP_STATUS_ACTIVE
+        return add_floating_ip
+
+    @mock.patch.object(ip_lib, 'send_ip_addrs_adv_notif')
+    def test_process_floating_ip_addresses_batch_failure(self, send_garps,
+                                                         IPDevice):
+        IPDevice.return_value = device = mock.MagicMock()
+        device.batch.return_value.__exit__.side_effect = ip_lib.IPBatchError
+        # The first address was configured before the batch failed
+        device.addr.list.side_effect = [
+            [{'cidr': '15.1.2.9/32'}],
+            [{'cidr': '15.1.2.3/32'}, {'cidr': '15.1.2.9/32'}]]
+        # The batched additions and the retry of the second one
+        device.addr.add.side_effect = [None, None, RuntimeError]
+        fips = self._get_fips('15.1.2.3', '15.1.2.4')
+        ri = self._create_router()
+        ri.get_floating_ips = mock.Mock(return_value=fips)
+        ri.add_floating_ip = mock.Mock(
+            side_effect=self._add_fip_addr_to_device(ri))
+
+        fip_statuses = ri.process_floating_ip_addresses(
+            mock.sentinel.interface_name)
+
+        self.assertEqual(
+            {fips[0]['id']: l3_constants.FLOATINGIP_STATUS_ACTIVE,
+             fips[1]['id']: l3_constants.FLOATINGIP_STATUS_ERROR},
+            fip_statuses)
+        # Only the address changes are retried
+        self.assertEqual(2, ri.add_floating_ip.call_count)
+        device.addr.add.assert_called_with('15.1.2.4/32')
+        self.assertEqual(
+            [mock.call('15.1.2.9/32')] * 2,
+            device.delete_addr_and_conntrack_state.call_args_list)
+        send_garps.assert_called_once_with(
+            ri.ns_name, mock.sentinel.interface_name, ['15.1.2.3'],
+            ri.agent_conf)
+        self.assertIsNone(ri._fip_address_changes)
+
+    def test_process_floating_ip_addresses_batch_failure_removals(
+            self, IPDevice):
+        IPDevice.return_value = device = mock.MagicMock()
+        device.batch.return_value.__exit__.side_effect = ip_lib.IPBatchError
+        # The first address was removed before the batch failed
+        device.addr.list.side_effect = [
+            [{'cidr': '15.1.2.8/32'}, {'cidr': '15.1.2.9/32'}],
+            [{'cidr': '15.1.2.9/32'}]]
+        ri = self._create_router()
+        ri.get_floating_ips = mock.Mock(return_value=[])
+
+        ri.process_floating_ip_addresses(mock.sentinel.interface_name)
+
+        # Only the address still configured is removed again
+        self.assertEqual(
+            3, device.delete_addr_and_conntrack_state.call_count)
+        device.delete_addr_and_conntrack_state.assert_called_with(
+            '15.1.2.9/32')
+        device.delete_conntrack_state.assert_called_once_with('15.1.2.8/32')
+
+    def test_process_floating_ip_addresses_error_not_retried(self, IPDevice):
+        IPDevice.return_value = device = mock.MagicMock()
+        device.addr.list.return_value = []
+        fips = self._get_fips('15.1.2.3')
+        ri = self._create_router()
+        ri.get_floating_ips = mock.Mock(return_value=fips)
+        ri.add_floating_ip = mock.Mock(side_effect=RuntimeError)
+
+        self.assertRaises(RuntimeError, ri.process_floating_ip_addresses,
+                          mock.sentinel.interface_name)
+        ri.add_floating_ip.assert_called_once_with(
+            fips[0], mock.sentinel.interface_name, device)
+        self.assertIsNone(ri._fip_address_changes)
@@ -101,3 +101,34 @@ class TestExclusiveRouterProcessor(base.BaseTestCase):
             raise Exception("Only the master should process a router")
 
         self.assertEqual(2, len([i for i in master.updates()]))
+
+
+class TestRouterProcessingStats(base.BaseTestCase):
+
+    def test_report(self):
+        stats = l3_queue.RouterProcessingStats()
+        stats.add(1.0, 4.0)
+        stats.add(3.0, 2.0)
+        self.assertEqual({'count': 2,
+                          'avg_wait_time': 2.0,
+                          'max_wait_time': 3.0,
+                          'avg_process_time': 3.0,
+                          'max_process_time': 4.0}, stats.report())
+        self.assertEqual(0, stats.report()['count'])
+
+
+class TestRouterProcessingQueue(base.BaseTestCase):
+
+    def test_each_update_to_next_router_records_stats(self):
+        router_id = _uuid()
+        queue = l3_queue.RouterProcessingQueue()
+        queue.add(l3_queue.RouterUpdate(router_id, 0))
+        queue.add(l3_queue.RouterUpdate(_uuid(), 1))
+        self.assertEqual(2, queue.qsize())
+        updates = [update.id for rp, update in
+                   queue.each_update_to_next_router()]
+        self.assertEqual([router_id], updates)
+        self.assertEqual(1, queue.qsize())
+        stats = queue.stats.report()
+        self.assertEqual(1, stats['count'])
+        self.assertGreaterEqual(stats['max_wait_time'], 0)
@@ -14,6 +14,7 @@
 
 import mock
 from neutron_lib import constants
+from oslo_config import cfg
 import testtools
 
 from neutron.agent.common import ovs_lib
@@ -222,6 +223,33 @@ class TestSGPortMap(base.BaseTestCase):
         self.map.update_members(1, [])
 
 
+class TestConjIdMap(base.BaseTestCase):
+    def setUp(self):
+        super(TestConjIdMap, self).setUp()
+        self.conj_id_map = ovsfw.ConjIdMap()
+
+    def test_get_conj_id(self):
+        conj_id = self.conj_id_map.get_conj_id(
+            'sg', 'remote', firewall.INGRESS_DIRECTION, constants.IPv4)
+        self.assertEqual(conj_id, self.conj_id_map.get_conj_id(
+            'sg', 'remote', firewall.INGRESS_DIRECTION, constants.IPv4))
+        other_ids = [
+            self.conj_id_map.get_conj_id(
+                'sg', 'remote', firewall.EGRESS_DIRECTION, constants.IPv4),
+            self.conj_id_map.get_conj_id(
+                'sg', 'remote', firewall.INGRESS_DIRECTION, constants.IPv6),
+            self.conj_id_map.get_conj_id(
+                'sg', 'other', firewall.INGRESS_DIRECTION, constants.IPv4)]
+        # the ID following each conjunction ID is used for new connections
+        ids = [conj_id] + other_ids
+        self.assertEqual(len(ids) * 2,
+                         len(set(ids) | set(i + 1 for i in ids)))
+
+    def test_get_conj_id_invalid_direction(self):
+        self.assertRaises(ValueError, self.conj_id_map.get_conj_id,
+                          'sg', 'remote', 'inbound', constants.IPv4)
+
+
 class FakeOVSPort(object):
     def __init__(self, name, port, mac):
         self.port_name = name
@@ -266,6 +294,20 @@ class TestOVSFirewallDriver(base.BaseTestCase):
     def test_initialize_bridge(self):
         br = self.firewall.initialize_bridge(self.mock_bridge)
         self.assertEqual(br, self.mock_bridge.deferred.return_value)
+        self.mock_bridge.deferred.assert_called_once_with(
+            full_ordered=True, use_bundle=False)
+
+    def test_initialize_bridge_with_bundles(self):
+        cfg.CONF.set_override('ovs_ofctl_bundles', True)
+        self.firewall.initialize_bridge(self.mock_bridge)
+        self.mock_bridge.deferred.assert_called_once_with(
+            full_ordered=True, use_bundle=True)
+
+    def test_filter_defer_apply_off_failure(self):
+        self.firewall.filter_defer_apply_on()
+        self.mock_bridge.apply_flows.side_effect = RuntimeError
+        self.assertRaises(RuntimeError, self.firewall.filter_defer_apply_off)
+        self.assertFalse(self.firewall._deferred)
 
     def test__add_flow_dl_type_formatted_to_string(self):
         dl_type = 0x0800
@@ -429,6 +471,69 @@ class TestOVSFirewallDriver(base.BaseTestCase):
             table=ovs_consts.RULES_EGRESS_TABLE)
         self.assertIn(filter_rule, add_calls)
 
+    def test_update_port_filter_unchanged(self):
+        port_dict = {'device': 'port-id',
+                     'security_groups': [1]}
+        self._prepare_security_group()
+        self.firewall.prepare_port_filter(port_dict)
+        self.mock_bridge.reset_mock()
+
+        self.firewall.update_port_filter(port_dict)
+        self.assertFalse(self.mock_bridge.br.add_flow.called)
+        self.assertFalse(self.mock_bridge.br.delete_flows.called)
+
+    def test_update_port_filter_rule_removed(self):
+        port_dict = {'device': 'port-id',
+                     'security_groups': [1, 2]}
+        self._prepare_security_group()
+        self.firewall.prepare_port_filter(port_dict)
+        self.firewall.update_security_group_rules(2, [])
+        self.mock_bridge.reset_mock()
+
+        self.firewall.update_port_filter(port_dict)
+        self.assertFalse(self.mock_bridge.br.add_flow.called)
+        removed_flow = dict(
+            dl_src=self.port_mac,
+            dl_type="0x{:04x}".format(n_const.ETHERTYPE_IP),
+            nw_proto=constants.PROTO_NUM_UDP,
+            priority=70,
+            reg5=self.port_ofport,
+            strict=True,
+            table=ovs_consts.RULES_EGRESS_TABLE)
+        self.assertEqual(
+            [mock.call(ct_state=ct_state, **removed_flow)
+             for ct_state in (ovsfw_consts.OF_STATE_ESTABLISHED_NOT_REPLY,
+                              ovsfw_consts.OF_STATE_NEW_NOT_ESTABLISHED)],
+            sorted(self.mock_bridge.br.delete_flows.call_args_list,
+                   key=lambda call: call[1]['ct_state']))
+
+    def test_update_port_filter_rule_removed_apply_failure(self):
+        port_dict = {'device': 'port-id',
+                     'security_groups': [1, 2]}
+        self._prepare_security_group()
+        self.firewall.prepare_port_filter(port_dict)
+        self.firewall.update_security_group_rules(2, [])
+        self.firewall.filter_defer_apply_on()
+        self.firewall.update_port_filter(port_dict)
+        self.mock_bridge.apply_flows.side_effect = RuntimeError
+        self.assertRaises(RuntimeError, self.firewall.filter_defer_apply_off)
+        self.mock_bridge.reset_mock()
+
+        # the removed flows are deleted again and the other ones added again
+        self.firewall.update_port_filter(port_dict)
+        deleted_tables = [
+            call[1]['table']
+            for call in self.mock_bridge.br.delete_flows.call_args_list]
+        self.assertEqual([ovs_consts.RULES_EGRESS_TABLE] * 2, deleted_tables)
+        self.assertTrue(self.mock_bridge.br.add_flow.called)
+        self.assertEqual({}, self.firewall._unapplied_port_flows)
+
+        # the flows are known again once applied
+        self.mock_bridge.reset_mock()
+        self.firewall.update_port_filter(port_dict)
+        self.assertFalse(self.mock_bridge.br.add_flow.called)
+        self.assertFalse(self.mock_bridge.br.delete_flows.called)
+
     def test_update_port_filter_create_new_port_if_not_present(self):
         port_dict = {'device': 'port-id',
                      'security_groups': [1]}
@@ -476,3 +581,131 @@ class TestOVSFirewallDriver(base.BaseTestCase):
         """Just make sure it doesn't crash"""
         new_members = {constants.IPv4: [1, 2, 3, 4]}
         self.firewall.update_security_group_members(2, new_members)
+
+    def _prepare_remote_security_group(self):
+        self.firewall.update_security_group_rules(1, [
+            {'ethertype': constants.IPv4,
+             'protocol': constants.PROTO_NAME_TCP,
+             'direction': firewall.INGRESS_DIRECTION,
+             'port_range_min': 123,
+             'port_range_max': 123,
+             'remote_group_id': 2}])
+        self.firewall.update_security_group_members(
+            2, {constants.IPv4: ['10.0.0.1', '10.0.0.2']})
+        return self.firewall.conj_id_map.get_conj_id(
+            1, 2, firewall.INGRESS_DIRECTION, constants.IPv4)
+
+    def _address_flow(self, ip_addr, conj_id):
+        return mock.call(
+            actions='conjunction({:d},1/2)'.format(conj_id),
+            ct_state=ovsfw_consts.OF_STATE_ESTABLISHED_NOT_REPLY,
+            dl_type="0x{:04x}".format(n_const.ETHERTYPE_IP),
+            nw_src='{:s}/32'.format(ip_addr),
+            priority=ovsfw_consts.CONJ_FLOW_PRIORITY,
+            reg6=TESTING_VLAN_TAG,
+            table=ovs_consts.RULES_INGRESS_TABLE)
+
+    def test_prepare_port_filter_remote_group(self):
+        port_dict = {'device': 'port-id',
+                     'security_groups': [1]}
+        conj_id = self._prepare_remote_security_group()
+        self.firewall.prepare_port_filter(port_dict)
+        calls = self.mock_bridge.br.add_flow.call_args_list
+        port_clause = mock.call(
+            actions='conjunction({:d},2/2)'.format(conj_id),
+            ct_state=ovsfw_consts.OF_STATE_ESTABLISHED_NOT_REPLY,
+            dl_dst=self.port_mac,
+            dl_type="0x{:04x}".format(n_const.ETHERTYPE_IP),
+            nw_proto=constants.PROTO_NUM_TCP,
+            priority=ovsfw_consts.CONJ_FLOW_PRIORITY,
+            reg5=self.port_ofport,
+            table=ovs_consts.RULES_INGRESS_TABLE,
+            tcp_dst='0x007b')
+        accept_flow = mock.call(
+            actions='ct(commit,zone=NXM_NX_REG6[0..15]),'
+                    'strip_vlan,output:{:d}'.format(self.port_ofport),
+            conj_id=conj_id + 1,
+            ct_state=ovsfw_consts.OF_STATE_NEW_NOT_ESTABLISHED,
+            dl_dst=self.port_mac,
+            dl_type="0x{:04x}".format(n_const.ETHERTYPE_IP),
+            priority=ovsfw_consts.CONJ_FLOW_PRIORITY,
+            reg5=self.port_ofport,
+            table=ovs_consts.RULES_INGRESS_TABLE)
+        for call in (port_clause, accept_flow,
+                     self._address_flow('10.0.0.1', conj_id),
+                     self._address_flow('10.0.0.2', conj_id)):
+            self.assertIn(call, calls)
+        # no flow is generated per member address and port
+        self.assertFalse([call for call in calls
+                          if 'nw_src' in call[1] and 'reg5' in call[1]])
+
+    def test_update_security_group_members_remote_group(self):
+        port_dict = {'device': 'port-id',
+                     'security_groups': [1]}
+        conj_id = self._prepare_remote_security_group()
+        self.firewall.prepare_port_filter(port_dict)
+        self.mock_bridge.reset_mock()
+
+        self.firewall.filter_defer_apply_on()
+        self.firewall.update_security_group_members(
+            2, {constants.IPv4: ['10.0.0.2', '10.0.0.3']})
+        self.firewall.filter_defer_apply_off()
+
+        new_address_flow = self._address_flow('10.0.0.3', conj_id)[2]
+        self.assertEqual(
+            [mock.call(**new_address_flow),
+             mock.call(**dict(
+                 new_address_flow,
+                 actions='conjunction({:d},1/2)'.format(conj_id + 1),
+                 ct_state=ovsfw_consts.OF_STATE_NEW_NOT_ESTABLISHED))],
+            self.mock_bridge.add_flow.call_args_list)
+        self.mock_bridge.delete_flows.assert_called_once_with(
+            dl_type=n_const.ETHERTYPE_IP, nw_src='10.0.0.1/32',
+            reg6=TESTING_VLAN_TAG, table=ovs_consts.RULES_INGRESS_TABLE)
+        self.assertTrue(self.mock_bridge.apply_flows.called)
+
+    def test_update_security_group_members_apply_failure(self):
+        port_dict = {'device': 'port-id',
+                     'security_groups': [1]}
+        conj_id = self._prepare_remote_security_group()
+        self.firewall.prepare_port_filter(port_dict)
+
+        self.firewall.filter_defer_apply_on()
+        self.firewall.update_security_group_members(
+            2, {constants.IPv4: ['10.0.0.2', '10.0.0.3']})
+        self.mock_bridge.apply_flows.side_effect = RuntimeError
+        self.assertRaises(RuntimeError, self.firewall.filter_defer_apply_off)
+        self.mock_bridge.apply_flows.side_effect = None
+        self.mock_bridge.reset_mock()
+
+        # the flows of both the old and the new members are deleted, and the
+        # ones of the members added again
+        self.firewall.filter_defer_apply_on()
+        self.firewall.update_security_group_members(
+            2, {constants.IPv4: ['10.0.0.2']})
+        self.firewall.filter_defer_apply_off()
+        deleted_addresses = [
+            call[1].get('nw_src')
+            for call in self.mock_bridge.delete_flows.call_args_list]
+        self.assertEqual(['10.0.0.1/32', '10.0.0.3/32'],
+                         sorted(deleted_addresses))
+        self.assertIn(self._address_flow('10.0.0.2', conj_id)[2],
+                      [call[1]
+                       for call in self.mock_bridge.add_flow.call_args_list])
+        self.assertEqual(
+            [(firewall.INGRESS_DIRECTION, constants.IPv4, '10.0.0.2')],
+            list(self.firewall.conj_ip_manager.flow_state[TESTING_VLAN_TAG]))
+
+    def test_remove_port_filter_remote_group(self):
+        port_dict = {'device': 'port-id',
+                     'security_groups': [1]}
+        self._prepare_remote_security_group()
+        self.firewall.prepare_port_filter(port_dict)
+        self.mock_bridge.reset_mock()
+        self.firewall.remove_port_filter(port_dict)
+        deleted_addresses = [
+            call[1].get('nw_src')
+            for call in self.mock_bridge.br.delete_flows.call_args_list]
+        self.assertIn('10.0.0.1/32', deleted_addresses)
+        self.assertIn('10.0.0.2/32', deleted_addresses)
+        self.assertEqual({}, self.firewall.conj_ip_manager.flow_state)
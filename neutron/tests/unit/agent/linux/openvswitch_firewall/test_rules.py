@@ -16,6 +16,7 @@ import mock
 from neutron_lib import constants
 
 from neutron.agent import firewall
+from neutron.agent.linux.openvswitch_firewall import constants as ovsfw_consts
 from neutron.agent.linux.openvswitch_firewall import firewall as ovsfw
 from neutron.agent.linux.openvswitch_firewall import rules
 from neutron.common import constants as n_const
@@ -307,18 +308,86 @@ class TestCreatePortRangeFlows(base.BaseTestCase):
         self._test_create_port_range_flows_helper(expected_flows, rule)
 
 
-class TestCreateRuleForIpAddress(base.BaseTestCase):
-    def test_create_rule_for_ip_address(self):
-        sg_rule = {
-            'remote_group_id': 'remote_id',
-            'direction': firewall.INGRESS_DIRECTION,
-            'some_settings': 'foo',
+class TestConjunctionFlows(base.BaseTestCase):
+    def setUp(self):
+        super(TestConjunctionFlows, self).setUp()
+        ovs_port = mock.Mock(vif_mac='00:00:00:00:00:00')
+        ovs_port.ofport = 1
+        port_dict = {'device': 'port_id'}
+        self.port = ovsfw.OFPort(
+            port_dict, ovs_port, vlan_tag=TESTING_VLAN_TAG)
+
+    def test_substitute_conjunction_actions(self):
+        flows = rules.substitute_conjunction_actions(
+            [{'priority': 70, 'actions': 'drop', 'reg_port': 1}], 2, [8, 4])
+        expected_flows = [{
+            'priority': ovsfw_consts.CONJ_FLOW_PRIORITY,
+            'reg_port': 1,
+            'ct_state': ovsfw_consts.OF_STATE_ESTABLISHED_NOT_REPLY,
+            'actions': 'conjunction(4,2/2),conjunction(8,2/2)',
+        }, {
+            'priority': ovsfw_consts.CONJ_FLOW_PRIORITY,
+            'reg_port': 1,
+            'ct_state': ovsfw_consts.OF_STATE_NEW_NOT_ESTABLISHED,
+            'actions': 'conjunction(5,2/2),conjunction(9,2/2)',
+        }]
+        self.assertEqual(expected_flows, flows)
+
+    def test_create_flows_for_ip_address_ingress(self):
+        flows = rules.create_flows_for_ip_address(
+            '192.168.0.1', firewall.INGRESS_DIRECTION, constants.IPv4,
+            TESTING_VLAN_TAG, [4])
+        expected_template = {
+            'priority': ovsfw_consts.CONJ_FLOW_PRIORITY,
+            'table': ovs_consts.RULES_INGRESS_TABLE,
+            'dl_type': n_const.ETHERTYPE_IP,
+            'reg_net': TESTING_VLAN_TAG,
+            'nw_src': '192.168.0.1/32',
         }
-        expected_rule = {
-            'direction': firewall.INGRESS_DIRECTION,
-            'source_ip_prefix': '192.168.0.1/32',
-            'some_settings': 'foo',
+        self.assertEqual(2, len(flows))
+        for flow, actions in zip(flows, ('conjunction(4,1/2)',
+                                         'conjunction(5,1/2)')):
+            self.assertEqual(actions, flow.pop('actions'))
+            flow.pop('ct_state')
+            self.assertEqual(expected_template, flow)
+
+    def test_create_flows_for_ip_address_egress_ipv6(self):
+        flows = rules.create_flows_for_ip_address(
+            '2001:db8::1', firewall.EGRESS_DIRECTION, constants.IPv6,
+            TESTING_VLAN_TAG, [4])
+        for flow in flows:
+            self.assertEqual(ovs_consts.RULES_EGRESS_TABLE, flow['table'])
+            self.assertEqual(n_const.ETHERTYPE_IPV6, flow['dl_type'])
+            self.assertEqual('2001:db8::1/128', flow['ipv6_dst'])
+
+    def test_create_conj_flows_ingress(self):
+        flows = rules.create_conj_flows(
+            self.port, 4, firewall.INGRESS_DIRECTION, constants.IPv4)
+        expected_template = {
+            'priority': ovsfw_consts.CONJ_FLOW_PRIORITY,
+            'table': ovs_consts.RULES_INGRESS_TABLE,
+            'dl_type': n_const.ETHERTYPE_IP,
+            'dl_dst': self.port.mac,
+            'reg_port': self.port.ofport,
         }
-        translated_rule = rules.create_rule_for_ip_address(
-            '192.168.0.1', sg_rule)
-        self.assertEqual(expected_rule, translated_rule)
+        expected_flows = [
+            dict(expected_template, conj_id=4,
+                 ct_state=ovsfw_consts.OF_STATE_ESTABLISHED_NOT_REPLY,
+                 actions='strip_vlan,output:1'),
+            dict(expected_template, conj_id=5,
+                 ct_state=ovsfw_consts.OF_STATE_NEW_NOT_ESTABLISHED,
+                 actions='ct(commit,zone=NXM_NX_REG6[0..15]),'
+                         'strip_vlan,output:1'),
+        ]
+        self.assertEqual(expected_flows, flows)
+
+    def test_create_conj_flows_egress(self):
+        flows = rules.create_conj_flows(
+            self.port, 4, firewall.EGRESS_DIRECTION, constants.IPv6)
+        self.assertEqual([4, 5], [flow['conj_id'] for flow in flows])
+        for flow in flows:
+            self.assertEqual(ovs_consts.RULES_EGRESS_TABLE, flow['table'])
+            self.assertEqual(self.port.mac, flow['dl_src'])
+            self.assertEqual(
+                'resubmit(,{:d})'.format(ovs_consts.ACCEPT_OR_INGRESS_TABLE),
+                flow['actions'])
@@ -1857,6 +1857,98 @@ class TestDnsmasq(TestBase):
         # file.
         self.assertEqual(2, len(logger.method_calls))
 
+    def test__output_config_files_iterates_ports_once(self):
+        network = FakeDualNetwork()
+        dm = self._get_dnsmasq(network)
+        with mock.patch.object(dm, '_make_subnet_interface_ip_map'),\
+                mock.patch.object(dm, '_iter_port_hosts',
+                                  return_value=[]) as iter_port_hosts:
+            dm._output_config_files()
+        self.assertEqual(len(network.ports), iter_port_hosts.call_count)
+        self.assertEqual(3, self.safe.call_count)
+
+    def test__output_hosts_file_after_port_change(self):
+        network = FakeDualNetwork()
+        dm = self._get_dnsmasq(network)
+        dm._output_hosts_file()
+        network.ports[0].mac_address = '00:00:80:aa:bb:dd'
+        dm._output_hosts_file()
+        contents = self.safe.call_args[0][1]
+        self.assertIn('00:00:80:aa:bb:dd,', contents)
+        self.assertNotIn('00:00:80:aa:bb:cc,', contents)
+
+    def test__replace_config_file_unchanged(self):
+        path = self.get_temp_file_path('host')
+        with open(path, 'w') as f:
+            f.write('contents')
+        dm = self._get_dnsmasq(FakeDualNetwork())
+        dm._replace_config_file(path, 'contents')
+        self.assertFalse(self.safe.called)
+        self.assertEqual(set(), dm._changed_config_files)
+        dm._replace_config_file(path, 'new contents')
+        self.safe.assert_called_once_with(path, 'new contents')
+        self.assertEqual(set([path]), dm._changed_config_files)
+
+    def test_reload_unchanged_config_does_not_send_hup(self):
+        network = FakeDualNetwork()
+        dm = self._get_dnsmasq(network)
+        mock.patch.dict(dhcp.Dnsmasq._config_stats, clear=True).start()
+        mock.patch.dict(dhcp.Dnsmasq._loaded_config_digests,
+                        clear=True).start()
+        with mock.patch.object(dm, '_output_config_files'):
+            dm._spawn_or_reload_process(reload_with_HUP=True)
+            dm._spawn_or_reload_process(reload_with_HUP=True)
+        self.external_process().enable.assert_called_once_with(
+            reload_cfg=True)
+        stats = dhcp.Dnsmasq._config_stats[network.id]
+        self.assertEqual(1, stats['reloads_skipped'])
+        self.assertEqual(2, stats['config_generations'])
+        self.assertEqual(1, stats['reloads'])
+
+    def test_reload_unchanged_files_sends_hup_once_per_process(self):
+        dm = self._get_dnsmasq(FakeDualNetwork())
+        mock.patch.dict(dhcp.Dnsmasq._loaded_config_digests,
+                        clear=True).start()
+        path = self.get_temp_file_path('host')
+        with open(path, 'w') as f:
+            f.write('contents')
+
+        def output_config_files():
+            dm._replace_config_file(path, 'contents')
+
+        with mock.patch.object(dm, '_output_config_files',
+                               side_effect=output_config_files):
+            dm._spawn_or_reload_process(reload_with_HUP=True)
+        self.assertEqual(set(), dm._changed_config_files)
+        self.external_process().enable.assert_called_once_with(
+            reload_cfg=True)
+
+    def test_reload_after_failed_hup_sends_hup(self):
+        dm = self._get_dnsmasq(FakeDualNetwork())
+        mock.patch.dict(dhcp.Dnsmasq._loaded_config_digests,
+                        clear=True).start()
+        self.external_process().enable.side_effect = [RuntimeError(), None]
+        with mock.patch.object(dm, '_output_config_files'):
+            self.assertRaises(RuntimeError, dm._spawn_or_reload_process,
+                              reload_with_HUP=True)
+            dm._spawn_or_reload_process(reload_with_HUP=True)
+        self.assertEqual(2, self.external_process().enable.call_count)
+
+    def test_reload_changed_config_sends_hup(self):
+        network = FakeDualNetwork()
+        dm = self._get_dnsmasq(network)
+        mock.patch.dict(dhcp.Dnsmasq._loaded_config_digests,
+                        {network.id: 'digest'}, clear=True).start()
+
+        def output_config_files():
+            dm._config_file_digests['/dhcp/host'] = 'digest'
+
+        with mock.patch.object(dm, '_output_config_files',
+                               side_effect=output_config_files):
+            dm._spawn_or_reload_process(reload_with_HUP=True)
+        self.external_process().enable.assert_called_once_with(
+            reload_cfg=True)
+
     def test_only_populates_dhcp_enabled_subnets(self):
         exp_host_name = '/dhcp/eeeeeeee-eeee-eeee-eeee-eeeeeeeeeeee/host'
         exp_host_data = ('00:00:80:aa:bb:cc,host-192-168-0-2.openstacklocal.,'
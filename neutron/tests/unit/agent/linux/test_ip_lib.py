@@ -255,6 +255,116 @@ class TestSubProcessBase(base.BaseTestCase):
                                              log_fail_as_error=True)
 
 
+class TestIPBatch(base.BaseTestCase):
+    def setUp(self):
+        super(TestIPBatch, self).setUp()
+        self.execute = mock.patch('neutron.agent.common.utils.execute').start()
+
+    def test_execute_groups_consecutive_options(self):
+        batch = ip_lib.IPBatch(namespace='ns')
+        batch.add([4], 'addr', ('add', '10.0.0.1/24', 'dev', 'eth0'))
+        batch.add([4], 'route', ('replace', 'default', 'via', '10.0.0.254'))
+        batch.add([6], 'addr', ('add', 'fe80::1/64', 'dev', 'eth0'))
+        batch.execute()
+        self.execute.assert_has_calls([
+            mock.call(['ip', 'netns', 'exec', 'ns', 'ip', '-4', '-batch', '-'],
+                      process_input='addr add 10.0.0.1/24 dev eth0\n'
+                                    'route replace default via 10.0.0.254\n',
+                      run_as_root=True, log_fail_as_error=True),
+            mock.call(['ip', 'netns', 'exec', 'ns', 'ip', '-6', '-batch', '-'],
+                      process_input='addr add fe80::1/64 dev eth0\n',
+                      run_as_root=True, log_fail_as_error=True)])
+        self.assertEqual([], batch.commands)
+
+    def test_execute_empty(self):
+        ip_lib.IPBatch().execute()
+        self.assertFalse(self.execute.called)
+
+    def test_add_invalid_argument(self):
+        batch = ip_lib.IPBatch()
+        for arg in ('eth0\nnetns', 'a b', '', '"a"', '#'):
+            self.assertRaises(ValueError, batch.add, [], 'addr',
+                              ('add', arg))
+        self.assertEqual([], batch.commands)
+
+    def test_device_batch(self):
+        device = ip_lib.IPDevice('eth0', namespace='ns')
+        with device.batch():
+            device.addr.add('10.0.0.1/24')
+            device.neigh.add('10.0.0.2', 'aa:bb:cc:dd:ee:ff')
+            # queries are not batched
+            device.neigh.show(4)
+            self.assertEqual(1, self.execute.call_count)
+        self.assertEqual(2, self.execute.call_count)
+        self.execute.assert_called_with(
+            ['ip', 'netns', 'exec', 'ns', 'ip', '-4', '-batch', '-'],
+            process_input='addr add 10.0.0.1/24 scope global dev eth0 '
+                          'brd 10.0.0.255\n'
+                          'neigh replace 10.0.0.2 lladdr aa:bb:cc:dd:ee:ff '
+                          'nud permanent dev eth0\n',
+            run_as_root=True, log_fail_as_error=True)
+
+    def test_device_batch_failure(self):
+        device = ip_lib.IPDevice('eth0', namespace='ns')
+        error = ValueError()
+        try:
+            with device.batch():
+                device.addr.add('10.0.0.1/24')
+                raise error
+        except ValueError as e:
+            self.assertIs(error, e)
+        else:
+            self.fail('Exception would be reraised')
+        self.assertFalse(self.execute.called)
+        self.assertIsNone(device._batch)
+        # the dropped commands aren't run with the next batch
+        with device.batch():
+            device.addr.add('10.0.0.2/24')
+        self.execute.assert_called_once_with(
+            ['ip', 'netns', 'exec', 'ns', 'ip', '-4', '-batch', '-'],
+            process_input='addr add 10.0.0.2/24 scope global dev eth0 '
+                          'brd 10.0.0.255\n',
+            run_as_root=True, log_fail_as_error=True)
+
+    def test_device_batch_link_not_batched(self):
+        device = ip_lib.IPDevice('eth0')
+        with device.batch():
+            device.link.set_up()
+            self.assertEqual(1, self.execute.call_count)
+
+    def test_execute_callbacks(self):
+        batch = ip_lib.IPBatch()
+        callback = mock.Mock()
+        batch.add([], 'addr', ('add', '10.0.0.1/24', 'dev', 'eth0'))
+        batch.add_callback(callback, 'arg')
+        callback.side_effect = lambda arg: self.assertTrue(
+            self.execute.called)
+        batch.execute()
+        callback.assert_called_once_with('arg')
+        self.assertEqual([], batch.callbacks)
+
+    def test_execute_callbacks_failure(self):
+        self.execute.side_effect = RuntimeError
+        batch = ip_lib.IPBatch()
+        callback = mock.Mock()
+        batch.add([], 'addr', ('add', '10.0.0.1/24', 'dev', 'eth0'))
+        batch.add_callback(callback)
+        self.assertRaises(ip_lib.IPBatchError, batch.execute)
+        self.assertFalse(callback.called)
+
+    def test_device_batch_delete_addr_and_conntrack_state(self):
+        device = ip_lib.IPDevice('eth0', namespace='ns')
+        with device.batch():
+            device.delete_addr_and_conntrack_state('10.0.0.1/32')
+            self.assertFalse(self.execute.called)
+        self.assertEqual(3, self.execute.call_count)
+        self.assertEqual(
+            ['ip', 'netns', 'exec', 'ns', 'ip', '-4', '-batch', '-'],
+            self.execute.call_args_list[0][0][0])
+        self.assertIn('conntrack', self.execute.call_args_list[1][0][0])
+        self.assertIn('conntrack', self.execute.call_args_list[2][0][0])
+
+
 class TestIpWrapper(base.BaseTestCase):
     def setUp(self):
         super(TestIpWrapper, self).setUp()
@@ -1335,6 +1445,35 @@ class TestArpPing(TestIPCmdBase):
                                       config)
         self.assertFalse(spawn_n.called)
 
+    @mock.patch('eventlet.GreenPool')
+    @mock.patch('eventlet.spawn_n')
+    def test_send_ip_addrs_adv_notif(self, spawn_n, pool):
+        spawn_n.side_effect = lambda f: f()
+        config = mock.Mock()
+        config.send_arp_for_ha = 3
+        ip_lib.send_ip_addrs_adv_notif(mock.sentinel.ns_name,
+                                       mock.sentinel.iface_name,
+                                       ['20.0.0.1', 'fd00::1', '20.0.0.2'],
+                                       config)
+        self.assertEqual(1, spawn_n.call_count)
+        pool.assert_called_once_with(ip_lib.GARP_POOL_SIZE)
+        pool.return_value.spawn_n.assert_has_calls([
+            mock.call(ip_lib._arping, mock.sentinel.ns_name,
+                      mock.sentinel.iface_name, '20.0.0.1', 3),
+            mock.call(ip_lib._arping, mock.sentinel.ns_name,
+                      mock.sentinel.iface_name, '20.0.0.2', 3)])
+        self.assertEqual(2, pool.return_value.spawn_n.call_count)
+        pool.return_value.waitall.assert_called_once_with()
+
+    @mock.patch('eventlet.spawn_n')
+    def test_send_ip_addrs_adv_notif_no_ipv4(self, spawn_n):
+        config = mock.Mock()
+        config.send_arp_for_ha = 3
+        ip_lib.send_ip_addrs_adv_notif(mock.sentinel.ns_name,
+                                       mock.sentinel.iface_name,
+                                       ['fd00::1'], config)
+        self.assertFalse(spawn_n.called)
+
 
 class TestAddNamespaceToCmd(base.BaseTestCase):
     def test_add_namespace_to_cmd_with_namespace(self):
@@ -163,3 +163,68 @@ class IpsetManagerTestCase(BaseIpsetManagerTest):
         self.expect_destroy()
         self.ipset.destroy(TEST_SET_ID, ETHERTYPE)
         self.verify_mock_calls()
+
+
+class IpsetManagerDeferApplyTestCase(BaseIpsetManagerTest):
+
+    def _restore_call(self, commands):
+        return mock.call(['ipset', 'restore', '-exist'],
+                         process_input='\n'.join(commands),
+                         run_as_root=True,
+                         check_exit_code=True)
+
+    def test_defer_apply_creates_sets_with_single_restore(self):
+        other_set_name = ipset_manager.IpsetManager.get_name('other', 'IPv6')
+        self.ipset.defer_apply_on()
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[:2])
+        self.ipset.set_members('other', 'IPv6', ['fe80::1'])
+        self.assertTrue(self.ipset.set_name_exists(TEST_SET_NAME))
+        self.assertFalse(self.execute.called)
+        self.ipset.defer_apply_off()
+        self.execute.assert_called_once_with(
+            ['ipset', 'restore', '-exist'],
+            process_input='\n'.join([
+                'create %s hash:net family inet' % TEST_SET_NAME,
+                'create %s hash:net family inet' % TEST_SET_NAME_NEW,
+                'add %s 10.0.0.1/32' % TEST_SET_NAME_NEW,
+                'add %s 10.0.0.2/32' % TEST_SET_NAME_NEW,
+                'swap %s %s' % (TEST_SET_NAME_NEW, TEST_SET_NAME),
+                'destroy %s' % TEST_SET_NAME_NEW,
+                'create %s hash:net family inet6' % other_set_name,
+                'create %s-n hash:net family inet6' % other_set_name,
+                'add %s-n fe80::1/128' % other_set_name,
+                'swap %s-n %s' % (other_set_name, other_set_name),
+                'destroy %s-n' % other_set_name]),
+            run_as_root=True, check_exit_code=True)
+
+    def test_defer_apply_updates_members_with_single_restore(self):
+        self.add_all_ips()
+        self.execute.reset_mock()
+        self.ipset.defer_apply_on()
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE,
+                               FAKE_IPS[2:] + ['10.0.0.7'])
+        self.ipset.defer_apply_off()
+        self.assertEqual(
+            [self._restore_call(['add %s 10.0.0.7/32' % TEST_SET_NAME,
+                                 'del %s 10.0.0.1/32' % TEST_SET_NAME,
+                                 'del %s 10.0.0.2/32' % TEST_SET_NAME])],
+            self.execute.mock_calls)
+        self.assertEqual({'sets_touched': 1, 'members_added': 1,
+                          'members_removed': 2, 'ipset_calls': 1},
+                         self.ipset.sync_stats)
+
+    def test_defer_apply_without_changes(self):
+        self.add_all_ips()
+        self.execute.reset_mock()
+        self.ipset.defer_apply_on()
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS)
+        self.ipset.defer_apply_off()
+        self.assertFalse(self.execute.called)
+        self.assertEqual(0, self.ipset.sync_stats['sets_touched'])
+
+    def test_defer_apply_failure_forgets_sets(self):
+        self.ipset.defer_apply_on()
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS)
+        self.execute.side_effect = RuntimeError
+        self.assertRaises(RuntimeError, self.ipset.defer_apply_off)
+        self.assertFalse(self.ipset.set_name_exists(TEST_SET_NAME))
@@ -1875,6 +1875,71 @@ class IptablesFirewallEnhancedIpsetTestCase(BaseIptablesFirewallTestCase):
 
         self.firewall.ipset.assert_has_calls(calls, True)
 
+    def test_filter_defer_apply_applies_ipsets_before_iptables(self):
+        manager = mock.Mock()
+        manager.attach_mock(self.firewall.ipset, 'ipset')
+        manager.attach_mock(self.iptables_inst, 'iptables')
+        self.firewall.filter_defer_apply_on()
+        self.firewall.filter_defer_apply_off()
+        manager.assert_has_calls([mock.call.iptables.defer_apply_on(),
+                                  mock.call.ipset.defer_apply_on(),
+                                  mock.call.ipset.defer_apply_off(),
+                                  mock.call.iptables.defer_apply_off()])
+
+    def test_sg_rules_compiled_once_for_ports_in_same_sg(self):
+        self.firewall.sg_rules = self._fake_sg_rules()
+        port1 = self._fake_port()
+        port2 = dict(self._fake_port(), device='tapfake_dev2')
+        with mock.patch.object(self.firewall, '_compile_sg_rule',
+                               wraps=self.firewall._compile_sg_rule) as c:
+            self.firewall.prepare_port_filter(port1)
+            self.firewall.prepare_port_filter(port2)
+            self.firewall.update_port_filter(port1)
+        self.assertEqual(2, c.call_count)
+        self.v4filter_inst.add_rule.assert_any_call(
+            'ifake_dev2', '-m set --match-set NIPv4fake_sgid src -j RETURN',
+            comment=None)
+
+    def test_sg_rules_recompiled_on_rule_change(self):
+        self.firewall.sg_rules = self._fake_sg_rules()
+        port = self._fake_port()
+        self.firewall.prepare_port_filter(port)
+        self.firewall.update_security_group_rules(
+            FAKE_SGID, [{'direction': 'ingress', 'ethertype': _IPv4,
+                         'protocol': 'tcp', 'port_range_min': 22,
+                         'port_range_max': 22}])
+        self.v4filter_inst.reset_mock()
+        self.firewall.update_port_filter(port)
+        self.v4filter_inst.add_rule.assert_any_call(
+            'ifake_dev', '-p tcp -m tcp --dport 22 -j RETURN', comment=None)
+        self.assertNotIn(
+            mock.call('ifake_dev',
+                      '-m set --match-set NIPv4fake_sgid src -j RETURN',
+                      comment=None),
+            self.v4filter_inst.add_rule.mock_calls)
+
+    def test_compiled_sg_rules_skip_missing_ipset(self):
+        self.firewall.sg_rules = self._fake_sg_rules()
+        port = self._fake_port()
+        self.firewall.prepare_port_filter(port)
+        self.firewall.ipset.set_name_exists.return_value = False
+        self.v4filter_inst.reset_mock()
+        self.firewall.update_port_filter(port)
+        self.assertNotIn(
+            mock.call('ifake_dev',
+                      '-m set --match-set NIPv4fake_sgid src -j RETURN',
+                      comment=None),
+            self.v4filter_inst.add_rule.mock_calls)
+
+    def test_remove_unused_security_group_info_clears_compiled_rules(self):
+        self._setup_fake_firewall_members_and_rules(self.firewall)
+        self.firewall.prepare_port_filter(self._fake_port())
+        self.assertIn((FAKE_SGID, 'ingress'),
+                      self.firewall._compiled_sg_rules)
+        self.firewall.filtered_ports = {}
+        self.firewall._remove_unused_security_group_info()
+        self.assertFalse(self.firewall._compiled_sg_rules)
+
     def test_sg_rule_expansion_with_remote_ips(self):
         other_ips = ['10.0.0.2', '10.0.0.3', '10.0.0.4']
         self.firewall.sg_members = {'fake_sgid': {
@@ -1099,3 +1099,76 @@ class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def test_mangle_not_found(self):
         self.assertNotIn('mangle', self.iptables.ipv4)
+
+
+class IptablesManagerAppliedStateTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesManagerAppliedStateTestCase, self).setUp()
+        cfg.CONF.set_override('comment_iptables_rules', False, 'AGENT')
+        cfg.CONF.set_override('iptables_state_verify_interval', 60, 'AGENT')
+        self.iptables = iptables_manager.IptablesManager()
+        self.execute = mock.patch.object(self.iptables, "execute").start()
+        self.execute.return_value = ''
+        self.iptables.ipv4['filter'].add_chain('test')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+    def _get_calls(self, cmd):
+        return [call for call in self.execute.mock_calls
+                if call[1][0][0] == cmd]
+
+    def _get_restore_input(self):
+        calls = self._get_calls('iptables-restore')
+        self.assertEqual(1, len(calls))
+        return calls[0][2]['process_input']
+
+    def test_apply_owned_chain_change_skips_save(self):
+        self.iptables.ipv4['filter'].add_rule('test', '-j DROP')
+        self.iptables.apply()
+        self.assertFalse(self._get_calls('iptables-save'))
+        self.assertEqual(
+            '# Generated by iptables_manager\n'
+            '*filter\n'
+            '-I %(bn)s-test 1 -j DROP\n'
+            'COMMIT\n'
+            '# Completed by iptables_manager\n' % IPTABLES_ARG,
+            self._get_restore_input())
+        self.assertEqual(1, self.iptables.apply_stats['saves_skipped'])
+
+    def test_apply_without_changes(self):
+        self.iptables.apply()
+        self.assertFalse(self.execute.called)
+
+    def test_apply_shared_chain_change_runs_save(self):
+        self.iptables.ipv4['filter'].add_rule('FORWARD', '-j DROP',
+                                              wrap=False)
+        self.iptables.apply()
+        self.assertEqual(1, len(self._get_calls('iptables-save')))
+        self.assertIn('-I FORWARD', self._get_restore_input())
+
+    def test_apply_runs_save_when_verification_due(self):
+        self.iptables._last_verification = mock.Mock()
+        self.iptables._last_verification.expired.return_value = True
+        self.iptables.ipv4['filter'].add_rule('test', '-j DROP')
+        self.iptables.apply()
+        self.assertEqual(1, len(self._get_calls('iptables-save')))
+
+    def test_apply_failure_resets_applied_state(self):
+        self.iptables.ipv4['filter'].add_rule('test', '-j DROP')
+        self.execute.side_effect = RuntimeError
+        self.assertRaises(RuntimeError, self.iptables.apply)
+        self.execute.side_effect = None
+        self.execute.reset_mock()
+        self.execute.return_value = ''
+        self.iptables.apply()
+        self.assertEqual(1, len(self._get_calls('iptables-save')))
+
+    def test_apply_stats(self):
+        self.assertEqual(1, self.iptables.apply_stats['applies'])
+        self.assertEqual(1, self.iptables.apply_stats['saves'])
+        self.iptables.apply()
+        self.assertEqual(2, self.iptables.apply_stats['applies'])
+        self.assertGreaterEqual(
+            self.iptables.apply_stats['total_apply_time'],
+            self.iptables.apply_stats['last_apply_time'])
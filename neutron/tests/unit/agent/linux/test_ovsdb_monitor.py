@@ -13,6 +13,7 @@
 #    under the License.
 
 import mock
+from ovs.db import idl
 
 from neutron.agent.common import ovs_lib
 from neutron.agent.linux import ovsdb_monitor
@@ -70,3 +71,77 @@ class TestSimpleInterfaceMonitor(base.BaseTestCase):
             self.monitor.process_events()
             self.assertEqual(self.monitor.new_events['added'][0]['ofport'],
                              ovs_lib.UNASSIGNED_OFPORT)
+
+
+class TestNativeInterfaceMonitor(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNativeInterfaceMonitor, self).setUp()
+        self.monitor = ovsdb_monitor.NativeInterfaceMonitor()
+
+    def _row(self, name, ofport=None, external_ids=None, table='Interface'):
+        row = mock.Mock(ofport=[ofport] if ofport else [],
+                        external_ids=external_ids or {})
+        row.name = name
+        row._table.name = table
+        return row
+
+    def test_start_reports_existing_interfaces(self):
+        connection = mock.Mock()
+        connection.idl.tables = {
+            'Interface': mock.Mock(rows={'uuid': self._row('tap1', 5)})}
+        with mock.patch('oslo_utils.importutils.import_class') as ic:
+            ic.return_value.ovsdb_connection = connection
+            self.monitor.start()
+        connection.start.assert_called_once_with()
+        connection.register_notify_handler.assert_called_once_with(
+            self.monitor._handle_row_event)
+        self.assertTrue(self.monitor.is_active())
+        self.assertEqual(
+            {'added': [{'name': 'tap1', 'ofport': 5, 'external_ids': {}}],
+             'removed': []},
+            self.monitor.get_events())
+        self.monitor.stop()
+        connection.unregister_notify_handler.assert_called_once_with(
+            self.monitor._handle_row_event)
+        self.assertFalse(self.monitor.is_active())
+
+    def test_create_and_delete_events(self):
+        self.monitor._handle_row_event(
+            idl.ROW_CREATE, self._row('tap1', external_ids={'a': 'b'}))
+        self.monitor._handle_row_event(idl.ROW_DELETE, self._row('tap2', 3))
+        self.monitor._handle_row_event(idl.ROW_CREATE,
+                                       self._row('br-int', table='Bridge'))
+        self.assertTrue(self.monitor.has_updates)
+        self.assertEqual(
+            {'added': [{'name': 'tap1',
+                        'ofport': ovs_lib.UNASSIGNED_OFPORT,
+                        'external_ids': {'a': 'b'}}],
+             'removed': [{'name': 'tap2', 'ofport': 3,
+                          'external_ids': {}}]},
+            self.monitor.get_events())
+        self.assertFalse(self.monitor.has_updates)
+
+    def test_ofport_update_refreshes_pending_event(self):
+        self.monitor._handle_row_event(idl.ROW_CREATE, self._row('tap1'))
+        self.monitor._handle_row_event(
+            idl.ROW_UPDATE, self._row('tap1', 7), mock.Mock(spec=['ofport']))
+        self.assertEqual(
+            [{'name': 'tap1', 'ofport': 7, 'external_ids': {}}],
+            self.monitor.get_events()['added'])
+
+    def test_ofport_update_adds_event(self):
+        self.monitor._handle_row_event(
+            idl.ROW_UPDATE, self._row('tap1', 7), mock.Mock(spec=['ofport']))
+        self.assertEqual(
+            [{'name': 'tap1', 'ofport': 7, 'external_ids': {}}],
+            self.monitor.get_events()['added'])
+
+    def test_other_column_update_ignored(self):
+        self.monitor._handle_row_event(
+            idl.ROW_UPDATE, self._row('tap1', 7),
+            mock.Mock(spec=['statistics']))
+        self.monitor._handle_row_event(
+            idl.ROW_UPDATE, self._row('tap1', 7),
+            mock.Mock(spec=['external_ids']))
+        self.assertFalse(self.monitor.has_updates)
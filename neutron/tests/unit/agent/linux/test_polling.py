@@ -15,7 +15,9 @@
 import mock
 
 from neutron.agent.common import base_polling
+from neutron.agent.linux import ovsdb_monitor
 from neutron.agent.linux import polling
+from neutron.plugins.ml2.drivers.openvswitch.agent.common import constants
 from neutron.tests import base
 
 
@@ -63,3 +65,19 @@ class TestInterfacePollingMinimizer(base.BaseTestCase):
     def test__is_polling_required_returns_when_updates_are_present(self):
         with self.mock_has_updates(True):
             self.assertTrue(self.pm._is_polling_required())
+
+    def test_native_monitor(self):
+        with mock.patch.object(ovsdb_monitor.NativeInterfaceMonitor,
+                               'is_supported', return_value=True):
+            pm = polling.InterfacePollingMinimizer(
+                ovsdb_monitor_interface=constants.OVSDB_MONITOR_NATIVE)
+        self.assertIsInstance(pm._monitor,
+                              ovsdb_monitor.NativeInterfaceMonitor)
+
+    def test_native_monitor_not_supported(self):
+        with mock.patch.object(ovsdb_monitor.NativeInterfaceMonitor,
+                               'is_supported', return_value=False):
+            pm = polling.InterfacePollingMinimizer(
+                ovsdb_monitor_interface=constants.OVSDB_MONITOR_NATIVE)
+        self.assertIsInstance(pm._monitor,
+                              ovsdb_monitor.SimpleInterfaceMonitor)
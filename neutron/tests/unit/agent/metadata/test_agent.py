@@ -19,6 +19,7 @@ import webob
 
 from oslo_config import cfg
 from oslo_config import fixture as config_fixture
+import oslo_messaging
 
 from neutron.agent.linux import utils as agent_utils
 from neutron.agent.metadata import agent
@@ -355,7 +356,8 @@ class _TestMetadataProxyHandlerCacheMixin(object):
                 retval = self.handler._proxy_request('the_id', 'tenant_id',
                                                      req)
                 mock_http.assert_called_once_with(
-                    ca_certs=None, disable_ssl_certificate_validation=True)
+                    ca_certs=None, disable_ssl_certificate_validation=True,
+                    timeout=None)
                 mock_http.assert_has_calls([
                     mock.call().add_certificate(
                         self.fake_conf.nova_client_priv_key,
@@ -418,6 +420,52 @@ class _TestMetadataProxyHandlerCacheMixin(object):
             '773ba44693c7553d6ee20f61ea5d2757a9a4f4a44d2841ae4e95b52e4cd62db4'
         )
 
+    def _proxy_request_twice_helper(self, path_info='/the_path',
+                                    method='GET'):
+        self.fake_conf_fixture.config(
+            nova_metadata_cached_paths=['/the_*'])
+        resp = mock.MagicMock(status=200)
+        resp.__getitem__.return_value = 'text/plain'
+        with mock.patch('httplib2.Http') as mock_http:
+            mock_http.return_value.request.return_value = (resp, 'content')
+            for i in range(2):
+                req = mock.Mock(path_info=path_info, query_string='',
+                                headers={'X-Forwarded-For': '8.8.8.8'},
+                                method=method, body='')
+                response = self.handler._proxy_request('the_id',
+                                                       'tenant_id', req)
+                self.assertEqual('text/plain', response.content_type)
+                self.assertEqual('content', response.body)
+            # The connection to the metadata server is reused
+            self.assertEqual(1, mock_http.call_count)
+            return mock_http.return_value.request.call_count
+
+    def test_proxy_request_cached_path(self):
+        self.assertEqual(1, self._proxy_request_twice_helper())
+
+    def test_proxy_request_not_cached_path(self):
+        self.assertEqual(
+            2, self._proxy_request_twice_helper(path_info='/other_path'))
+
+    def test_proxy_request_cached_path_post(self):
+        self.assertEqual(
+            2, self._proxy_request_twice_helper(method='POST'))
+
+    def test_report_stats(self):
+        self.fake_conf_fixture.config(metadata_stats_interval=60)
+        self.handler._stats['port_index_hits'] = 1
+        self.handler._nova_latency.observe(0.2)
+        with mock.patch('time.time',
+                        return_value=self.handler._stats_reported_at + 30):
+            self.handler._report_stats()
+        self.assertFalse(self.log.info.called)
+        with mock.patch('time.time',
+                        return_value=self.handler._stats_reported_at + 60):
+            self.handler._report_stats()
+        self.assertEqual(1, self.log.info.call_count)
+        self.assertFalse(self.handler._stats)
+        self.assertEqual(0, self.handler._nova_latency.count)
+
 
 class TestMetadataProxyHandlerCache(TestMetadataProxyHandlerBase,
                                     _TestMetadataProxyHandlerCacheMixin):
@@ -445,6 +493,280 @@ class TestMetadataProxyHandlerNoCache(TestMetadataProxyHandlerCache):
         self.assertEqual(
             2, self.handler.plugin_rpc.get_ports.call_count)
 
+    def test_proxy_request_cached_path(self):
+        self.assertEqual(2, self._proxy_request_twice_helper())
+
+
+class TestLatencyHistogram(base.BaseTestCase):
+    def test_observe(self):
+        histogram = agent.LatencyHistogram()
+        for latency in (0.001, 0.005, 0.3, 20):
+            histogram.observe(latency)
+        self.assertEqual(4, histogram.count)
+        self.assertEqual([2, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1],
+                         histogram.counts)
+        self.assertIn('count=4 ', str(histogram))
+        self.assertIn('<=0.005s:2 ', str(histogram))
+        self.assertIn('>10s:1', str(histogram))
+        histogram.reset()
+        self.assertEqual(0, histogram.count)
+        self.assertEqual(0, sum(histogram.counts))
+
+
+class TestPortIndex(base.BaseTestCase):
+    def setUp(self):
+        super(TestPortIndex, self).setUp()
+        self.index = agent.PortIndex(max_age=60)
+        self.now = mock.patch.object(agent.timeutils, 'now',
+                                     return_value=1000).start()
+        self.port = {'id': 'port1', 'network_id': 'net1',
+                     'device_id': 'device_id', 'tenant_id': 'tenant_id',
+                     'fixed_ips': [{'ip_address': '10.0.0.3'}]}
+        self.router_ports = [
+            {'id': 'port2', 'network_id': 'net1', 'device_id': 'router1',
+             'fixed_ips': [{'ip_address': '10.0.0.1'}]},
+            {'id': 'port3', 'network_id': 'net2', 'device_id': 'router1',
+             'fixed_ips': [{'ip_address': '10.0.1.1'}]}]
+
+    def test_get_ports_network_id(self):
+        self.index.put_port(self.port)
+        self.assertEqual([self.port],
+                         self.index.get_ports('10.0.0.3', network_id='net1'))
+        self.assertIsNone(self.index.get_ports('10.0.0.4',
+                                               network_id='net1'))
+        self.assertIsNone(self.index.get_ports('10.0.0.3',
+                                               network_id='net2'))
+
+    def test_get_ports_router_id(self):
+        self.index.put_port(self.port)
+        self.assertIsNone(self.index.get_ports('10.0.0.3',
+                                               router_id='router1'))
+        self.index.set_router_ports('router1', self.router_ports)
+        self.assertEqual([self.port],
+                         self.index.get_ports('10.0.0.3',
+                                              router_id='router1'))
+
+    def test_put_port_updated_address(self):
+        self.index.put_port(self.port)
+        port = dict(self.port, fixed_ips=[{'ip_address': '10.0.0.4'}])
+        self.index.put_port(port)
+        self.assertIsNone(self.index.get_ports('10.0.0.3',
+                                               network_id='net1'))
+        self.assertEqual([port],
+                         self.index.get_ports('10.0.0.4', network_id='net1'))
+
+    def test_remove_port(self):
+        self.index.put_port(self.port)
+        self.index.remove_port('port1')
+        self.index.remove_port('unknown')
+        self.assertIsNone(self.index.get_ports('10.0.0.3',
+                                               network_id='net1'))
+
+    def test_remove_router_port(self):
+        self.index.put_port(self.port)
+        self.index.set_router_ports('router1', self.router_ports)
+        self.index.remove_port('port3')
+        self.assertIsNone(self.index.get_ports('10.0.0.3',
+                                               router_id='router1'))
+
+    def test_remove_network(self):
+        self.index.put_port(self.port)
+        self.index.set_router_ports('router1', self.router_ports)
+        self.index.remove_network('net2')
+        self.assertIsNone(self.index.get_ports('10.0.0.3',
+                                               router_id='router1'))
+        self.assertEqual([self.port],
+                         self.index.get_ports('10.0.0.3', network_id='net1'))
+        self.index.remove_network('net1')
+        self.assertIsNone(self.index.get_ports('10.0.0.3',
+                                               network_id='net1'))
+
+
+    def test_get_ports_expired(self):
+        self.index.put_port(self.port)
+        self.index.set_router_ports('router1', self.router_ports)
+        self.now.return_value = 1061
+        self.assertIsNone(self.index.get_ports('10.0.0.3',
+                                               router_id='router1'))
+        self.assertIsNone(self.index.get_ports('10.0.0.3',
+                                               network_id='net1'))
+        # A refreshed port doesn't expire
+        self.index.put_port(self.port)
+        self.assertEqual([self.port],
+                         self.index.get_ports('10.0.0.3', network_id='net1'))
+
+    def test_clear(self):
+        self.index.put_port(self.port)
+        self.index.set_router_ports('router1', self.router_ports)
+        self.index.clear()
+        self.assertIsNone(self.index.get_ports('10.0.0.3',
+                                               network_id='net1'))
+        self.assertIsNone(self.index.get_ports('10.0.0.3',
+                                               router_id='router1'))
+
+
+class TestMetadataProxyHandlerPortIndex(TestMetadataProxyHandlerBase):
+    fake_conf = cfg.CONF
+    fake_conf_fixture = ConfFixture(fake_conf)
+
+    def setUp(self):
+        super(TestMetadataProxyHandlerPortIndex, self).setUp()
+        self.fake_conf_fixture.config(metadata_port_index=True)
+        self.create_consumers = mock.patch.object(
+            agent.agent_rpc, 'create_consumers').start()
+        self.port = {'id': 'port1', 'network_id': 'net1',
+                     'device_id': 'device_id', 'tenant_id': 'tenant_id',
+                     'fixed_ips': [{'ip_address': '192.168.1.1'}]}
+        self.router_port = {'id': 'port2', 'network_id': 'net1',
+                            'device_id': 'router1',
+                            'fixed_ips': [{'ip_address': '192.168.1.254'}]}
+
+    def _get_instance_and_tenant_id(self, headers):
+        headers['X-Forwarded-For'] = '192.168.1.1'
+        req = mock.Mock(headers=headers)
+        return self.handler._get_instance_and_tenant_id(req)
+
+    def test_get_instance_id_network_id(self):
+        get_ports = self.handler.plugin_rpc.get_ports
+        get_ports.return_value = [self.port]
+        headers = {'X-Neutron-Network-ID': 'net1'}
+        for i in range(2):
+            self.assertEqual(('device_id', 'tenant_id'),
+                             self._get_instance_and_tenant_id(headers))
+        self.assertEqual(1, get_ports.call_count)
+        self.assertEqual(1, self.create_consumers.call_count)
+
+    def test_get_instance_id_router_id(self):
+        get_ports = self.handler.plugin_rpc.get_ports
+        get_ports.side_effect = [[self.router_port], [self.port]]
+        headers = {'X-Neutron-Router-ID': 'router1'}
+        for i in range(2):
+            self.assertEqual(('device_id', 'tenant_id'),
+                             self._get_instance_and_tenant_id(headers))
+        self.assertEqual(2, get_ports.call_count)
+
+    def test_get_instance_id_port_deleted(self):
+        get_ports = self.handler.plugin_rpc.get_ports
+        get_ports.side_effect = [[self.port], []]
+        headers = {'X-Neutron-Network-ID': 'net1'}
+        self._get_instance_and_tenant_id(headers)
+        callback = self.create_consumers.call_args[0][0][0]
+        callback.port_delete(mock.ANY, port_id='port1')
+        self.assertEqual((None, None),
+                         self._get_instance_and_tenant_id(headers))
+        self.assertEqual(2, get_ports.call_count)
+
+    def test_get_instance_id_port_updated(self):
+        headers = {'X-Neutron-Network-ID': 'net1'}
+        # Start the consumer of the notifications
+        self.handler._get_port_index()
+        callback = self.create_consumers.call_args[0][0][0]
+        callback.port_update(mock.ANY, port=self.port)
+        self.assertEqual(('device_id', 'tenant_id'),
+                         self._get_instance_and_tenant_id(headers))
+        self.assertFalse(self.handler.plugin_rpc.get_ports.called)
+
+
+    def test_get_instance_id_several_ports_indexed(self):
+        # The deletion of the first port was missed, its address was reused
+        new_port = dict(self.port, id='port3', device_id='device_id2')
+        self.handler._get_port_index()
+        callback = self.create_consumers.call_args[0][0][0]
+        callback.port_update(mock.ANY, port=self.port)
+        callback.port_update(mock.ANY, port=new_port)
+        get_ports = self.handler.plugin_rpc.get_ports
+        get_ports.return_value = [new_port]
+        headers = {'X-Neutron-Network-ID': 'net1'}
+        self.assertEqual(('device_id2', 'tenant_id'),
+                         self._get_instance_and_tenant_id(headers))
+        self.assertEqual(1, get_ports.call_count)
+        # The stale port was removed from the index
+        self.assertEqual(
+            [new_port],
+            self.handler._port_index.get_ports('192.168.1.1', 'net1'))
+
+    def test_port_index_max_age(self):
+        self.fake_conf_fixture.config(metadata_port_index_max_age=60)
+        self.assertEqual(60, self.handler._get_port_index().max_age)
+
+    def test_port_index_max_age_capped_by_cache(self):
+        self.fake_conf_fixture.config(metadata_port_index_max_age=60)
+        self.handler._cache = mock.Mock(expiration_time=5)
+        self.assertEqual(5, self.handler._get_port_index().max_age)
+
+    def test_get_ports_messaging_error_resets_index(self):
+        port_index = self.handler._get_port_index()
+        port_index.put_port(self.port)
+        get_ports = self.handler.plugin_rpc.get_ports
+        get_ports.side_effect = oslo_messaging.MessagingTimeout
+        self.assertRaises(oslo_messaging.MessagingTimeout,
+                          self.handler._get_ports_from_server,
+                          ip_address='192.168.1.2', networks=('net1',))
+        self.assertIsNone(port_index.get_ports('192.168.1.1', 'net1'))
+
+
+class TestMetadataProxyHandlerLookupService(TestMetadataProxyHandlerBase):
+    fake_conf = cfg.CONF
+    fake_conf_fixture = ConfFixture(fake_conf)
+
+    def setUp(self):
+        super(TestMetadataProxyHandlerLookupService, self).setUp()
+        self.handler.use_lookup_service = True
+        self.headers = {'X-Forwarded-For': '192.168.1.1',
+                        'X-Neutron-Network-ID': 'the_id'}
+        self.req = mock.Mock(headers=self.headers)
+
+    def test_get_instance_and_tenant_id(self):
+        resp = mock.Mock(status=200)
+        with mock.patch('httplib2.Http') as mock_http:
+            mock_http.return_value.request.return_value = (
+                resp, '["device_id", "tenant_id"]')
+            self.assertEqual(
+                ('device_id', 'tenant_id'),
+                self.handler._get_instance_and_tenant_id(self.req))
+            mock_http.return_value.request.assert_called_once_with(
+                'http://lookup/', method='GET', headers=self.headers,
+                connection_type=agent.MetadataLookupHTTPConnection)
+        self.assertFalse(self.handler.plugin_rpc.get_ports.called)
+
+    def _test_get_instance_and_tenant_id_lookup_failure(self, status=200,
+                                                        side_effect=None):
+        self.handler.plugin_rpc.get_ports.return_value = [
+            {'device_id': 'device_id', 'tenant_id': 'tenant_id'}]
+        with mock.patch('httplib2.Http') as mock_http:
+            mock_http.return_value.request.return_value = (
+                mock.Mock(status=status), '')
+            mock_http.return_value.request.side_effect = side_effect
+            self.assertEqual(
+                ('device_id', 'tenant_id'),
+                self.handler._get_instance_and_tenant_id(self.req))
+        self.assertEqual(1, self.handler._stats['lookup_service_errors'])
+        self.assertTrue(self.log.warning.called)
+
+    def test_get_instance_and_tenant_id_lookup_error(self):
+        self._test_get_instance_and_tenant_id_lookup_failure(
+            side_effect=IOError)
+
+    def test_get_instance_and_tenant_id_lookup_bad_status(self):
+        self._test_get_instance_and_tenant_id_lookup_failure(status=500)
+
+    def test_lookup_handler(self):
+        handler = agent.MetadataLookupHandler(self.fake_conf)
+        req = webob.Request.blank('/', headers=self.headers)
+        with mock.patch.object(handler, '_get_instance_and_tenant_id',
+                               return_value=('device_id', 'tenant_id')):
+            resp = req.get_response(handler)
+        self.assertEqual(200, resp.status_int)
+        self.assertEqual(['device_id', 'tenant_id'], resp.json)
+
+    def test_lookup_handler_error(self):
+        handler = agent.MetadataLookupHandler(self.fake_conf)
+        req = webob.Request.blank('/', headers=self.headers)
+        with mock.patch.object(handler, '_get_instance_and_tenant_id',
+                               side_effect=Exception):
+            resp = req.get_response(handler)
+        self.assertEqual(500, resp.status_int)
+
 
 class TestUnixDomainMetadataProxy(base.BaseTestCase):
     def setUp(self):
@@ -458,6 +780,7 @@ class TestUnixDomainMetadataProxy(base.BaseTestCase):
         self.cfg.CONF.metadata_workers = 0
         self.cfg.CONF.metadata_backlog = 128
         self.cfg.CONF.metadata_proxy_socket_mode = config.USER_MODE
+        self.cfg.CONF.metadata_lookup_service = False
 
     @mock.patch.object(utils, 'ensure_dir')
     def test_init_doesnot_exists(self, ensure_dir):
@@ -513,6 +836,30 @@ class TestUnixDomainMetadataProxy(base.BaseTestCase):
         self.looping_mock.return_value.start.assert_called_once_with(
             interval=mock.ANY)
 
+    @mock.patch.object(agent, 'MetadataLookupHandler')
+    @mock.patch.object(agent, 'MetadataProxyHandler')
+    @mock.patch.object(agent_utils, 'UnixDomainWSGIServer')
+    @mock.patch.object(utils, 'ensure_dir')
+    def test_run_lookup_service(self, ensure_dir, server, handler,
+                                lookup_handler):
+        self.cfg.CONF.metadata_workers = 2
+        self.cfg.CONF.metadata_lookup_service = True
+        p = agent.UnixDomainMetadataProxy(self.cfg.CONF)
+        p.run()
+
+        handler.assert_called_once_with(self.cfg.CONF, True)
+        server.assert_has_calls([
+            mock.call('neutron-metadata-agent'),
+            mock.call().start(handler.return_value,
+                              '/the/path', workers=2,
+                              backlog=128, mode=0o644),
+            mock.call('neutron-metadata-lookup'),
+            mock.call().start(lookup_handler.return_value,
+                              '/the/path.lookup', workers=0,
+                              backlog=128, mode=0o644),
+            mock.call().wait()]
+        )
+
     def test_main(self):
         with mock.patch.object(agent, 'UnixDomainMetadataProxy') as proxy:
             with mock.patch.object(metadata_agent, 'config') as config:
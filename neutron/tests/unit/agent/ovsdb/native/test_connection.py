@@ -57,3 +57,18 @@ class TestOVSNativeConnection(base.BaseTestCase):
         # a test to cover py34 failure during initialization (LP Bug #1580270)
         # make sure no ValueError: can't have unbuffered text I/O is raised
         connection.TransactionQueue()
+
+    def test_notify_dispatches_to_handlers(self):
+        conn = connection.Connection(mock.Mock(), mock.Mock(), mock.Mock())
+        failing = mock.Mock(side_effect=Exception)
+        handler = mock.Mock()
+        conn.register_notify_handler(failing)
+        conn.register_notify_handler(handler)
+        row = mock.Mock()
+        conn._notify(idl.ROW_CREATE, row)
+        failing.assert_called_once_with(idl.ROW_CREATE, row, None)
+        handler.assert_called_once_with(idl.ROW_CREATE, row, None)
+        conn.unregister_notify_handler(handler)
+        conn.unregister_notify_handler(handler)
+        conn._notify(idl.ROW_DELETE, row)
+        self.assertEqual(1, handler.call_count)
@@ -1394,6 +1394,84 @@ class SecurityGroupAgentEnhancedRpcTestCase(
         self.assertFalse(self.firewall.called)
 
 
+class SecurityGroupAgentDeltaRpcTestCase(BaseSecurityGroupAgentRpcTestCase):
+
+    def setUp(self):
+        super(SecurityGroupAgentDeltaRpcTestCase, self).setUp()
+        self.agent._use_enhanced_rpc = True
+        self.rules = [{'remote_group_id': 'fake_sgid2'}]
+        self.sg_info = {
+            'security_groups': {'fake_sgid1': self.rules},
+            'sg_member_ips': {'fake_sgid2': {'IPv4': {'10.0.0.1'}}},
+            'devices': self.firewall.ports}
+        self.snapshots = securitygroups_rpc.SecurityGroupInfoSnapshots()
+        self.rpc = self.agent.plugin_rpc.security_group_info_for_devices
+        self.rpc.side_effect = self._security_group_info_for_devices
+        self.replies = []
+
+    def _security_group_info_for_devices(self, context, devices,
+                                         sg_versions=None):
+        if sg_versions is None:
+            reply = self.sg_info
+        else:
+            reply = self.snapshots.get_sg_info_delta(self.sg_info,
+                                                     sg_versions)
+        self.replies.append(reply)
+        return reply
+
+    def test_refresh_firewall_uses_delta(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.rpc.assert_called_once_with(
+            None, ['fake_device'],
+            sg_versions={'security_groups': {}, 'sg_member_ips': {}})
+        self.sg_info['sg_member_ips']['fake_sgid2'] = {
+            'IPv4': {'10.0.0.1', '10.0.0.2'}}
+        self.firewall.reset_mock()
+        self.agent.refresh_firewall(['fake_device'])
+        self.assertEqual({}, self.replies[-1]['security_groups'])
+        self.assertEqual({}, self.replies[-1]['sg_member_ips'])
+        self.firewall.update_security_group_rules.assert_called_once_with(
+            'fake_sgid1', self.rules)
+        self.firewall.update_security_group_members.assert_called_once_with(
+            'fake_sgid2', {'IPv4': ['10.0.0.1', '10.0.0.2']})
+
+    def test_delta_mismatch_gets_full_information(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        # the agent cache does not match the versions known by the server
+        self.agent._sg_info_cache['sg_member_ips']['fake_sgid2'] = (
+            self.agent._sg_info_cache['sg_member_ips']['fake_sgid2'][0],
+            {'IPv4': ['10.0.0.9']})
+        self.sg_info['sg_member_ips']['fake_sgid2'] = {'IPv4': {'10.0.0.2'}}
+        self.firewall.reset_mock()
+        self.agent.refresh_firewall(['fake_device'])
+        self.assertEqual(mock.call(None, ['fake_device']),
+                         self.rpc.call_args)
+        self.firewall.update_security_group_members.assert_called_once_with(
+            'fake_sgid2', {'IPv4': {'10.0.0.2'}})
+        self.assertEqual({}, self.agent._sg_info_cache['sg_member_ips'])
+
+    def test_delta_not_supported_by_server(self):
+        self.rpc.side_effect = [oslo_messaging.UnsupportedVersion('1.3'),
+                                self.sg_info, self.sg_info]
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.agent.refresh_firewall(['fake_device'])
+        self.assertFalse(self.agent._use_sg_info_delta)
+        self.assertEqual([mock.call(None, ['fake_device'],
+                                    sg_versions=mock.ANY),
+                          mock.call(None, ['fake_device']),
+                          mock.call(None, ['fake_device'])],
+                         self.rpc.call_args_list)
+
+    def test_remove_devices_filter_prunes_cache(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.assertIn('fake_sgid1',
+                      self.agent._sg_info_cache['security_groups'])
+        self.firewall.ports = {}
+        self.agent.remove_devices_filter(['fake_device'])
+        self.assertEqual({'security_groups': {}, 'sg_member_ips': {}},
+                         self.agent._sg_info_cache)
+
+
 class SecurityGroupAgentRpcWithDeferredRefreshTestCase(
     SecurityGroupAgentRpcTestCase):
 
@@ -71,6 +71,45 @@ class TestDhcpRpcCallback(base.BaseTestCase):
                     {'id': 'b', 'subnets': [subnet], 'ports': []}]
         self.assertEqual(expected, networks)
 
+    def test_get_active_networks_info_with_network_ids(self):
+        self.plugin.get_networks.return_value = [{'id': 'b'}]
+        subnet = {'network_id': 'b', 'id': 'c'}
+        self.plugin.get_ports.return_value = []
+        self.plugin.get_subnets.return_value = [subnet]
+        networks = self.callbacks.get_active_networks_info(
+            mock.Mock(), host='host', network_ids=['b'])
+        self.assertEqual([{'id': 'b', 'subnets': [subnet], 'ports': []}],
+                         networks)
+        self.plugin.get_networks.assert_called_once_with(
+            mock.ANY, filters={'admin_state_up': [True], 'id': ['b']})
+
+    def test_get_active_networks_info_with_network_ids_scheduler(self):
+        with mock.patch.object(utils, 'is_extension_supported',
+                               return_value=True):
+            list_networks = (
+                self.plugin.list_active_networks_on_active_dhcp_agent)
+            list_networks.return_value = [{'id': 'c'}]
+            self.plugin.get_subnets.return_value = []
+            self.plugin.get_ports.return_value = []
+            networks = self.callbacks.get_active_networks_info(
+                mock.Mock(), host='host', network_ids=['c'])
+        self.assertEqual([{'id': 'c', 'subnets': [], 'ports': []}],
+                         networks)
+        list_networks.assert_called_once_with(mock.ANY, 'host',
+                                              network_ids=['c'])
+        self.assertFalse(self.plugin.auto_schedule_networks.called)
+
+    def test_get_active_network_ids(self):
+        with mock.patch.object(utils, 'is_extension_supported',
+                               return_value=True):
+            list_networks = (
+                self.plugin.list_active_networks_on_active_dhcp_agent)
+            list_networks.return_value = [{'id': 'a'}, {'id': 'b'}]
+            network_ids = self.callbacks.get_active_network_ids(
+                mock.Mock(), host='host')
+        self.assertEqual(['a', 'b'], network_ids)
+        self.assertTrue(self.plugin.auto_schedule_networks.called)
+
     def test_get_active_networks_info_with_routed_networks(self):
         self.get_service_plugins.return_value = {
             'segments': self.segment_plugin
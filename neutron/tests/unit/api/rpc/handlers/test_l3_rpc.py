@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import mock
 from oslo_config import cfg
 
 from neutron.api.rpc.handlers import l3_rpc
@@ -65,3 +66,32 @@ class TestL3RpcCallback(testlib_api.SqlTestCase):
         updated_subnet = res[0]
         self.assertEqual(updated_subnet['cidr'], data[subnet['id']])
         self.assertEqual(updated_subnet['allocation_pools'], allocation_pools)
+
+    def _sync_routers(self, routers, **kwargs):
+        self.callbacks._l3plugin = mock.Mock()
+        self.callbacks._l3plugin.get_sync_data.return_value = routers
+        with mock.patch.object(l3_rpc.utils, 'is_extension_supported',
+                               return_value=False):
+            return self.callbacks.sync_routers(self.ctx, host='host',
+                                               **kwargs)
+
+    def test_sync_routers_sets_sync_revision(self):
+        routers = self._sync_routers([{'id': 'r1', 'name': 'a'},
+                                      {'id': 'r2', 'name': 'b'}])
+        self.assertEqual(2, len(routers))
+        self.assertNotEqual(routers[0]['sync_revision'],
+                            routers[1]['sync_revision'])
+        same = self._sync_routers([{'id': 'r1', 'name': 'a'}])
+        self.assertEqual(routers[0]['sync_revision'],
+                         same[0]['sync_revision'])
+
+    def test_sync_routers_returns_stubs_for_unchanged_routers(self):
+        revision = self._sync_routers(
+            [{'id': 'r1', 'name': 'a'}])[0]['sync_revision']
+        routers = self._sync_routers(
+            [{'id': 'r1', 'name': 'a'}, {'id': 'r2', 'name': 'b'}],
+            router_revisions={'r1': revision, 'r2': 'stale'})
+        self.assertEqual({'id': 'r1', 'sync_revision': revision,
+                          'unchanged': True}, routers[0])
+        self.assertEqual('b', routers[1]['name'])
+        self.assertNotIn('unchanged', routers[1])
@@ -33,6 +33,107 @@ class SecurityGroupServerRpcApiTestCase(base.BaseTestCase):
                     'security_group_rules_for_devices',
                     devices=['fake_device'])
 
+    def test_security_group_info_for_devices_with_versions(self):
+        rpcapi = securitygroups_rpc.SecurityGroupServerRpcApi('fake_topic')
+
+        with mock.patch.object(rpcapi.client, 'call') as rpc_mock,\
+                mock.patch.object(rpcapi.client, 'prepare') as prepare_mock:
+            prepare_mock.return_value = rpcapi.client
+            rpcapi.security_group_info_for_devices(
+                'context', ['fake_device'], sg_versions={})
+
+            prepare_mock.assert_called_once_with(version='1.3')
+            rpc_mock.assert_called_once_with(
+                    'context',
+                    'security_group_info_for_devices',
+                    devices=['fake_device'], sg_versions={})
+
+
+class SecurityGroupInfoDeltaTestCase(base.BaseTestCase):
+
+    rules = [{'direction': 'ingress', 'ethertype': 'IPv4'},
+             {'direction': 'egress', 'ethertype': 'IPv4'}]
+
+    def test_rules_version_ignores_order(self):
+        self.assertEqual(
+            securitygroups_rpc.get_rules_version(self.rules),
+            securitygroups_rpc.get_rules_version(self.rules[::-1]))
+        self.assertNotEqual(
+            securitygroups_rpc.get_rules_version(self.rules),
+            securitygroups_rpc.get_rules_version(self.rules[:1]))
+
+    def test_rules_delta(self):
+        new_rules = [self.rules[1], {'direction': 'ingress',
+                                     'ethertype': 'IPv6'}]
+        delta = securitygroups_rpc.get_rules_delta(self.rules, new_rules)
+        self.assertEqual({'added': [new_rules[1]],
+                          'removed': [self.rules[0]]}, delta)
+        self.assertEqual(
+            new_rules,
+            securitygroups_rpc.apply_rules_delta(self.rules, delta))
+
+    def test_member_ips_delta(self):
+        old = {'IPv4': {'10.0.0.1', '10.0.0.2'}, 'IPv6': {'fe80::1'}}
+        new = {'IPv4': {'10.0.0.2', '10.0.0.3'}}
+        delta = securitygroups_rpc.get_member_ips_delta(old, new)
+        self.assertEqual({'IPv4': {'added': ['10.0.0.3'],
+                                   'removed': ['10.0.0.1']},
+                          'IPv6': None}, delta)
+        self.assertEqual(
+            {'IPv4': ['10.0.0.2', '10.0.0.3']},
+            securitygroups_rpc.apply_member_ips_delta(old, delta))
+
+
+class SecurityGroupInfoSnapshotsTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(SecurityGroupInfoSnapshotsTestCase, self).setUp()
+        self.snapshots = securitygroups_rpc.SecurityGroupInfoSnapshots()
+        self.rules = [{'direction': 'ingress', 'remote_group_id': 'sg2'}]
+        self.sg_info = {'devices': {'port1': {}},
+                        'security_groups': {'sg1': self.rules},
+                        'sg_member_ips': {'sg2': {'IPv4': {'10.0.0.1'}}}}
+
+    def test_unknown_groups_are_sent_in_full(self):
+        result = self.snapshots.get_sg_info_delta(self.sg_info, {})
+        self.assertEqual(self.sg_info['security_groups'],
+                         result['security_groups'])
+        self.assertEqual(self.sg_info['sg_member_ips'],
+                         result['sg_member_ips'])
+        self.assertEqual({}, result['security_groups_delta'])
+        self.assertEqual({}, result['sg_member_ips_delta'])
+        self.assertEqual(
+            {'security_groups': {
+                'sg1': securitygroups_rpc.get_rules_version(self.rules)},
+             'sg_member_ips': {
+                'sg2': securitygroups_rpc.get_member_ips_version(
+                    {'IPv4': ['10.0.0.1']})}},
+            result['sg_versions'])
+
+    def test_known_groups_are_sent_as_delta(self):
+        versions = self.snapshots.get_sg_info_delta(
+            self.sg_info, {})['sg_versions']
+        self.sg_info['sg_member_ips']['sg2'] = {
+            'IPv4': {'10.0.0.1', '10.0.0.2'}}
+        result = self.snapshots.get_sg_info_delta(self.sg_info, versions)
+        self.assertEqual({}, result['security_groups'])
+        self.assertEqual({}, result['sg_member_ips'])
+        self.assertEqual({'sg1': {'added': [], 'removed': []}},
+                         result['security_groups_delta'])
+        self.assertEqual(
+            {'sg2': {'IPv4': {'added': ['10.0.0.2'], 'removed': []}}},
+            result['sg_member_ips_delta'])
+
+    def test_evicted_versions_are_sent_in_full(self):
+        self.snapshots.size = 0
+        versions = self.snapshots.get_sg_info_delta(
+            self.sg_info, {})['sg_versions']
+        self.sg_info['sg_member_ips']['sg2'] = {'IPv4': {'10.0.0.2'}}
+        result = self.snapshots.get_sg_info_delta(self.sg_info, versions)
+        self.assertEqual({'sg2': {'IPv4': {'10.0.0.2'}}},
+                         result['sg_member_ips'])
+        self.assertEqual({}, result['sg_member_ips_delta'])
+
 
 class SGAgentRpcCallBackMixinTestCase(base.BaseTestCase):
 
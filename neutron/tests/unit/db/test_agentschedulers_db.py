@@ -624,6 +624,29 @@ class OvsAgentSchedulerTestCase(OvsAgentSchedulerTestCaseBase):
             self.adminContext, host=DHCP_HOSTA)
         self.assertEqual([], nets)
 
+    def test_list_active_networks_on_active_dhcp_agent_network_ids(self):
+        plugin = manager.NeutronManager.get_plugin()
+        list_networks = plugin.list_active_networks_on_active_dhcp_agent
+        with self.network() as net1, self.network() as net2:
+            self._register_agent_states()
+            hosta_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
+                                          DHCP_HOSTA)
+            net1_id = net1['network']['id']
+            self._add_network_to_dhcp_agent(hosta_id, net1_id)
+            self._add_network_to_dhcp_agent(hosta_id,
+                                            net2['network']['id'])
+            with mock.patch.object(plugin, 'get_networks',
+                                   wraps=plugin.get_networks) as get_nets:
+                nets = list_networks(self.adminContext, DHCP_HOSTA,
+                                     network_ids=[net1_id])
+                self.assertEqual([], list_networks(self.adminContext,
+                                                   DHCP_HOSTA,
+                                                   network_ids=[]))
+        self.assertEqual([net1_id], [net['id'] for net in nets])
+        get_nets.assert_called_once_with(
+            self.adminContext,
+            filters={'id': [net1_id], 'admin_state_up': [True]})
+
     def test_reserved_port_after_network_remove_from_dhcp_agent(self):
         helpers.register_dhcp_agent(DHCP_HOSTA)
         hosta_id = self._get_agent_id(constants.AGENT_TYPE_DHCP,
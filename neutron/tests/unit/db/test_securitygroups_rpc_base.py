@@ -0,0 +1,88 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+from neutron.db import securitygroups_rpc_base as sg_rpc_base
+from neutron.tests import base
+
+
+class TestRemoteGroupMemberIpsCoalescer(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestRemoteGroupMemberIpsCoalescer, self).setUp()
+        self.coalescer = sg_rpc_base.RemoteGroupMemberIpsCoalescer()
+        self.queries = []
+        self.ips = {'sg1': {'10.0.0.1'}, 'sg2': {'10.0.0.2'}}
+
+    def _query(self, sg_ids):
+        self.queries.append(sorted(sg_ids))
+        return {sg_id: self.ips[sg_id] for sg_id in sg_ids}
+
+    def _get_in_thread(self, sg_ids, results):
+        def _get():
+            results.append(self.coalescer.get(sg_ids, self._query))
+        thread = threading.Thread(target=_get)
+        thread.start()
+        return thread
+
+    def test_get_without_concurrent_requests(self):
+        result = self.coalescer.get(['sg1', 'sg2'], self._query)
+        self.assertEqual(self.ips, result)
+        self.assertEqual([['sg1', 'sg2']], self.queries)
+        self.assertEqual({'hits': 0, 'misses': 2}, self.coalescer.stats)
+
+    def test_get_returns_copies(self):
+        result = self.coalescer.get(['sg1'], self._query)
+        result['sg1'].add('10.0.0.9')
+        self.assertEqual({'10.0.0.1'}, self.ips['sg1'])
+
+    def test_requests_during_query_share_follow_up_query(self):
+        started = threading.Event()
+        release = threading.Event()
+        query = self._query
+
+        def _blocking_query(sg_ids):
+            result = query(sg_ids)
+            started.set()
+            release.wait()
+            return result
+
+        self._query = _blocking_query
+        results = []
+        first = self._get_in_thread(['sg1'], results)
+        started.wait()
+        # the data changes once the first query has started
+        self.ips['sg1'] = {'10.0.0.1', '10.0.0.3'}
+        self._query = query
+        second = self._get_in_thread(['sg1'], results)
+        third = self._get_in_thread(['sg1'], results)
+        while self.coalescer.stats['hits'] + (
+                self.coalescer.stats['misses']) < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in (first, second, third):
+            thread.join()
+        self.assertEqual([['sg1'], ['sg1']], self.queries)
+        self.assertEqual({'hits': 1, 'misses': 2}, self.coalescer.stats)
+        self.assertEqual(1, results.count({'sg1': {'10.0.0.1'}}))
+        self.assertEqual(2, results.count({'sg1': {'10.0.0.1', '10.0.0.3'}}))
+
+    def test_query_error_is_raised(self):
+        def _failing_query(sg_ids):
+            raise ValueError()
+
+        self.assertRaises(ValueError, self.coalescer.get, ['sg1'],
+                          _failing_query)
+        self.assertEqual({'sg1': {'10.0.0.1'}},
+                         self.coalescer.get(['sg1'], self._query))
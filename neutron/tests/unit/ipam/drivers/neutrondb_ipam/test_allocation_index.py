@@ -0,0 +1,154 @@
+# Copyright 2016 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import netaddr
+
+from neutron.ipam.drivers.neutrondb_ipam import allocation_index
+from neutron.tests import base
+
+
+def _index(first, last, allocated=()):
+    return allocation_index.FreeRangeIndex(
+        netaddr.IPAddress(first), netaddr.IPAddress(last),
+        netaddr.IPAddress(first).version, allocated)
+
+
+class TestFreeRangeIndex(base.BaseTestCase):
+
+    def test_build_without_allocations(self):
+        index = _index('10.0.0.2', '10.0.0.254')
+        self.assertEqual(253, index.size)
+        self.assertEqual(1, len(index))
+
+    def test_build_with_allocations(self):
+        index = _index('10.0.0.2', '10.0.0.10',
+                       ['10.0.0.2', '10.0.0.5', '10.0.0.6', '10.0.0.10',
+                        '10.0.1.1'])
+        self.assertEqual(5, index.size)
+        self.assertEqual(2, len(index))
+        self.assertEqual(['10.0.0.3', '10.0.0.4', '10.0.0.7'],
+                         index.candidates(3))
+
+    def test_candidates_span_ranges(self):
+        index = _index('10.0.0.2', '10.0.0.10', ['10.0.0.3', '10.0.0.5'])
+        self.assertEqual(['10.0.0.2', '10.0.0.4', '10.0.0.6', '10.0.0.7'],
+                         index.candidates(4))
+
+    def test_candidates_v6(self):
+        index = _index('fe80::2', 'fe80::ffff', ['fe80::2'])
+        self.assertEqual(['fe80::3', 'fe80::4'], index.candidates(2))
+
+    def test_allocate_splits_range(self):
+        index = _index('10.0.0.2', '10.0.0.10')
+        self.assertTrue(index.allocate('10.0.0.5'))
+        self.assertEqual(2, len(index))
+        self.assertEqual(8, index.size)
+        self.assertFalse(index.is_free('10.0.0.5'))
+        self.assertTrue(index.is_free('10.0.0.4'))
+        self.assertTrue(index.is_free('10.0.0.6'))
+
+    def test_allocate_edges(self):
+        index = _index('10.0.0.2', '10.0.0.4')
+        self.assertTrue(index.allocate('10.0.0.2'))
+        self.assertTrue(index.allocate('10.0.0.4'))
+        self.assertEqual(['10.0.0.3'], index.candidates(10))
+        self.assertTrue(index.allocate('10.0.0.3'))
+        self.assertEqual(0, index.size)
+        self.assertEqual(0, len(index))
+        self.assertEqual([], index.candidates(10))
+
+    def test_allocate_not_free(self):
+        index = _index('10.0.0.2', '10.0.0.4', ['10.0.0.3'])
+        self.assertFalse(index.allocate('10.0.0.3'))
+        self.assertFalse(index.allocate('10.0.0.20'))
+        self.assertEqual(2, index.size)
+
+    def test_release_merges_ranges(self):
+        index = _index('10.0.0.2', '10.0.0.10', ['10.0.0.5'])
+        self.assertTrue(index.release('10.0.0.5'))
+        self.assertEqual(1, len(index))
+        self.assertEqual(9, index.size)
+
+    def test_release_adjacent(self):
+        index = _index('10.0.0.2', '10.0.0.10',
+                       ['10.0.0.5', '10.0.0.6', '10.0.0.7'])
+        self.assertTrue(index.release('10.0.0.5'))
+        self.assertTrue(index.release('10.0.0.7'))
+        self.assertEqual(2, len(index))
+        self.assertTrue(index.release('10.0.0.6'))
+        self.assertEqual(1, len(index))
+
+    def test_release_isolated(self):
+        index = _index('10.0.0.2', '10.0.0.10',
+                       ['10.0.0.4', '10.0.0.5', '10.0.0.6'])
+        self.assertTrue(index.release('10.0.0.5'))
+        self.assertEqual(3, len(index))
+        self.assertEqual(['10.0.0.2', '10.0.0.3', '10.0.0.5'],
+                         index.candidates(3))
+
+    def test_release_free_or_outside(self):
+        index = _index('10.0.0.2', '10.0.0.10')
+        self.assertFalse(index.release('10.0.0.3'))
+        self.assertFalse(index.release('10.0.0.11'))
+        self.assertEqual(9, index.size)
+
+
+class TestSubnetAllocationIndex(base.BaseTestCase):
+
+    pools = [('pool-1', '10.0.0.2', '10.0.0.3'),
+             ('pool-2', '10.0.0.10', '10.0.0.12')]
+
+    def test_allocations_split_across_pools(self):
+        index = allocation_index.SubnetAllocationIndex(
+            self.pools, 4, ['10.0.0.2', '10.0.0.11'])
+        self.assertEqual(3, index.size)
+        self.assertEqual(['10.0.0.3'], index.pools[0][1].candidates(5))
+        self.assertEqual(['10.0.0.10', '10.0.0.12'],
+                         index.pools[1][1].candidates(5))
+
+    def test_allocate_and_release(self):
+        index = allocation_index.SubnetAllocationIndex(self.pools, 4, [])
+        self.assertTrue(index.allocate('10.0.0.11'))
+        self.assertFalse(index.allocate('10.0.0.11'))
+        self.assertEqual(4, index.size)
+        self.assertTrue(index.release('10.0.0.11'))
+        self.assertFalse(index.release('10.0.0.50'))
+        self.assertEqual(5, index.size)
+
+
+class TestAllocationIndexCache(base.BaseTestCase):
+
+    pools = [('pool-1', '10.0.0.2', '10.0.0.3')]
+
+    def test_get_returns_built_index(self):
+        cache = allocation_index.AllocationIndexCache()
+        self.assertIsNone(cache.get('subnet', self.pools))
+        index = cache.build('subnet', self.pools, 4, [])
+        self.assertIs(index, cache.get('subnet', self.pools))
+        self.assertIs(index, cache.lookup('subnet'))
+
+    def test_get_invalidates_on_pool_change(self):
+        cache = allocation_index.AllocationIndexCache()
+        cache.build('subnet', self.pools, 4, [])
+        self.assertIsNone(
+            cache.get('subnet', [('pool-2', '10.0.0.2', '10.0.0.3')]))
+        self.assertIsNone(cache.lookup('subnet'))
+
+    def test_invalidate(self):
+        cache = allocation_index.AllocationIndexCache()
+        cache.build('subnet', self.pools, 4, [])
+        cache.invalidate('subnet')
+        cache.invalidate('subnet')
+        self.assertIsNone(cache.lookup('subnet'))
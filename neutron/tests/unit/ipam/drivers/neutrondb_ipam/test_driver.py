@@ -357,6 +357,86 @@ class TestNeutronDbIpamSubnet(testlib_api.SqlTestCase,
                           ipam_subnet.allocate,
                           ipam_req.AnyAddressRequest)
 
+    def test_allocate_any_address_uses_allocation_index(self):
+        ipam_subnet = self._create_and_allocate_ipam_subnet(
+            '10.0.0.0/24', ip_version=4)[0]
+        with self.ctx.session.begin(subtransactions=True):
+            first_ip = ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+        with mock.patch.object(ipam_subnet.subnet_manager,
+                               'list_allocations') as list_allocs:
+            with self.ctx.session.begin(subtransactions=True):
+                ip_address = ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+        self.assertFalse(list_allocs.called)
+        self.assertNotEqual(first_ip, ip_address)
+
+    def test_allocate_prefer_next_address_sees_other_deallocations(self):
+        ipam_subnet = self._create_and_allocate_ipam_subnet(
+            '10.0.0.0/24', ip_version=4)[0]
+        with self.ctx.session.begin(subtransactions=True):
+            ip_address = ipam_subnet.allocate(
+                ipam_req.PreferNextAddressRequest())
+            ipam_subnet.allocate(ipam_req.PreferNextAddressRequest())
+        # Simulate a deallocation performed by another server process
+        with self.ctx.session.begin(subtransactions=True):
+            ipam_subnet.subnet_manager.delete_allocation(self.ctx.session,
+                                                         ip_address)
+        with self.ctx.session.begin(subtransactions=True):
+            self.assertEqual(ip_address, ipam_subnet.allocate(
+                ipam_req.PreferNextAddressRequest()))
+
+    def test_allocate_rollback_does_not_update_allocation_index(self):
+        ipam_subnet = self._create_and_allocate_ipam_subnet(
+            '192.168.0.0/30', ip_version=4)[0]
+
+        def allocate_and_fail():
+            with self.ctx.session.begin(subtransactions=True):
+                ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+                raise ValueError()
+
+        self.assertRaises(ValueError, allocate_and_fail)
+        with mock.patch.object(ipam_subnet.subnet_manager,
+                               'list_allocations') as list_allocs:
+            with self.ctx.session.begin(subtransactions=True):
+                self.assertEqual(
+                    '192.168.0.2',
+                    ipam_subnet.allocate(ipam_req.AnyAddressRequest))
+        self.assertFalse(list_allocs.called)
+
+    def test_allocate_any_address_skips_stale_index_entries(self):
+        ipam_subnet = self._create_and_allocate_ipam_subnet(
+            '10.0.0.0/24', ip_version=4)[0]
+        ipam_subnet.allocate(ipam_req.PreferNextAddressRequest())
+        # Simulate an allocation performed by another server process
+        ipam_subnet.subnet_manager.create_allocation(self.ctx.session,
+                                                     '10.0.0.3')
+        ip_address = ipam_subnet.allocate(ipam_req.PreferNextAddressRequest())
+        self.assertEqual('10.0.0.4', ip_address)
+
+    def test_allocate_any_address_rebuilds_exhausted_index(self):
+        ipam_subnet = self._create_and_allocate_ipam_subnet(
+            '192.168.0.0/30', ip_version=4)[0]
+        ip_address = ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+        # Simulate a deallocation performed by another server process
+        ipam_subnet.subnet_manager.delete_allocation(self.ctx.session,
+                                                     ip_address)
+        self.assertEqual(ip_address,
+                         ipam_subnet.allocate(ipam_req.AnyAddressRequest))
+
+    def test_deallocate_releases_address_in_allocation_index(self):
+        ipam_subnet = self._create_and_allocate_ipam_subnet(
+            '192.168.0.0/30', ip_version=4)[0]
+        with self.ctx.session.begin(subtransactions=True):
+            ip_address = ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+        with self.ctx.session.begin(subtransactions=True):
+            ipam_subnet.deallocate(ip_address)
+        with mock.patch.object(ipam_subnet.subnet_manager,
+                               'list_allocations') as list_allocs:
+            with self.ctx.session.begin(subtransactions=True):
+                self.assertEqual(
+                    ip_address,
+                    ipam_subnet.allocate(ipam_req.AnyAddressRequest))
+        self.assertFalse(list_allocs.called)
+
     def _test_deallocate_address(self, cidr, ip_version):
         ipam_subnet = self._create_and_allocate_ipam_subnet(
             cidr, ip_version=ip_version)[0]
@@ -1024,3 +1024,134 @@ class TestL2PopulationMechDriver(base.BaseTestCase):
         mech_driver = l2pop_mech_driver.L2populationMechanismDriver()
         with testtools.ExpectedException(ml2_exc.MechanismDriverError):
             mech_driver.update_port_precommit(ctx)
+
+    def _fdb_entries(self, agent_ip, entries, network_id='network_id'):
+        return {network_id: {'segment_id': 1,
+                             'network_type': 'vxlan',
+                             'ports': {agent_ip: entries}}}
+
+    def test_notify_fdb_entries_batched(self):
+        mech_driver = l2pop_mech_driver.L2populationMechanismDriver()
+        mech_driver._fdb_notifier = mock.Mock()
+        mech_driver.L2populationAgentNotify = mock.Mock()
+        fdb_entries = self._fdb_entries('20.0.0.1',
+                                        [constants.FLOODING_ENTRY])
+        mech_driver._notify_fdb_entries('add_fdb_entries', fdb_entries)
+        mech_driver._notify_fdb_entries('remove_fdb_entries', None)
+        mech_driver._fdb_notifier.queue_event.assert_called_once_with(
+            ('add_fdb_entries', fdb_entries))
+        self.assertFalse(
+            mech_driver.L2populationAgentNotify.add_fdb_entries.called)
+
+    def test_send_fdb_events_coalesced(self):
+        mech_driver = l2pop_mech_driver.L2populationMechanismDriver()
+        mech_driver.rpc_ctx = mock.Mock()
+        notifier = mech_driver.L2populationAgentNotify = mock.Mock()
+        port1 = l2pop_rpc.PortInfo(mac_address='00:00:DE:AD:BE:EF',
+                                   ip_address='1.1.1.1')
+        port2 = l2pop_rpc.PortInfo(mac_address='00:00:DE:AD:BE:FF',
+                                   ip_address='1.1.1.2')
+        mech_driver._send_fdb_events([
+            ('add_fdb_entries',
+             self._fdb_entries('20.0.0.1',
+                               [constants.FLOODING_ENTRY, port1])),
+            ('add_fdb_entries', self._fdb_entries('20.0.0.1', [port2])),
+            ('remove_fdb_entries', self._fdb_entries('20.0.0.1', [port1]))])
+
+        notifier.remove_fdb_entries.assert_called_once_with(
+            mech_driver.rpc_ctx, self._fdb_entries('20.0.0.1', [port1]))
+        notifier.add_fdb_entries.assert_called_once_with(
+            mech_driver.rpc_ctx,
+            self._fdb_entries('20.0.0.1', [constants.FLOODING_ENTRY, port2]))
+
+    def test_send_fdb_events_ip_change_ordered(self):
+        mech_driver = l2pop_mech_driver.L2populationMechanismDriver()
+        mech_driver.rpc_ctx = mock.Mock()
+        notifier = mech_driver.L2populationAgentNotify = mock.Mock()
+        add_fdb_entries = self._fdb_entries('20.0.0.1',
+                                            [constants.FLOODING_ENTRY])
+        upd_fdb_entries = {'chg_ip': {'network_id': {'20.0.0.1': {}}}}
+        mech_driver._send_fdb_events([
+            ('add_fdb_entries', add_fdb_entries),
+            ('update_fdb_entries', upd_fdb_entries)])
+
+        self.assertEqual(
+            [mock.call.add_fdb_entries(mech_driver.rpc_ctx, add_fdb_entries),
+             mock.call.update_fdb_entries(mech_driver.rpc_ctx,
+                                          upd_fdb_entries)],
+            notifier.mock_calls)
+
+    def test_send_fdb_events_network_failure(self):
+        mech_driver = l2pop_mech_driver.L2populationMechanismDriver()
+        mech_driver.rpc_ctx = mock.Mock()
+        notifier = mech_driver.L2populationAgentNotify = mock.Mock()
+        fdb_entries1 = self._fdb_entries('20.0.0.1',
+                                         [constants.FLOODING_ENTRY],
+                                         network_id='network_id1')
+        fdb_entries2 = self._fdb_entries('20.0.0.1',
+                                         [constants.FLOODING_ENTRY],
+                                         network_id='network_id2')
+        notifier.add_fdb_entries.side_effect = [RuntimeError, None]
+        mech_driver._send_fdb_events([
+            ('add_fdb_entries', fdb_entries1),
+            ('add_fdb_entries', fdb_entries2)])
+
+        self.assertEqual(
+            [mock.call(mech_driver.rpc_ctx, fdb_entries1),
+             mock.call(mech_driver.rpc_ctx, fdb_entries2)],
+            notifier.add_fdb_entries.call_args_list)
+
+    def test_send_fdb_events_agent_fdb_failure(self):
+        mech_driver = l2pop_mech_driver.L2populationMechanismDriver()
+        agent, agent2 = mock.Mock(host=HOST), mock.Mock(host=HOST_2)
+        segment = {'segmentation_id': 1, 'network_type': 'vxlan'}
+        with mock.patch.object(mech_driver, '_get_network_fdb',
+                               side_effect=[RuntimeError, {}]) as get_fdb,\
+                mock.patch.object(mech_driver, '_send_agent_fdb',
+                                  side_effect=[RuntimeError, None]) as send,\
+                mock.patch.object(l2pop_mech_driver.db_api, 'get_session'):
+            mech_driver._send_fdb_events([
+                ('agent_fdb', agent, segment, 'network_id1'),
+                ('agent_fdb', agent2, segment, 'network_id1'),
+                ('agent_fdb', agent, segment, 'network_id2'),
+                ('agent_fdb', agent2, segment, 'network_id2')])
+
+        self.assertEqual(2, get_fdb.call_count)
+        self.assertEqual(
+            [mock.call(mock.ANY, agent, segment, 'network_id2', {}),
+             mock.call(mock.ANY, agent2, segment, 'network_id2', {})],
+            send.call_args_list)
+
+    def test_send_fdb_events_agent_fdb_built_once_per_network(self):
+        mech_driver = l2pop_mech_driver.L2populationMechanismDriver()
+        mech_driver.rpc_ctx = mock.Mock()
+        notifier = mech_driver.L2populationAgentNotify = mock.Mock()
+        network_ports, agent = self._mock_network_ports(HOST, [None])
+        network_ports2, agent2 = self._mock_network_ports(HOST_2, [None])
+        agent_ips = {agent: '20.0.0.1', agent2: '20.0.0.2'}
+        segment = {'segmentation_id': 1, 'network_type': 'vxlan'}
+        with mock.patch.object(l2pop_db, 'get_agent_ip',
+                               side_effect=agent_ips.get),\
+                mock.patch.object(l2pop_db,
+                                  'get_nondistributed_active_network_ports',
+                                  return_value=[]),\
+                mock.patch.object(l2pop_db,
+                                  'get_distributed_active_network_ports',
+                                  return_value=network_ports +
+                                  network_ports2) as get_ports,\
+                mock.patch.object(l2pop_mech_driver.db_api, 'get_session'):
+            mech_driver._send_fdb_events([
+                ('agent_fdb', agent, segment, 'network_id'),
+                ('agent_fdb', agent2, segment, 'network_id'),
+                ('agent_fdb', agent, segment, 'network_id')])
+
+        self.assertEqual(1, get_ports.call_count)
+        notifier.add_fdb_entries.assert_has_calls([
+            mock.call(mech_driver.rpc_ctx,
+                      self._fdb_entries('20.0.0.2',
+                                        [constants.FLOODING_ENTRY]),
+                      HOST),
+            mock.call(mech_driver.rpc_ctx,
+                      self._fdb_entries('20.0.0.1',
+                                        [constants.FLOODING_ENTRY]),
+                      HOST_2)])
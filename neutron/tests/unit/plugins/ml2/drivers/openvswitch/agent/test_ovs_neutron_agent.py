@@ -1191,6 +1191,7 @@ class TestOvsNeutronAgent(object):
                 mock.call.phys_br_cls('br-eth'),
                 mock.call.phys_br.create(),
                 mock.call.phys_br.setup_controllers(mock.ANY),
+                mock.call.phys_br.start_flows_reconciliation(),
                 mock.call.phys_br.setup_default_table(),
                 mock.call.int_br.db_get_val('Interface', 'int-br-eth',
                                             'type', log_errors=False),
@@ -1305,6 +1306,7 @@ class TestOvsNeutronAgent(object):
                 mock.call.phys_br_cls('br-eth'),
                 mock.call.phys_br.create(),
                 mock.call.phys_br.setup_controllers(mock.ANY),
+                mock.call.phys_br.start_flows_reconciliation(),
                 mock.call.phys_br.setup_default_table(),
                 mock.call.int_br.delete_port('int-br-eth'),
                 mock.call.phys_br.delete_port('phy-br-eth'),
@@ -1372,6 +1374,8 @@ class TestOvsNeutronAgent(object):
                                   return_value=False),\
                 mock.patch.object(self.agent.int_br, 'port_exists',
                                   return_value=False),\
+                mock.patch.object(self.agent.tun_br,
+                                  'start_flows_reconciliation') as start,\
                 mock.patch.object(sys, "exit"):
             self.agent.setup_tunnel_br(None)
             self.agent.setup_tunnel_br()
@@ -1379,6 +1383,7 @@ class TestOvsNeutronAgent(object):
             self.assertTrue(setup_controllers.called)
             self.assertTrue(int_patch_port.called)
             self.assertTrue(tun_patch_port.called)
+            self.assertTrue(start.called)
 
     def test_setup_tunnel_br_ports_exits_drop_flows(self):
         cfg.CONF.set_override('drop_flows_on_start', True, 'AGENT')
@@ -1402,6 +1407,8 @@ class TestOvsNeutronAgent(object):
             self.assertFalse(int_patch_port.called)
             self.assertFalse(tun_patch_port.called)
             self.assertTrue(delete.called)
+            self.assertFalse(
+                self.agent.tun_br.start_flows_reconciliation.called)
 
     def test_setup_tunnel_port(self):
         self.agent.tun_br = mock.Mock()
@@ -1621,8 +1628,9 @@ class TestOvsNeutronAgent(object):
             'neutron.agent.common.polling.get_polling_manager') as mock_get_pm:
             with mock.patch.object(self.agent, 'rpc_loop') as mock_loop:
                 self.agent.daemon_loop()
-        mock_get_pm.assert_called_with(True,
-                                       constants.DEFAULT_OVSDBMON_RESPAWN)
+        mock_get_pm.assert_called_with(
+            True, constants.DEFAULT_OVSDBMON_RESPAWN,
+            ovsdb_monitor_interface=constants.OVSDB_MONITOR_OVSDB_CLIENT)
         mock_loop.assert_called_once_with(polling_manager=mock.ANY)
 
     def test_setup_tunnel_port_invalid_ofport(self):
@@ -2079,21 +2087,44 @@ class TestOvsNeutronAgentOFCtl(TestOvsNeutronAgent,
         with mock.patch.object(self.agent.int_br,
                               'dump_flows_all_tables') as dump_flows,\
                 mock.patch.object(self.agent.int_br,
-                                  'delete_flows') as del_flow:
+                                  'do_action_flows') as do_action_flows:
             self.agent.int_br.set_agent_uuid_stamp(1234)
             dump_flows.return_value = [
                 'cookie=0x4d2, duration=50.156s, table=0,actions=drop',
                 'cookie=0x4321, duration=54.143s, table=2, priority=0',
                 'cookie=0x2345, duration=50.125s, table=2, priority=0',
+                'cookie=0x2345, duration=50.125s, table=2, priority=1',
                 'cookie=0x4d2, duration=52.112s, table=3, actions=drop',
             ]
             self.agent.iter_num = 3
             self.agent.cleanup_stale_flows()
-            expected = [
-                mock.call(cookie='0x4321/-1', table='2'),
-                mock.call(cookie='0x2345/-1', table='2'),
-            ]
-            self.assertEqual(expected, del_flow.mock_calls)
+            do_action_flows.assert_called_once_with('del', [
+                {'cookie': '0x2345/-1', 'table': '2'},
+                {'cookie': '0x4321/-1', 'table': '2'},
+            ])
+            self.assertFalse(self.agent.reconcile_flows)
+
+    def test_cleanup_stale_flows_finishes_reconciliation(self):
+        with mock.patch.object(self.agent.int_br,
+                               'finish_flows_reconciliation') as finish,\
+                mock.patch.object(self.agent.int_br,
+                                  'cleanup_flows') as cleanup:
+            parent = mock.Mock()
+            parent.attach_mock(finish, 'finish_flows_reconciliation')
+            parent.attach_mock(cleanup, 'cleanup_flows')
+            self.agent.cleanup_stale_flows()
+        self.assertEqual([mock.call.finish_flows_reconciliation(),
+                          mock.call.cleanup_flows()], parent.mock_calls)
+
+    def test_cleanup_stale_flows_reconciliation_failure(self):
+        with mock.patch.object(self.agent.int_br,
+                               'finish_flows_reconciliation',
+                               return_value=False),\
+                mock.patch.object(self.agent.int_br,
+                                  'cleanup_flows') as cleanup:
+            self.agent.cleanup_stale_flows()
+        self.assertFalse(cleanup.called)
+        self.assertFalse(self.agent.reconcile_flows)
 
 
 class TestOvsNeutronAgentRyu(TestOvsNeutronAgent,
@@ -201,12 +201,14 @@ class TunnelTest(object):
             mock.call.create(),
             mock.call.set_secure_mode(),
             mock.call.setup_controllers(mock.ANY),
+            mock.call.start_flows_reconciliation(),
             mock.call.setup_default_table(),
         ]
 
         self.mock_map_tun_bridge_expected = [
             mock.call.create(),
             mock.call.setup_controllers(mock.ANY),
+            mock.call.start_flows_reconciliation(),
             mock.call.setup_default_table(),
             mock.call.port_exists('phy-%s' % self.MAP_TUN_BRIDGE),
             mock.call.add_patch_port('phy-%s' % self.MAP_TUN_BRIDGE,
@@ -243,6 +245,7 @@ class TunnelTest(object):
             mock.call.port_exists('patch-int'),
             nonzero(mock.call.port_exists()),
             mock.call.add_patch_port('patch-int', 'patch-tun'),
+            mock.call.start_flows_reconciliation(),
         ]
         self.mock_int_bridge_expected += [
             mock.call.port_exists('patch-tun'),
@@ -558,13 +561,16 @@ class TunnelTest(object):
 
         self.mock_int_bridge_expected += [
             mock.call.check_canary_table(),
+            mock.call.finish_flows_reconciliation(),
             mock.call.cleanup_flows(),
             mock.call.check_canary_table()
         ]
         self.mock_tun_bridge_expected += [
+            mock.call.finish_flows_reconciliation(),
             mock.call.cleanup_flows()
         ]
         self.mock_map_tun_bridge_expected += [
+            mock.call.finish_flows_reconciliation(),
             mock.call.cleanup_flows()
         ]
         # No cleanup is expected on ancillary bridge
@@ -659,12 +665,14 @@ class TunnelTestUseVethInterco(TunnelTest):
             mock.call.create(),
             mock.call.set_secure_mode(),
             mock.call.setup_controllers(mock.ANY),
+            mock.call.start_flows_reconciliation(),
             mock.call.setup_default_table(),
         ]
 
         self.mock_map_tun_bridge_expected = [
             mock.call.create(),
             mock.call.setup_controllers(mock.ANY),
+            mock.call.start_flows_reconciliation(),
             mock.call.setup_default_table(),
             mock.call.add_port(self.intb),
         ]
@@ -691,6 +699,7 @@ class TunnelTestUseVethInterco(TunnelTest):
             mock.call.port_exists('patch-int'),
             nonzero(mock.call.port_exists()),
             mock.call.add_patch_port('patch-int', 'patch-tun'),
+            mock.call.start_flows_reconciliation(),
         ]
         self.mock_int_bridge_expected += [
             mock.call.port_exists('patch-tun'),
@@ -229,6 +229,55 @@ class Ml2DBTestCase(testlib_api.SqlTestCase):
         port = ml2_db.get_port(self.ctx.session, port_id)
         self.assertIsNone(port)
 
+    def test_partial_port_ids_to_full_ids(self):
+        network_id = 'foo-network-id'
+        port_id = uuidutils.generate_uuid()
+        self._setup_neutron_network(network_id)
+        self._setup_neutron_port(network_id, port_id)
+        self._setup_neutron_port(network_id, 'foo-port-id-one')
+        self._setup_neutron_port(network_id, 'foo-port-id-two')
+
+        result = ml2_db.partial_port_ids_to_full_ids(
+            self.ctx.session,
+            [port_id, port_id[:11], 'foo-port-id-o', 'foo-port-id',
+             uuidutils.generate_uuid()])
+        self.assertEqual({port_id: port_id,
+                          port_id[:11]: port_id,
+                          'foo-port-id-o': 'foo-port-id-one'}, result)
+
+    def test_get_port_db_objects(self):
+        network_id = 'foo-network-id'
+        self._setup_neutron_network(network_id)
+        self._setup_neutron_port(network_id, 'foo-port-id-one')
+        self._setup_neutron_port(network_id, 'foo-port-id-two')
+
+        ports = ml2_db.get_port_db_objects(
+            self.ctx.session, ['foo-port-id-one', 'foo-port-id-two',
+                               'foo-port-id'])
+        self.assertEqual({'foo-port-id-one', 'foo-port-id-two'}, set(ports))
+        self.assertEqual({}, ml2_db.get_port_db_objects(self.ctx.session, []))
+
+    def test_get_binding_levels_for_ports(self):
+        network_id = 'foo-network-id'
+        self._setup_neutron_network(network_id)
+        levels = []
+        for port_id in ('foo-port-id-one', 'foo-port-id-two'):
+            self._setup_neutron_port(network_id, port_id)
+            for level in (1, 0):
+                levels.append(models.PortBindingLevel(
+                    port_id=port_id, host='fake_host', level=level,
+                    driver='foo'))
+        with self.ctx.session.begin(subtransactions=True):
+            ml2_db.set_binding_levels(self.ctx.session, levels)
+
+        result = ml2_db.get_binding_levels_for_ports(
+            self.ctx.session, ['foo-port-id-one', 'foo-port-id-two'])
+        self.assertEqual({('foo-port-id-one', 'fake_host'),
+                          ('foo-port-id-two', 'fake_host')}, set(result))
+        self.assertEqual(
+            [0, 1], [l.level for l in result[('foo-port-id-one',
+                                               'fake_host')]])
+
     def test_get_port_from_device_mac(self):
         network_id = 'foo-network-id'
         port_id = 'foo-port-id'
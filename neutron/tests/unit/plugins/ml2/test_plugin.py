@@ -785,6 +785,60 @@ class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
                                           network=net)
                 self.assertFalse(get_net.called)
 
+    def test_update_port_statuses(self):
+        ctx = context.get_admin_context()
+        plugin = manager.NeutronManager.get_plugin()
+        with self.port() as port1, self.port() as port2:
+            port_ids = [port1['port']['id'], port2['port']['id']]
+            with mock.patch.object(plugin, 'update_port_status') as ups:
+                res = plugin.update_port_statuses(
+                    ctx, {port_id: constants.PORT_STATUS_ACTIVE
+                          for port_id in port_ids + ['fake-id']})
+                self.assertFalse(ups.called)
+            self.assertEqual(set(port_ids), set(res))
+            for port_id in port_ids:
+                self.assertEqual(constants.PORT_STATUS_ACTIVE,
+                                 plugin.get_port(ctx, port_id)['status'])
+
+    def test_get_bound_ports_contexts(self):
+        ctx = context.get_admin_context()
+        plugin = manager.NeutronManager.get_plugin()
+        with self.port(arg_list=(portbindings.HOST_ID,),
+                       **{portbindings.HOST_ID: HOST}) as port1,\
+                self.port() as port2:
+            short_id = port2['port']['id'][:11]
+            devices = [port1['port']['id'], short_id, 'fake-device']
+            with mock.patch.object(plugin, 'get_bound_port_context') as gbpc:
+                res, failed = plugin.get_bound_ports_contexts(
+                    ctx, devices, HOST)
+                self.assertFalse(gbpc.called)
+            self.assertEqual(set(devices), set(res))
+            self.assertEqual([], failed)
+            self.assertEqual(port1['port']['id'],
+                             res[port1['port']['id']].current['id'])
+            self.assertEqual(port2['port']['id'], res[short_id].current['id'])
+            self.assertIsNone(res['fake-device'])
+
+    def test_get_bound_ports_contexts_bind_failure(self):
+        ctx = context.get_admin_context()
+        plugin = manager.NeutronManager.get_plugin()
+        with self.port() as port1, self.port() as port2:
+            port1_id = port1['port']['id']
+            port2_id = port2['port']['id']
+
+            def bind_port(port_context):
+                if port_context.current['id'] == port2_id:
+                    raise Exception()
+                return port_context
+
+            with mock.patch.object(plugin, '_bind_port_if_needed',
+                                   side_effect=bind_port):
+                res, failed = plugin.get_bound_ports_contexts(
+                    ctx, [port1_id, port2_id], HOST)
+            self.assertEqual([port1_id], list(res))
+            self.assertEqual(port1_id, res[port1_id].current['id'])
+            self.assertEqual([port2_id], failed)
+
     def test_update_port_mac(self):
         self.check_update_port_mac(
             host_arg={portbindings.HOST_ID: HOST},
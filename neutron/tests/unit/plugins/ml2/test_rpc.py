@@ -188,20 +188,99 @@ class RpcCallbacksTestCase(base.BaseTestCase):
             self.assertFalse(f.called)
             self.assertEqual([], res)
 
+    def _test_get_devices_details_list_and_failed_devices(
+            self, contexts, failed_devices=None):
+        devices = list(contexts) + (failed_devices or [])
+        self.plugin.get_bound_ports_contexts.return_value = (
+            contexts, failed_devices or [])
+        return self.callbacks.get_devices_details_list_and_failed_devices(
+            'fake_context', devices=devices, host='fake_host',
+            agent_id='fake_agent_id')
+
+    def _get_port_context(self, port_id, status=constants.PORT_STATUS_BUILD):
+        port = collections.defaultdict(
+            lambda: 'fake', {'id': port_id, 'admin_state_up': True,
+                             'status': status})
+        port_context = mock.MagicMock(current=port, host='fake_host')
+        port_context.network._network = {}
+        return port_context
+
     def test_get_devices_details_list_and_failed_devices(self):
-        devices = [1, 2, 3, 4, 5]
-        expected = {'devices': devices, 'failed_devices': []}
-        callback = (
-            self.callbacks.get_devices_details_list_and_failed_devices)
-        self._test_get_devices_list(callback, devices, expected)
+        contexts = collections.OrderedDict(
+            (device, self._get_port_context(device))
+            for device in ('dev1', 'dev2', 'dev3'))
+        res = self._test_get_devices_details_list_and_failed_devices(
+            contexts)
+        self.assertEqual(['dev1', 'dev2', 'dev3'],
+                         [entry['device'] for entry in res['devices']])
+        self.assertEqual([], res['failed_devices'])
+        self.plugin.get_bound_ports_contexts.assert_called_once_with(
+            'fake_context', ['dev1', 'dev2', 'dev3'], 'fake_host', {})
+        self.assertFalse(self.plugin.get_bound_port_context.called)
+        self.assertFalse(self.plugin.update_port_statuses.called)
+
+    def test_get_devices_details_list_and_failed_devices_not_found(self):
+        contexts = collections.OrderedDict(
+            [('dev1', self._get_port_context('dev1')), ('dev2', None)])
+        res = self._test_get_devices_details_list_and_failed_devices(
+            contexts)
+        self.assertEqual({'device': 'dev2'}, res['devices'][1])
+        self.assertEqual([], res['failed_devices'])
+
+    def test_get_devices_details_list_and_failed_devices_status_update(self):
+        contexts = collections.OrderedDict(
+            [('dev1', self._get_port_context('dev1')),
+             ('dev2', self._get_port_context(
+                 'dev2', constants.PORT_STATUS_DOWN)),
+             ('dev3', self._get_port_context(
+                 'dev3', constants.PORT_STATUS_ACTIVE))])
+        self._test_get_devices_details_list_and_failed_devices(contexts)
+        self.plugin.update_port_statuses.assert_called_once_with(
+            'fake_context', {'dev2': constants.PORT_STATUS_BUILD,
+                             'dev3': constants.PORT_STATUS_BUILD},
+            'fake_host', {})
+        self.assertFalse(self.plugin.update_port_status.called)
 
     def test_get_devices_details_list_and_failed_devices_failures(self):
-        devices = [1, Exception('testdevice'), 3,
-                   Exception('testdevice'), 5]
-        expected = {'devices': [1, 3, 5], 'failed_devices': [2, 4]}
-        callback = (
-            self.callbacks.get_devices_details_list_and_failed_devices)
-        self._test_get_devices_list(callback, devices, expected)
+        contexts = collections.OrderedDict(
+            [('dev1', self._get_port_context('dev1')),
+             ('dev2', self._get_port_context('dev2'))])
+        with mock.patch.object(self.callbacks, '_get_device_details',
+                               side_effect=[({'device': 'dev1'}, None),
+                                            Exception('testdevice')]):
+            res = self._test_get_devices_details_list_and_failed_devices(
+                contexts)
+        self.assertEqual({'devices': [{'device': 'dev1'}],
+                          'failed_devices': ['dev2']}, res)
+
+    def test_get_devices_details_list_and_failed_devices_bind_fails(self):
+        contexts = collections.OrderedDict(
+            [('dev1', self._get_port_context('dev1')),
+             ('dev3', self._get_port_context('dev3'))])
+        res = self._test_get_devices_details_list_and_failed_devices(
+            contexts, failed_devices=['dev2'])
+        self.assertEqual(['dev1', 'dev3'],
+                         [entry['device'] for entry in res['devices']])
+        self.assertEqual(['dev2'], res['failed_devices'])
+
+    def test_get_devices_details_list_and_failed_devices_fetch_fails(self):
+        self.plugin.get_bound_ports_contexts.side_effect = Exception()
+        res = self.callbacks.get_devices_details_list_and_failed_devices(
+            'fake_context', devices=['dev1', 'dev2'])
+        self.assertEqual({'devices': [], 'failed_devices': ['dev1', 'dev2']},
+                         res)
+
+    def test_get_devices_details_list_and_failed_devices_status_fails(self):
+        contexts = collections.OrderedDict(
+            [('dev1', self._get_port_context('dev1')),
+             ('dev2', self._get_port_context(
+                 'dev2', constants.PORT_STATUS_DOWN))])
+        self.plugin.update_port_statuses.side_effect = Exception()
+        res = self._test_get_devices_details_list_and_failed_devices(
+            contexts)
+        self.assertEqual(['dev1'],
+                         [entry['device'] for entry in res['devices']])
+        self.assertEqual(['dev2'], res['failed_devices'])
 
     def test_get_devices_details_list_and_failed_devices_empty_dev(self):
         with mock.patch.object(self.callbacks, 'get_device_details') as f:
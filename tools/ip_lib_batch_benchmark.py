@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the cost of ip_lib address and route changes with and without
+batching.
+
+A namespace is created, then addresses and routes of its loopback device
+are added and removed with one ip process per change, and with ip_lib batches
+running a single ip process per namespace. The root helper is run for
+every ip process, as it is by the agents, so this must be run by a user
+allowed to use it.
+"""
+
+import argparse
+import time
+
+import netaddr
+from oslo_config import cfg
+from oslo_utils import uuidutils
+
+from neutron.agent.common import config
+from neutron.agent.linux import ip_lib
+
+
+def _change_addresses(device, cidrs, routes):
+    for cidr in cidrs:
+        device.addr.add(cidr)
+    for cidr in routes:
+        device.route.add_route(cidr)
+    for cidr in routes:
+        device.route.delete_route(cidr)
+    for cidr in cidrs:
+        device.addr.delete(cidr)
+
+
+def _batch_change_addresses(device, cidrs, routes):
+    with device.batch():
+        for cidr in cidrs:
+            device.addr.add(cidr)
+        for cidr in routes:
+            device.route.add_route(cidr)
+    with device.batch():
+        for cidr in routes:
+            device.route.delete_route(cidr)
+        for cidr in cidrs:
+            device.addr.delete(cidr)
+
+
+def _time(func, repeat, *args):
+    start = time.time()
+    for _i in range(repeat):
+        func(*args)
+    return (time.time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--root-helper', default='sudo')
+    parser.add_argument('--count', type=int, nargs='+',
+                        default=[1, 10, 50, 200])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    config.register_root_helper(cfg.CONF)
+    cfg.CONF.set_override('root_helper', args.root_helper, 'AGENT')
+
+    namespace = 'ip-lib-benchmark-%s' % uuidutils.generate_uuid()[:8]
+    ip = ip_lib.IPWrapper(namespace)
+    ip_lib.IPWrapper().ensure_namespace(namespace)
+    try:
+        device = ip.device(ip_lib.LOOPBACK_DEVNAME)
+        device.link.set_up()
+        print("%8s %16s %16s" % ('changes', 'per call (ms)', 'batch (ms)'))
+        for count in args.count:
+            hosts = netaddr.IPNetwork('10.0.0.0/16').iter_hosts()
+            cidrs = ['%s/32' % next(hosts) for _i in range(count)]
+            routes = ['10.1.%d.%d/32' % divmod(i, 256) for i in range(count)]
+            plain = _time(_change_addresses, args.repeat,
+                          device, cidrs, routes)
+            batch = _time(_batch_change_addresses, args.repeat,
+                          device, cidrs, routes)
+            print("%8d %16.1f %16.1f" % (count * 4, plain * 1000,
+                                         batch * 1000))
+    finally:
+        ip_lib.IPWrapper().netns.delete(namespace)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare IP generation cost of the neutrondb IPAM driver strategies.
+
+For a set of subnet fill levels this measures the time needed to pick a
+free address with the IPSet difference previously performed on every
+allocation, and with the free range index now used by the driver.
+Database round trips are not included, so the numbers represent the Python
+work performed by the driver inside the create_port transaction.
+"""
+
+import argparse
+import itertools
+import random
+import timeit
+
+import netaddr
+
+from neutron.ipam.drivers.neutrondb_ipam import allocation_index
+from neutron.ipam import utils as ipam_utils
+
+
+def ipset_generate_ip(pools, allocations):
+    ip_allocations = netaddr.IPSet()
+    for ip_address in allocations:
+        ip_allocations.add(netaddr.IPAddress(ip_address))
+    for pool in pools:
+        av_set = netaddr.IPSet(pool).difference(ip_allocations)
+        if av_set.size == 0:
+            continue
+        window = min(av_set.size, 10)
+        ip_index = random.randint(1, window)
+        return str(list(itertools.islice(av_set, ip_index))[-1])
+
+
+def index_generate_ip(index):
+    for _pool_id, pool_index in index.pools:
+        if pool_index.size:
+            window = min(pool_index.size, 10)
+            return random.choice(pool_index.candidates(window))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--cidr', default='10.0.0.0/16')
+    parser.add_argument('--fill', type=int, nargs='+',
+                        default=[0, 25, 50, 75, 90, 99])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    net = netaddr.IPNetwork(args.cidr)
+    pools = ipam_utils.generate_pools(net, str(net[1]))
+    pool_tuples = [('pool-%d' % i, pool[0], pool[-1])
+                   for i, pool in enumerate(pools)]
+    addresses = [str(ip) for pool in pools for ip in pool]
+
+    print("%6s %12s %16s %16s" % ('fill%', 'allocations',
+                                  'ipset (ms)', 'index (ms)'))
+    for fill in args.fill:
+        allocations = random.sample(addresses,
+                                    len(addresses) * fill // 100)
+        ipset_time = timeit.timeit(
+            lambda: ipset_generate_ip(pools, allocations),
+            number=args.repeat) / args.repeat
+        index = allocation_index.SubnetAllocationIndex(
+            pool_tuples, net.version, allocations)
+        index_time = timeit.timeit(
+            lambda: index_generate_ip(index),
+            number=args.repeat) / args.repeat
+        print("%6d %12d %16.3f %16.3f" % (fill, len(allocations),
+                                          ipset_time * 1000,
+                                          index_time * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the rate of flow programming through ovs-ofctl with and without
+OpenFlow bundles.
+
+A scratch bridge is created, then flows are installed and removed with one
+ovs-ofctl call per flow, with a deferred bridge running one ovs-ofctl call
+per group of actions, as the OVS firewall does, and with a deferred bridge
+applying all the flows in a single OpenFlow bundle. The root helper is run
+for every ovs-ofctl call, as it is by the agents, so this must be run by a
+user allowed to use it.
+"""
+
+import argparse
+import time
+
+from oslo_config import cfg
+from oslo_utils import uuidutils
+
+from neutron.agent.common import config
+from neutron.agent.common import ovs_lib
+
+
+def _flows(count):
+    return [{'table': 0, 'priority': 10, 'in_port': 1,
+             'dl_src': '02:00:00:00:%02x:%02x' % divmod(i, 256),
+             'actions': 'drop'}
+            for i in range(count)]
+
+
+def _match(flow):
+    return {'table': 0, 'in_port': flow['in_port'], 'dl_src': flow['dl_src']}
+
+
+def _change_flows(br, count):
+    for flow in _flows(count):
+        br.add_flow(**flow)
+    for flow in _flows(count):
+        br.delete_flows(**_match(flow))
+
+
+def _deferred_change_flows(br, count, use_bundle=False):
+    # Replace the flows like the firewall does when a port is updated: the
+    # old flows are deleted, then the new ones are added.
+    with br.deferred(full_ordered=True, use_bundle=use_bundle) as deferred:
+        for flow in _flows(count):
+            deferred.delete_flows(**_match(flow))
+        for flow in _flows(count):
+            deferred.add_flow(**flow)
+    with br.deferred(full_ordered=True, use_bundle=use_bundle) as deferred:
+        for flow in _flows(count):
+            deferred.delete_flows(**_match(flow))
+
+
+def _bundle_change_flows(br, count):
+    _deferred_change_flows(br, count, use_bundle=True)
+
+
+def _rate(func, repeat, br, count):
+    start = time.time()
+    for _i in range(repeat):
+        func(br, count)
+    return count * repeat / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--root-helper', default='sudo')
+    parser.add_argument('--count', type=int, nargs='+',
+                        default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    config.register_root_helper(cfg.CONF)
+    cfg.CONF.set_override('root_helper', args.root_helper, 'AGENT')
+
+    br_name = 'br-bench-%s' % uuidutils.generate_uuid()[:6]
+    with ovs_lib.OVSBridge(br_name) as br:
+        br.set_protocols(["OpenFlow%d" % i for i in range(10, 15)])
+        print("%8s %16s %16s %16s" % ('flows', 'per flow (/s)',
+                                      'deferred (/s)', 'bundle (/s)'))
+        for count in args.count:
+            rates = [_rate(func, args.repeat, br, count)
+                     for func in (_change_flows, _deferred_change_flows,
+                                  _bundle_change_flows)]
+            print("%8d %16.1f %16.1f %16.1f" % tuple([count] + rates))
+
+
+if __name__ == '__main__':
+    main()